@@ -0,0 +1,60 @@
+# coding:utf-8
+"""
+请求体生成耗时: 字符串模板(jinja渲染 + 解析 + 编码) vs 结构化模板(payload.compile_payload)
+
+用户划拨请求体, 终端ID列表长度 1 / 1000 / 10000.
+
+    cd src && python ../bench/payload_template.py
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from jinja2 import ext  # noqa: E402
+
+from util import jinja, payload, serializer  # noqa: E402
+
+TPL = ('{"accountId":{{user_id}},"accountType":"USER","allocateType":"SINGLE","cycleType":"FIXED",'
+       '"coefficient":100,"months":1,"agentFlowId":{{agent_flow_id}},"flow":5,"totalPrice":5,'
+       '"terminals":{{terminal_ids}}}')
+BODY = {
+    "accountId": "${user_id:int}",
+    "accountType": "USER",
+    "allocateType": "SINGLE",
+    "cycleType": "FIXED",
+    "coefficient": 100,
+    "months": 1,
+    "agentFlowId": "${agent_flow_id:int}",
+    "flow": 5,
+    "totalPrice": 5,
+    "terminals": "${terminal_ids:list}",
+}
+
+
+def render_string(data: dict) -> bytes:
+    # 原发送流程: 渲染字符串模板, 解析后由 req_json 重新编码
+    return serializer.dumps(serializer.loads(jinja.render(data, TPL, extensions=[ext.do])))
+
+
+def timeit(func, arg, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(arg)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    build = payload.compile_payload(BODY)
+    for n in (1, 1000, 10000):
+        data = {"user_id": 7, "agent_flow_id": 9, "terminal_ids": list(range(10 ** 9, 10 ** 9 + n))}
+        assert serializer.loads(build(data)) == serializer.loads(render_string(data))
+        iterations = max(10, 20000 // n)
+        string = timeit(render_string, data, iterations)
+        structured = timeit(build, data, iterations)
+        print(f"{n:>6} ids  string {string:9.1f}us  structured {structured:8.1f}us  x{string / structured:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# coding:utf-8
+"""
+路由匹配耗时: Starlette逐个匹配 vs 索引分发(DeferredAPIRouter.register(indexed=True))
+
+一半静态路径(GET), 一半带参数路径(POST), 分别测命中, 404(路径不存在)和405(方法不匹配).
+
+    cd src && python ../bench/route_dispatch.py
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from fastapi import FastAPI  # noqa: E402
+from starlette.routing import Match  # noqa: E402
+
+from core.router import DeferredAPIRouter  # noqa: E402
+
+
+async def endpoint():
+    return {}
+
+
+def build(n: int, indexed: bool) -> FastAPI:
+    router = DeferredAPIRouter()
+    for i in range(n):
+        if i % 2:
+            router.add_api_route(f"/s{i}/items", endpoint, methods=["GET"])
+        else:
+            router.add_api_route(f"/p{i}/items/{{id:int}}", endpoint, methods=["POST"])
+    app = FastAPI()
+    router.register(app.router, prefix="/api", indexed=indexed)
+    return app
+
+
+def match(app: FastAPI, method: str, path: str) -> Match:
+    # 与 starlette.routing.Router.__call__ 相同: 第一个FULL, 否则第一个PARTIAL
+    scope = {"type": "http", "path": path, "method": method}
+    partial = Match.NONE
+    for route in app.router.routes:
+        result, _ = route.matches(scope)
+        if result == Match.FULL:
+            return result
+        if result == Match.PARTIAL and partial == Match.NONE:
+            partial = result
+    return partial
+
+
+def timeit(app: FastAPI, method: str, path: str, expected: Match, iterations: int) -> float:
+    assert match(app, method, path) == expected, (method, path)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        match(app, method, path)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    for n in (10, 1000, 10000):
+        iterations = 2000 if n < 10000 else 200
+        cases = [
+            ("hit static", "GET", f"/api/s{n - 1}/items", Match.FULL),
+            ("hit param", "POST", f"/api/p{n - 2}/items/7", Match.FULL),
+            ("404", "GET", "/api/missing/items", Match.NONE),
+            ("405", "GET", f"/api/p{n - 2}/items/7", Match.PARTIAL),
+        ]
+        apps = {indexed: build(n, indexed) for indexed in (False, True)}
+        for name, method, path, expected in cases:
+            linear = timeit(apps[False], method, path, expected, iterations)
+            indexed = timeit(apps[True], method, path, expected, iterations)
+            print(f"{n:>6} routes {name:<10} linear {linear:9.1f}us  indexed {indexed:7.1f}us")
+
+
+if __name__ == '__main__':
+    main()
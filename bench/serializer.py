@@ -0,0 +1,63 @@
+# coding:utf-8
+"""
+JSON编解码耗时: 标准库json vs util.serializer (orjson > ujson > json, 取已安装的)
+
+10000个终端的列表响应, 以及一个小响应(单条数据).
+
+    cd src && python ../bench/serializer.py
+"""
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from util import serializer  # noqa: E402
+
+
+def terminals(n: int) -> dict:
+    return {
+        "code": "0",
+        "message": "success",
+        "data": [{
+            "id": i,
+            "sn": f"SN{i:08d}",
+            "name": f"终端{i}",
+            "lat": 31.2 + i * 1e-5,
+            "lng": 121.4,
+            "online": i % 2 == 0,
+            "tags": ["a", "b"],
+        } for i in range(n)],
+    }
+
+
+def std_dumps(obj) -> bytes:
+    # 与 serializer 的标准库实现相同
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def timeit(func, arg, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(arg)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    print(f"serializer: {serializer.name}")
+    for n in (1, 10000):
+        payload = terminals(n)
+        raw = serializer.dumps(payload)
+        assert serializer.loads(raw) == json.loads(std_dumps(payload))
+        iterations = 20 if n > 1 else 20000
+        std = timeit(std_dumps, payload, iterations)
+        fast = timeit(serializer.dumps, payload, iterations)
+        print(f"{n:>6} records dumps  json {std:10.1f}us  {serializer.name} {fast:10.1f}us  x{std / fast:.1f}")
+        std = timeit(json.loads, raw, iterations)
+        fast = timeit(serializer.loads, raw, iterations)
+        print(f"{n:>6} records loads  json {std:10.1f}us  {serializer.name} {fast:10.1f}us  x{std / fast:.1f}")
+
+
+if __name__ == '__main__':
+    main()
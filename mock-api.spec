@@ -1,15 +1,21 @@
 # -*- mode: python ; coding: utf-8 -*-
+import os
 
 
 block_cipher = None
 
+# 预编译模板(先在src目录执行 python -m core.precompile ../build/templates)
+datas = []
+if os.path.isdir('./build/templates'):
+    datas.append(('./build/templates', 'templates'))
+
 
 a = Analysis(
     ['./src/app/__main__.py'],
     pathex=['./src','./.venv/Lib/site-packages','./.venv/lib/python3.8/site-packages/'],
     binaries=[],
-    datas=[],
-    hiddenimports=[],
+    datas=datas,
+    hiddenimports=['plugins.ryd.api'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
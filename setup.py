@@ -33,6 +33,9 @@ setup(
     entry_points={
         'console_scripts': [
             'mock-api = __main__:main',
-        ]
+        ],
+        'mock_api.plugins': [
+            'ryd = plugins.ryd:MANIFEST',
+        ],
     }
 )
@@ -2,41 +2,113 @@
 
 import logging
 import sys
+import time
+from typing import Any, Dict, List
 
 from fastapi import FastAPI
+from fastapi.routing import APIRouter
 from loguru import logger
+from starlette.routing import BaseRoute
 
+import plugins
+from core import plugin, schemas
+from core.capture import CaptureMiddleware, CaptureWriter
 from core.check_token import CheckTokenMiddleware
 from core.config import settings
 from core.event import create_start_app_handler, create_stop_app_handler
+from core.reload import RouteReloader
+from core.router import expand_routes
 from plugins import api_router
+from util import security
+
+
+class MockAPI(FastAPI):
+    @property
+    def routes(self) -> List[BaseRoute]:
+        # 展开索引分发的路由, OpenAPI逐个列出
+        return expand_routes(self.router.routes)
+
+    def openapi(self) -> Dict[str, Any]:
+        # 按真实路由生成(先导入延迟加载的插件)
+        if not self.openapi_schema:
+            plugin.load_routes(self.router.routes)
+        return super().openapi()
+
+
+def build_routes(app: FastAPI, base_routes: List[BaseRoute]) -> List[BaseRoute]:
+    """
+    构建完整路由表(插件模块不会重新导入, mock定义文件重新读取)
+
+    :param app:
+    :param base_routes: 非插件路由(文档, 管理接口)
+    :return:
+    """
+    router = APIRouter(routes=base_routes,
+                       default_response_class=app.router.default_response_class,
+                       dependency_overrides_provider=app)
+    plugins.get_router().register(router, prefix=settings.api_base, indexed=settings.route_indexed)
+    return router.routes
 
 
 def get_api() -> FastAPI:
-    app = FastAPI(
+    app = MockAPI(
         title="Mock API",
         version="0.0.1",
         openapi_url=settings.api_path("/api.json"),
     )
 
     # add middleware
+    # 中间件实例在首个请求时才创建, 缓存在这里创建并挂到app.state, 管理接口读取统计
+    app.state.token_cache = security.TokenCache(maxsize=settings.token_cache_size, expired=settings.expire_seconds,
+                                                tolerance=settings.tolerance_seconds)
     app.add_middleware(CheckTokenMiddleware,
                        key=settings.key,
                        salt='MockAPI',
                        expired=settings.expire_seconds,
                        header=settings.token_header,
+                       token_cache=app.state.token_cache,
                        prefix=settings.api_base,
                        white_uris=list(map(lambda x: settings.api_path(x), settings.white_uris.split(','))), )
+    # 最后添加的在最外层, 认证失败的请求也会录制
+    if settings.capture_file:
+        writer = CaptureWriter(settings.capture_file, max_queue=settings.capture_max_queue)
+        app.add_middleware(CaptureMiddleware, writer=writer, max_body=settings.capture_max_body)
+        app.add_event_handler("startup", writer.start)
+        app.add_event_handler("shutdown", writer.close)
     logger.info("Application Middleware initialized")
 
     app.add_event_handler("startup", create_start_app_handler(app))
     app.add_event_handler("shutdown", create_stop_app_handler(app))
     logger.info("Application Event Handler initialized")
 
+    @app.get(settings.api_path("/admin/cache"), response_model=schemas.Response[dict], summary="缓存统计")
+    async def cache_stats():
+        # 模板缓存随插件首次访问加载, 不在启动时导入jinja
+        from util import jinja
+        return schemas.Response(data={"token": app.state.token_cache.stats(), "template": jinja.cache_stats()})
+
+    # hot reload
+    if settings.hot_reload:
+        base_routes = list(app.router.routes)
+        reloader = RouteReloader(app, build=lambda: build_routes(app, base_routes))
+        app.state.reloader = reloader
+        app.add_event_handler("startup", reloader.start)
+        app.add_event_handler("shutdown", reloader.stop)
+
+        @app.post(settings.api_path("/admin/reload"), response_model=schemas.Response[dict], summary="热加载路由")
+        async def reload_routes():
+            return schemas.Response(data=await reloader.reload())
+
+        # 管理接口保留在新路由表中
+        base_routes.append(app.router.routes[-1])
+        logger.info("Application Hot Reload initialized")
+
     # load plugins
-    api_router.register(app.router, prefix=settings.api_base)
+    start = time.perf_counter()
+    api_router.register(app.router, prefix=settings.api_base, indexed=settings.route_indexed)
 
-    logger.info("Application Router initialized")
+    logger.info("Application Router initialized: {} routes in {:.3f}s",
+                len(app.routes), time.perf_counter() - start)
 
     logger.info("Application initialized")
 
@@ -0,0 +1,170 @@
+# coding:utf-8
+import base64
+import queue
+import threading
+import time
+from typing import List, Optional
+
+from loguru import logger
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from util import serializer
+
+_STOP_ = object()
+
+
+def encode_body(body: bytes) -> dict:
+    """
+    请求体编码: 文本原样保存, 二进制用base64
+
+    :param body:
+    :return:
+    """
+    if not body:
+        return {"body": ""}
+    try:
+        return {"body": body.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"body_b64": base64.b64encode(body).decode("ascii")}
+
+
+def decode_body(record: dict) -> bytes:
+    if "body_b64" in record:
+        return base64.b64decode(record["body_b64"])
+    return (record.get("body") or "").encode("utf-8")
+
+
+class CaptureWriter(object):
+    """
+    JSONL后台写入: 请求线程只入队, 写线程批量序列化并写文件, 不阻塞事件循环;
+    队列有上限, 写盘跟不上时丢弃新记录并计数(dropped), 不占满内存
+    """
+
+    def __init__(self, file: str, flush_interval: float = 1.0, batch_size: int = 1024, max_queue: int = 10000):
+        """
+
+        :param file: 输出文件(追加)
+        :param flush_interval: 刷盘间隔(秒)
+        :param batch_size: 每批最多记录数
+        :param max_queue: 待写入记录上限
+        """
+        self.file = file
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.written = 0
+        self.dropped = 0
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="capture-writer", daemon=True)
+            self.thread.start()
+            logger.info("Capture writer started: {}", self.file)
+
+    def write(self, record: dict):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if not self.dropped:
+                logger.warning("Capture queue full, dropping records: {}", self.file)
+            self.dropped += 1
+
+    def close(self):
+        if self.thread is not None:
+            self.queue.put(_STOP_)
+            self.thread.join()
+            self.thread = None
+            logger.info("Capture writer stopped: {} records, {} dropped", self.written, self.dropped)
+
+    def _run(self):
+        with open(self.file, 'ab') as f:
+            while True:
+                batch: List[bytes] = []
+                stop = False
+                try:
+                    item = self.queue.get(timeout=self.flush_interval)
+                    while True:
+                        if item is _STOP_:
+                            stop = True
+                            break
+                        batch.append(serializer.dumps(item))
+                        if len(batch) >= self.batch_size:
+                            break
+                        item = self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+                if batch:
+                    f.write(b"\n".join(batch) + b"\n")
+                    f.flush()
+                    self.written += len(batch)
+                if stop:
+                    return
+
+
+class CaptureMiddleware:
+    def __init__(self, app: ASGIApp, writer: CaptureWriter, max_body: int = 1024 * 1024):
+        """
+
+        :param app:
+        :param writer: 写入器
+        :param max_body: 最多记录的请求体字节数(超出截断并标记)
+        """
+        self.app = app
+        self.writer = writer
+        self.max_body = max_body
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.time()
+        start = time.perf_counter()
+        status = 0
+        # 先读最多 max_body 字节的请求体再交给应用(应用不读请求体时, 如认证失败, 也能录到),
+        # 其余部分由应用读取时透传, 只计长度
+        messages = []
+        size = 0
+        more_body = True
+        while more_body and size <= self.max_body:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break
+            size += len(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        body = b"".join(message.get("body", b"") for message in messages)[:self.max_body]
+        pending = iter(messages)
+
+        async def capture_receive() -> Message:
+            nonlocal size
+            message = next(pending, None)
+            if message is None:
+                message = await receive()
+                if message["type"] == "http.request":
+                    size += len(message.get("body", b""))
+            return message
+
+        async def capture_send(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            record = {
+                "ts": started,
+                "method": scope["method"],
+                "path": scope.get("root_path", "") + scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "headers": [[key.decode("latin-1"), value.decode("latin-1")] for key, value in scope["headers"]],
+                "status": status,
+                "duration_ms": round((time.perf_counter() - start) * 1e3, 3),
+            }
+            record.update(encode_body(body))
+            if size > self.max_body:
+                # 请求体长度(应用没有读完时只计已读的部分)
+                record["truncated"] = size
+            self.writer.write(record)
@@ -1,13 +1,72 @@
 import re
+from typing import List, Optional
+from urllib.parse import unquote_plus
 
 from core.config import settings
-from starlette.datastructures import URL, QueryParams
-from starlette.requests import Request
 from starlette.responses import PlainTextResponse
 from starlette.types import ASGIApp, Receive, Scope, Send
 
 from util import security
 
+_RE_META_ = frozenset('.^$*+?{}[]\\|()')
+
+
+class UriMatcher(object):
+    """
+    URI匹配: 字面路径用集合精确匹配, 其余合并成一个正则
+    """
+
+    def __init__(self, uris: List[str]):
+        self.exact = set()
+        patterns = []
+        for uri in uris:
+            if _RE_META_.isdisjoint(uri):
+                self.exact.add(uri)
+            else:
+                patterns.append(f'(?:{uri})')
+        self.pattern = re.compile('|'.join(patterns)) if patterns else None
+
+    def match(self, path: str) -> bool:
+        if path in self.exact:
+            return True
+        return self.pattern is not None and self.pattern.fullmatch(path) is not None
+
+
+def get_header(scope: Scope, name: bytes) -> Optional[str]:
+    """
+    从原始头部列表取值
+
+    :param scope:
+    :param name: 小写头部名
+    :return:
+    """
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def get_query_param(query_string: bytes, name: str) -> Optional[str]:
+    """
+    从原始查询串取值(同名参数取最后一个, 与QueryParams一致)
+
+    :param query_string:
+    :param name:
+    :return:
+    """
+    # 参数名可能百分号编码(如 %74oken), 查询串里没有参数名也没有'%'时才能直接判断不存在
+    if not query_string or (name.encode("latin-1") not in query_string and b"%" not in query_string):
+        return None
+    value = None
+    # 与Starlette一致按latin-1解码(任何字节都能解码), 百分号编码部分由unquote_plus按utf-8解码
+    for pair in query_string.decode("latin-1").split("&"):
+        if not pair:
+            continue
+        key, _, val = pair.partition("=")
+        if key == name or unquote_plus(key) == name:
+            value = unquote_plus(val)
+    return value
+
 
 class CheckTokenMiddleware:
     def __init__(self,
@@ -17,7 +76,9 @@ class CheckTokenMiddleware:
                  expired: int = 0,
                  prefix: str = '/',
                  white_uris: list = [],
-                 header: str = None, ):
+                 header: str = None,
+                 cache_size: int = 0,
+                 token_cache: security.TokenCache = None, ):
         """
 
         :param app:
@@ -27,6 +88,8 @@ class CheckTokenMiddleware:
         :param prefix: 匹配path前缀
         :param white_uris: 白名单
         :param header: 头部token(优先匹配header, 再取url参数token)
+        :param cache_size: 已验证token缓存数(0不缓存)
+        :param token_cache: 已验证token缓存(传入时忽略cache_size, 由调用方读取统计)
         """
         self.app = app
         self.key = key
@@ -34,7 +97,13 @@ class CheckTokenMiddleware:
         self.expired = expired
         self.prefix = prefix
         self.header = header
-        self.re_uris = list(map(lambda x: re.compile(x), white_uris))
+        self.raw_header = header.lower().encode("latin-1") if header else None
+        self.white_uris = UriMatcher(white_uris)
+        self.codec = security.get_token_codec(key=key, salt=salt)
+        if token_cache is None:
+            token_cache = security.TokenCache(maxsize=cache_size, expired=expired,
+                                              tolerance=settings.tolerance_seconds)
+        self.token_cache = token_cache
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         # 调试模式
@@ -45,36 +114,42 @@ class CheckTokenMiddleware:
         if scope["type"] not in ("http", "https"):
             await self.app(scope, receive, send)
             return
-        # path
-        url = URL(scope=scope)
-        if self.check_white_uri(path=url.path) or not url.path.startswith(self.prefix):
+        # path (直接取scope, 不构造URL/Request)
+        path = scope.get("root_path", "") + scope["path"]
+        if not path.startswith(self.prefix) or self.check_white_uri(path=path):
             await self.app(scope, receive, send)
             return
         token = None
         # header
-        if self.header:
-            request = Request(scope)
-            token = request.headers.get(self.header)
+        if self.raw_header:
+            token = get_header(scope, self.raw_header)
         # url
         if not token:
-            params = QueryParams(url.query)
-            token = params.get('token', None)
+            token = get_query_param(scope.get("query_string", b""), 'token')
         # no token
         if not token:
             response = PlainTextResponse('Token Not Found', status_code=403)
             await response(scope, receive, send)
             return
         # check token
-        token_in = security.check_token(key=self.key, salt=self.salt, token=token,
-                                        expired=self.expired, tolerance=settings.tolerance_seconds)
-        if not token_in:
+        if not self.check_token(token=token):
             response = PlainTextResponse('Token Is Invalid', status_code=401)
             await response(scope, receive, send)
             return
         await self.app(scope, receive, send)
 
+    def check_token(self, token: str) -> bool:
+        # 缓存命中只做过期判断
+        if self.token_cache.get(token) is not None:
+            return True
+        token_time = self.codec.parse(token)
+        if token_time is None:
+            return False
+        if not security.alive_token(token_time=token_time, expired=self.expired,
+                                    tolerance=settings.tolerance_seconds):
+            return False
+        self.token_cache.put(token=token, token_time=token_time)
+        return True
+
     def check_white_uri(self, path: str):
-        for re_uri in self.re_uris:
-            if re_uri.fullmatch(path):
-                return True
-        return False
+        return self.white_uris.match(path)
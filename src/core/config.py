@@ -8,11 +8,31 @@ class Settings(BaseSettings):
     key: str = 'XjgX3zAkA2hDT0ySpzOU1uq3iZ9F6yA9'
     expire_seconds: int = 60 * 60 * 8
     tolerance_seconds: int = 60 * 60
+    token_cache_size: int = 4096
     token_header: str = 'X-Mock-Api'
     white_uris: str = '/api.json'
     debugger: bool = False
+    route_indexed: bool = True
+    hot_reload: bool = False
+    plugin_lazy: bool = True
+    # 同时运行的后台任务数
+    scheduler_concurrency: int = 2
+    # mock定义目录
+    mock_definitions: str = ""
+    # 预编译模板目录(python -m core.precompile 输出)
+    template_modules: str = ""
+    # 流量录制文件(JSONL, 为空不录制)
+    capture_file: str = ""
+    # 录制的请求体上限(字节)
+    capture_max_body: int = 1024 * 1024
+    # 录制的待写入记录上限(写盘跟不上时丢弃)
+    capture_max_queue: int = 10000
     # ryd
     ryd_api: str = ""
+    # 接口启动任务时允许的其他ryd地址(逗号分隔, ryd_api总是允许)
+    ryd_allowed_uris: str = ""
+    # 接口启动任务时检查点/快照目录的根目录(请求中的目录只能在其下)
+    ryd_data_dir: str = "data"
 
     def api_path(self, path: str):
         return self.api_base + path
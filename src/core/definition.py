@@ -0,0 +1,201 @@
+# coding:utf-8
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from fastapi import Request
+from jinja2 import Environment, Template, ext, nodes
+from loguru import logger
+from pydantic import BaseModel
+from starlette.responses import Response, StreamingResponse
+
+from core.router import DeferredAPIRouter
+from util import jinja
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+_JSON_SUFFIX_ = ('.json',)
+_YAML_SUFFIX_ = ('.yaml', '.yml')
+
+
+class MockDefinition(BaseModel):
+    """
+    mock接口定义
+
+    body为字符串时作为Jinja模板(可用变量: path, query, headers, body), 否则按JSON输出;
+    stream为真时模板分块渲染输出(大响应体)
+    """
+    method: str = "GET"
+    path: str
+    status: int = 200
+    headers: Dict[str, str] = {}
+    media_type: str = "application/json"
+    body: Any = None
+    summary: Optional[str] = None
+    tags: Optional[List[str]] = None
+    stream: bool = False
+
+
+def read_file(file: str) -> List[dict]:
+    """
+    读取定义文件(单个定义或定义列表)
+
+    :param file:
+    :return:
+    """
+    with open(file, 'r', encoding='utf-8') as f:
+        if file.endswith(_JSON_SUFFIX_):
+            data = json.load(f)
+        else:
+            data = yaml.safe_load(f)
+    if not data:
+        return []
+    if isinstance(data, dict):
+        return [data]
+    return data
+
+
+def list_files(root: str) -> List[str]:
+    """
+    定义文件列表(递归, 按路径排序)
+
+    :param root:
+    :return:
+    """
+    suffix = _JSON_SUFFIX_ + _YAML_SUFFIX_ if yaml else _JSON_SUFFIX_
+    files = list()
+    for parent, _, names in os.walk(root):
+        for name in names:
+            if name.endswith(suffix):
+                files.append(os.path.join(parent, name))
+            elif name.endswith(_YAML_SUFFIX_):
+                logger.warning("PyYAML not installed, skip mock definition: {}", name)
+    files.sort()
+    return files
+
+
+def compile_body(env: Environment, body: Any) -> Tuple[Optional[bytes], Optional[Template], Set[str]]:
+    """
+    预编译响应体: 静态内容直接编码, 模板只编译一次
+
+    :param env:
+    :param body:
+    :return: (静态内容, 模板, 模板变量)
+    """
+    if body is None:
+        return b"", None, set()
+    if not isinstance(body, str):
+        return json.dumps(body, ensure_ascii=False).encode("utf-8"), None, set()
+    if "{{" not in body and "{%" not in body:
+        return body.encode("utf-8"), None, set()
+    precompiled = jinja.get_precompiled(body, env.extensions.values())
+    if precompiled is not None:
+        variables, template = precompiled
+        return None, template, variables
+    parsed = env.parse(body)
+    # 只用于判断需要准备哪些上下文, 不必像meta.find_undeclared_variables那样完整生成代码
+    variables = {node.name for node in parsed.find_all(nodes.Name)}
+    return None, env.from_string(parsed), variables
+
+
+def make_response(definition: MockDefinition, content: Optional[bytes],
+                  template: Optional[Template]) -> Callable[[dict], Response]:
+    """
+    按定义选择响应方式: 静态内容, 模板渲染或流式渲染
+
+    :param definition:
+    :param content: 静态内容
+    :param template: 模板(为None时返回静态内容)
+    :return: 上下文 -> 响应
+    """
+    status_code = definition.status
+    headers = definition.headers
+    media_type = definition.media_type
+
+    if template is None:
+        return lambda context: Response(content=content, status_code=status_code, headers=headers,
+                                        media_type=media_type)
+    if definition.stream:
+        return lambda context: StreamingResponse(content=jinja.iter_chunks(template.generate(context)),
+                                                 status_code=status_code, headers=headers, media_type=media_type)
+    return lambda context: Response(content=template.render(context), status_code=status_code,
+                                    headers=headers, media_type=media_type)
+
+
+async def request_context(request: Request, variables: Set[str]) -> dict:
+    """
+    模板上下文: 只准备模板用到的 path/query/headers/body
+
+    :param request:
+    :param variables: 模板变量
+    :return:
+    """
+    context = {}
+    if "path" in variables:
+        context["path"] = request.path_params
+    if "query" in variables:
+        context["query"] = dict(request.query_params)
+    if "headers" in variables:
+        context["headers"] = dict(request.headers)
+    if "body" in variables:
+        raw = await request.body()
+        try:
+            context["body"] = json.loads(raw) if raw else None
+        except ValueError:
+            context["body"] = raw.decode("utf-8", errors="replace")
+    return context
+
+
+def create_endpoint(definition: MockDefinition, env: Environment) -> Tuple[Callable, bool]:
+    """
+    生成endpoint
+
+    :param definition:
+    :param env:
+    :return: (endpoint, 是否静态响应)
+    """
+    content, template, variables = compile_body(env, definition.body)
+    respond = make_response(definition, content, template)
+
+    if template is None:
+        def endpoint() -> Response:
+            return respond({})
+
+        return endpoint, True
+
+    async def endpoint(request: Request) -> Response:
+        return respond(await request_context(request, variables))
+
+    return endpoint, False
+
+
+def load_router(root: str) -> DeferredAPIRouter:
+    """
+    从定义目录加载mock接口
+
+    :param root: 定义目录
+    :return:
+    """
+    start = time.perf_counter()
+    env = Environment(extensions=[ext.do])
+    router = DeferredAPIRouter()
+    files = list_files(root)
+    for file in files:
+        for data in read_file(file):
+            definition = MockDefinition(**data)
+            endpoint, static = create_endpoint(definition, env)
+            router.add_api_route(path=definition.path,
+                                 endpoint=endpoint,
+                                 static=static,
+                                 methods=[definition.method.upper()],
+                                 status_code=definition.status,
+                                 summary=definition.summary,
+                                 tags=definition.tags,
+                                 response_class=Response)
+    logger.info("Mock definitions loaded: {} routes from {} files in {:.3f}s",
+                len(router.deferred_routes), len(files), time.perf_counter() - start)
+    return router
@@ -1,26 +1,177 @@
-from typing import Callable
+import asyncio
+import itertools
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 
 from fastapi import FastAPI
 from loguru import logger
 
+from core.config import settings
 from core.starter import AgentStarter
 
+# 保留的已结束任务数
+_MAX_FINISHED_ = 100
+
+
+class ManagedTask(object):
+    """
+    后台任务
+
+    状态: pending(等待并发名额) -> running <-> paused -> finished / failed / stopped
+    暂停只是清除 running 事件, 由任务自己在合适的位置等待; 不等待的任务(pausable=False)不能暂停.
+    """
+
+    def __init__(self, task_id: str, name: str, factory: Callable[["ManagedTask"], Awaitable], meta: dict = None,
+                 pausable: bool = True):
+        """
+
+        :param task_id:
+        :param name:
+        :param factory: 任务协程工厂, 参数为任务本身
+        :param meta: 附加信息
+        :param pausable: 任务是否响应 running 事件
+        """
+        self.id = task_id
+        self.name = name
+        self.factory = factory
+        self.meta = meta or {}
+        self.pausable = pausable
+        self.state = "pending"
+        self.running = asyncio.Event()
+        self.running.set()
+        self.progress: Optional[Callable[[], dict]] = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        return self.state in ("finished", "failed", "stopped")
+
+    def pause(self) -> bool:
+        """
+        暂停(只有运行中且支持暂停的任务可以暂停)
+
+        :return: 是否暂停
+        """
+        if self.state != "running" or not self.pausable:
+            return False
+        self.running.clear()
+        self.state = "paused"
+        return True
+
+    def resume(self) -> bool:
+        """
+        继续(只有暂停的任务可以继续)
+
+        :return: 是否继续
+        """
+        if self.state != "paused":
+            return False
+        self.running.set()
+        self.state = "running"
+        return True
+
+    def stop(self):
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+
+    def info(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "state": self.state,
+            "pausable": self.pausable,
+            "meta": self.meta,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "progress": self.progress() if self.progress else None,
+            "result": self.result,
+            "error": self.error,
+        }
+
 
 class SchedulerStarter(AgentStarter):
-    def __init__(self):
+    """
+    后台任务调度: 任务作为asyncio任务运行, 同时运行的任务数受 scheduler_concurrency 限制,
+    应用停止时取消所有任务.
+    """
+
+    def __init__(self, concurrency: int = 1):
         logger.info("init SchedulerStarter")
-        ...
+        self.concurrency = concurrency
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.tasks: Dict[str, ManagedTask] = OrderedDict()
+        self.ids = itertools.count(1)
 
     async def start(self):
         logger.info("start SchedulerStarter")
-        ...
+        self.semaphore = asyncio.Semaphore(self.concurrency)
 
     async def stop(self):
         logger.info("stop SchedulerStarter")
-        ...
+        running = [task.task for task in self.tasks.values() if task.task is not None and not task.task.done()]
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+
+    def submit(self, name: str, factory: Callable[[ManagedTask], Awaitable], meta: dict = None,
+               pausable: bool = True) -> ManagedTask:
+        """
+        提交后台任务(需在事件循环中调用)
+
+        :param name: 任务名
+        :param factory: 任务协程工厂
+        :param meta: 附加信息
+        :param pausable: 任务是否响应 running 事件(见ManagedTask)
+        :return:
+        """
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.prune()
+        task = ManagedTask(task_id=str(next(self.ids)), name=name, factory=factory, meta=meta, pausable=pausable)
+        task.task = asyncio.create_task(self._run(task))
+        self.tasks[task.id] = task
+        logger.info("Task {} submitted: {}", task.id, name)
+        return task
+
+    async def _run(self, task: ManagedTask):
+        try:
+            async with self.semaphore:
+                task.state = "running" if task.running.is_set() else "paused"
+                task.started = time.time()
+                task.result = await task.factory(task)
+                task.state = "finished"
+        except asyncio.CancelledError:
+            task.state = "stopped"
+        except Exception as e:
+            task.state = "failed"
+            task.error = f"{e.__class__.__name__}: {e}"
+            logger.exception("Task {} failed: {}", task.id, task.name)
+        finally:
+            task.finished = time.time()
+            logger.info("Task {} {}: {}", task.id, task.state, task.name)
+
+    def get(self, task_id: str) -> Optional[ManagedTask]:
+        return self.tasks.get(task_id)
+
+    def list(self) -> List[ManagedTask]:
+        return list(self.tasks.values())
+
+    def prune(self):
+        finished = [task_id for task_id, task in self.tasks.items() if task.done]
+        for task_id in finished[:max(0, len(finished) - _MAX_FINISHED_)]:
+            del self.tasks[task_id]
 
 
-scheduler_starter = SchedulerStarter()
+scheduler_starter = SchedulerStarter(concurrency=settings.scheduler_concurrency)
 
 
 def create_start_app_handler(app: FastAPI) -> Callable:
@@ -33,5 +184,9 @@ def create_start_app_handler(app: FastAPI) -> Callable:
 def create_stop_app_handler(app: FastAPI) -> Callable:
     async def stop_app() -> None:
         await scheduler_starter.stop()
+        # 只在插件用过 util.http 时关闭共用客户端, 不为此在启动时导入 httpx
+        http = sys.modules.get("util.http")
+        if http is not None:
+            await http.close_clients()
 
     return stop_app
@@ -0,0 +1,231 @@
+# coding:utf-8
+import importlib
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi.routing import APIRoute
+from fastapi.utils import get_value_or_default
+from loguru import logger
+from pydantic import BaseModel
+from starlette.responses import PlainTextResponse
+from starlette.routing import BaseRoute
+from starlette.types import Receive, Scope, Send
+
+from core.router import DeferredAPIRoute, DeferredAPIRouter, StaticResponse, expand_routes, replace_route
+
+try:
+    from importlib.metadata import entry_points
+except ImportError:
+    from importlib_metadata import entry_points
+
+_ENTRY_POINT_GROUP_ = "mock_api.plugins"
+
+
+class RouteManifest(BaseModel):
+    path: str
+    methods: List[str] = ["GET"]
+    name: Optional[str] = None
+    summary: Optional[str] = None
+    description: Optional[str] = None
+
+
+class PluginManifest(BaseModel):
+    """
+    插件清单: 预先声明路由(用于注册和OpenAPI), 插件模块在首次请求时才导入
+    """
+    name: str
+    module: str
+    router: str = "router"
+    prefix: str = ""
+    tags: List[str] = []
+    routes: List[RouteManifest] = []
+
+
+class LazyPlugin(object):
+    def __init__(self, manifest: PluginManifest):
+        self.manifest = manifest
+        self.router: Optional[DeferredAPIRouter] = None
+
+    def load(self) -> DeferredAPIRouter:
+        """
+        导入插件模块
+
+        :return:
+        """
+        if self.router is None:
+            module = importlib.import_module(self.manifest.module)
+            self.router = getattr(module, self.manifest.router)
+            declared = {(r.path, frozenset(m.upper() for m in r.methods)) for r in self.manifest.routes}
+            for route in self.router.deferred_routes:
+                if isinstance(route, DeferredAPIRoute) and (route.path, self.route_methods(route)) not in declared:
+                    logger.warning("Plugin {} route not in manifest: {} {}",
+                                   self.manifest.name, route.methods, route.path)
+            logger.info("Plugin {} loaded: {}", self.manifest.name, self.manifest.module)
+        return self.router
+
+    def find(self, path: str, methods: List[str]) -> Optional[DeferredAPIRoute]:
+        methods = frozenset(methods)
+        for route in self.load().deferred_routes:
+            if isinstance(route, DeferredAPIRoute) and route.path == path and self.route_methods(route) == methods:
+                return route
+        return None
+
+    @staticmethod
+    def route_methods(route: DeferredAPIRoute) -> frozenset:
+        return frozenset(m.upper() for m in (route.methods or ["GET"]))
+
+    def stub_router(self) -> DeferredAPIRouter:
+        """
+        按清单生成占位路由
+
+        :return:
+        """
+        router = DeferredAPIRouter()
+        for route in self.manifest.routes:
+            router.add_api_route(path=route.path,
+                                 endpoint=self.stub_endpoint(route),
+                                 methods=route.methods,
+                                 name=route.name,
+                                 summary=route.summary,
+                                 description=route.description,
+                                 include_in_schema=False,
+                                 route_class_override=LazyAPIRoute)
+        return router
+
+    def stub_endpoint(self, route: RouteManifest) -> Callable:
+        async def endpoint() -> Any:
+            ...
+
+        endpoint.plugin = self
+        endpoint.plugin_path = route.path
+        return endpoint
+
+
+class LazyAPIRoute(APIRoute):
+    """
+    延迟加载路由(占位): 首次处理请求或生成OpenAPI时导入插件, 在路由表中换成真实路由;
+    占位路由没有参数和响应模型, 不列入OpenAPI
+    """
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs) -> None:
+        super().__init__(path, endpoint, **kwargs)
+        self.plugin: LazyPlugin = endpoint.plugin
+        self.plugin_path: str = endpoint.plugin_path
+        self.real_route: Optional[APIRoute] = None
+
+    def build(self) -> Optional[APIRoute]:
+        route = self.plugin.find(self.plugin_path, list(self.methods))
+        if route is None:
+            logger.error("Plugin {} route not found: {} {}", self.plugin.manifest.name, self.methods, self.path)
+            return None
+        real_route = APIRoute(
+            self.path,
+            route.endpoint,
+            response_model=route.response_model,
+            status_code=route.status_code,
+            tags=self.tags + [tag for tag in route.tags or [] if tag not in self.tags],
+            dependencies=self.dependencies + list(route.dependencies or []),
+            summary=route.summary or self.summary,
+            description=route.description,
+            response_description=route.response_description,
+            responses={**self.responses, **(route.responses or {})},
+            deprecated=route.deprecated or self.deprecated,
+            name=route.name,
+            methods=self.methods,
+            operation_id=route.operation_id,
+            response_model_include=route.response_model_include,
+            response_model_exclude=route.response_model_exclude,
+            response_model_by_alias=route.response_model_by_alias,
+            response_model_exclude_unset=route.response_model_exclude_unset,
+            response_model_exclude_defaults=route.response_model_exclude_defaults,
+            response_model_exclude_none=route.response_model_exclude_none,
+            include_in_schema=route.include_in_schema,
+            response_class=get_value_or_default(route.response_class, self.response_class),
+            dependency_overrides_provider=self.dependency_overrides_provider,
+            callbacks=(self.callbacks or []) + (route.callbacks or []),
+            openapi_extra=route.openapi_extra,
+            generate_unique_id_function=self.generate_unique_id_function,
+        )
+        if route.static:
+            real_route.app = StaticResponse(real_route)
+        return real_route
+
+    def load(self, routes: List[BaseRoute]) -> Optional[APIRoute]:
+        """
+        导入插件, 在路由列表中用真实路由替换自身
+
+        :param routes: 所在的路由列表
+        :return: 真实路由(插件中没有对应路由时为None)
+        """
+        if self.real_route is None:
+            self.real_route = self.build()
+        if self.real_route is not None:
+            replace_route(routes, self, self.real_route)
+        return self.real_route
+
+    async def handle(self, scope: Scope, receive: Receive, send: Send) -> None:
+        router = scope.get("router")
+        real_route = self.load(router.routes if router is not None else [])
+        if real_route is None:
+            response = PlainTextResponse("Not Implemented", status_code=501)
+            await response(scope, receive, send)
+            return
+        # 重新生成OpenAPI(列入真实路由)
+        app = scope.get("app")
+        if app is not None and hasattr(app, "openapi_schema"):
+            app.openapi_schema = None
+        await real_route.handle(scope, receive, send)
+
+
+def load_routes(routes: List[BaseRoute]):
+    """
+    导入路由列表中所有延迟加载的插件路由(生成OpenAPI前)
+
+    :param routes:
+    :return:
+    """
+    for route in expand_routes(routes):
+        if isinstance(route, LazyAPIRoute):
+            route.load(routes)
+
+
+def discover(builtins: List[Dict[str, Any]] = ()) -> List[PluginManifest]:
+    """
+    插件清单: 内置清单 + 包入口点(mock_api.plugins), 同名以入口点为准
+
+    :param builtins:
+    :return:
+    """
+    manifests = {}
+    for manifest in builtins:
+        manifest = PluginManifest(**manifest)
+        manifests[manifest.name] = manifest
+    eps = entry_points()
+    if hasattr(eps, "select"):
+        eps = eps.select(group=_ENTRY_POINT_GROUP_)
+    else:
+        eps = eps.get(_ENTRY_POINT_GROUP_, [])
+    for ep in eps:
+        try:
+            manifest = ep.load()
+            if not isinstance(manifest, PluginManifest):
+                manifest = PluginManifest(**manifest)
+            manifests[manifest.name] = manifest
+        except Exception as e:
+            logger.error("Plugin entry point {} error: {}", ep.name, e)
+    return list(manifests.values())
+
+
+def include(router: DeferredAPIRouter, manifest: PluginManifest, lazy: bool = True):
+    """
+    注册插件路由
+
+    :param router:
+    :param manifest:
+    :param lazy: 延迟导入插件模块
+    :return:
+    """
+    if lazy:
+        plugin_router = LazyPlugin(manifest).stub_router()
+    else:
+        plugin_router = getattr(importlib.import_module(manifest.module), manifest.router)
+    router.include_router(plugin_router, prefix=manifest.prefix, tags=manifest.tags)
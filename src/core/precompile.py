@@ -0,0 +1,88 @@
+# coding:utf-8
+import os
+import sys
+import time
+from typing import Optional, Set
+
+import typer
+from jinja2 import ext
+from loguru import logger
+
+from core import definition
+from core.config import settings
+from util import jinja
+
+# 打包后预编译模板所在目录(相对于 sys._MEIPASS)
+_BUNDLE_DIR_ = "templates"
+
+_loaded = False
+
+
+def is_template(body) -> bool:
+    return isinstance(body, str) and ("{{" in body or "{%" in body)
+
+
+def collect_definitions(root: str) -> Set[str]:
+    """
+    收集mock定义文件中的模板
+
+    :param root: 定义目录
+    :return:
+    """
+    sources = set()
+    for file in definition.list_files(root):
+        for data in definition.read_file(file):
+            body = data.get("body")
+            if is_template(body):
+                sources.add(body)
+    return sources
+
+
+def resolve_path() -> Optional[str]:
+    """
+    预编译模板目录: 配置优先, 其次是打包进二进制的目录
+
+    :return:
+    """
+    if settings.template_modules:
+        return settings.template_modules
+    if getattr(sys, "frozen", False):
+        path = os.path.join(getattr(sys, "_MEIPASS", ""), _BUNDLE_DIR_)
+        if os.path.isdir(path):
+            return path
+    return None
+
+
+def setup():
+    """
+    加载预编译模板(只加载一次)
+
+    :return:
+    """
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    path = resolve_path()
+    if not path:
+        return
+    start = time.perf_counter()
+    count = jinja.load_precompiled(path, extensions=[ext.do])
+    logger.info("Precompiled templates loaded: {} from {} in {:.3f}s", count, path, time.perf_counter() - start)
+
+
+def main(target: str = typer.Argument("build/templates", help="输出目录"),
+         definitions: str = typer.Option(None, help="mock定义目录(默认取配置)")):
+    """
+    预编译模板(打包前执行, 输出目录随 mock-api.spec 打包)
+    """
+    sources = set()
+    root = definitions or settings.mock_definitions
+    if root:
+        sources |= collect_definitions(root)
+    count = jinja.precompile(sources, target, extensions=[ext.do])
+    logger.info("Precompiled {} templates into {}", count, target)
+
+
+if __name__ == '__main__':
+    typer.run(main)
@@ -0,0 +1,83 @@
+# coding:utf-8
+import asyncio
+import signal
+import time
+from typing import Callable, List, Optional
+
+from fastapi import FastAPI
+from loguru import logger
+from starlette.routing import BaseRoute
+
+from core.starter import AgentStarter
+
+
+class RouteReloader(AgentStarter):
+    """
+    路由热加载
+
+    后台线程构建新路由表, 再用一次引用赋值替换 app.router.routes;
+    正在处理的请求仍遍历旧路由表, 不受影响.
+    由 SIGHUP 或管理接口触发.
+    """
+
+    def __init__(self, app: FastAPI, build: Callable[[], List[BaseRoute]]):
+        """
+
+        :param app:
+        :param build: 构建完整路由表
+        """
+        self.app = app
+        self.build = build
+        self.lock: Optional[asyncio.Lock] = None
+        self.reloads = 0
+        self.last = {}
+
+    async def start(self):
+        logger.info("start RouteReloader")
+        self.lock = asyncio.Lock()
+        if not hasattr(signal, "SIGHUP"):
+            return
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, self.on_signal)
+        except (NotImplementedError, RuntimeError) as e:
+            logger.warning("RouteReloader SIGHUP disabled: {}", e)
+
+    async def stop(self):
+        logger.info("stop RouteReloader")
+        if not hasattr(signal, "SIGHUP"):
+            return
+        try:
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    def on_signal(self):
+        logger.info("RouteReloader received SIGHUP")
+        asyncio.ensure_future(self.reload())
+
+    async def reload(self) -> dict:
+        """
+        重建并替换路由表
+
+        :return: 路由数, 构建耗时, 替换耗时(客户端可感知的停顿)
+        """
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            start = time.perf_counter()
+            routes = await asyncio.get_running_loop().run_in_executor(None, self.build)
+            build_seconds = time.perf_counter() - start
+            swap_start = time.perf_counter()
+            self.app.router.routes = routes
+            self.app.openapi_schema = None
+            swap_seconds = time.perf_counter() - swap_start
+            self.reloads += 1
+            self.last = {
+                "reloads": self.reloads,
+                "routes": len(routes),
+                "build_seconds": build_seconds,
+                "swap_seconds": swap_seconds,
+            }
+        logger.info("Routes reloaded: {} routes, build {:.3f}s, swap {:.6f}s",
+                    len(routes), build_seconds, swap_seconds)
+        return self.last
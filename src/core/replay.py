@@ -0,0 +1,161 @@
+# coding:utf-8
+import asyncio
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import typer
+from httpx import HTTPStatusError
+from loguru import logger
+
+from core.capture import decode_body
+from util import loadgen, serializer
+from util.http import HttpClient
+from util.loadgen import LoadStats
+
+# 不回放的请求头(由客户端按实际连接重新生成)
+_SKIP_HEADERS_ = {"host", "content-length", "connection", "keep-alive", "transfer-encoding", "upgrade", "te",
+                  "proxy-connection"}
+
+
+class StatusMismatch(Exception):
+    """
+    回放的响应状态码与录制时不同
+    """
+
+
+def check_status(record: dict, status: int):
+    """
+    对比录制时的响应状态码(录制的4xx/5xx原样返回不算错误)
+
+    :param record:
+    :param status: 回放的响应状态码
+    :return:
+    """
+    if status != record["status"]:
+        raise StatusMismatch(f"{record['method']} {record['path']}: {status}, captured {record['status']}")
+
+
+async def read_capture(file: str, speed: float = 1.0, limit: int = 0) -> AsyncIterator[Tuple[Optional[float], dict]]:
+    """
+    逐行读取录制文件(不整体载入内存)
+
+    :param file: JSONL录制文件
+    :param speed: 回放倍速(1为原始间隔, 0为不按时间线, 尽快发送)
+    :param limit: 最多读取条数(0为不限)
+    :return: (相对第一条的计划时间(秒), 记录)
+    """
+    first = None
+    count = 0
+    with open(file, 'rb') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = serializer.loads(line)
+            except ValueError as e:
+                logger.warning("Skip invalid capture line: {}", e)
+                continue
+            if first is None:
+                first = record["ts"]
+            yield ((record["ts"] - first) / speed if speed > 0 else None), record
+            count += 1
+            if limit and count >= limit:
+                return
+
+
+def build_request(record: dict, overrides: Dict[str, str]) -> Tuple[str, str, List[Tuple[str, str]], bytes]:
+    """
+    录制记录转换为请求
+
+    :param record:
+    :param overrides: 替换的请求头(如过期的token)
+    :return: (method, path, headers, body)
+    """
+    path = record["path"]
+    if record.get("query"):
+        path = f"{path}?{record['query']}"
+    headers = [(key, value) for key, value in record.get("headers", [])
+               if key.lower() not in _SKIP_HEADERS_ and key.lower() not in overrides]
+    headers.extend(overrides.items())
+    return record["method"], path, headers, decode_body(record)
+
+
+def parse_headers(headers: List[str]) -> Dict[str, str]:
+    overrides = {}
+    for header in headers:
+        key, sep, value = header.partition(":")
+        if not sep:
+            raise typer.BadParameter(f"header should be 'Name: value': {header}")
+        overrides[key.strip().lower()] = value.strip()
+    return overrides
+
+
+async def replay(client: HttpClient, file: str, speed: float = 1.0, concurrency: int = 100, limit: int = 0,
+                 overrides: Dict[str, str] = None, stats: LoadStats = None) -> LoadStats:
+    """
+    回放录制文件
+
+    按时间线回放时延迟从计划时间算起(服务变慢时排队时间也计入), 尽快发送时从实际发出算起.
+    响应状态码与录制时相同算成功(包括4xx/5xx), 不同时计入 StatusMismatch 错误.
+
+    :param client:
+    :param file: JSONL录制文件
+    :param speed: 回放倍速(0为尽快发送)
+    :param concurrency: 在途请求上限
+    :param limit: 最多回放条数
+    :param overrides: 替换的请求头
+    :param stats:
+    :return:
+    """
+    overrides = overrides or {}
+    if stats is None:
+        stats = LoadStats(name=f"replay {file}", rate=0)
+
+    async def request(record: dict):
+        method, path, headers, body = build_request(record, overrides)
+        try:
+            resp = await client.request(method, path, content=body, headers=headers)
+        except HTTPStatusError as e:
+            # 没有录到状态码(应用异常)时按失败计
+            if not record.get("status"):
+                raise
+            resp = e.response
+        if record.get("status"):
+            check_status(record, resp.status_code)
+
+    try:
+        return await loadgen.run_scheduled(request=request, schedule=read_capture(file, speed=speed, limit=limit),
+                                           max_in_flight=concurrency, stats=stats)
+    finally:
+        await client.close()
+
+
+def main(file: str = typer.Argument(..., help="录制文件(JSONL)"),
+         uri: str = typer.Option("http://127.0.0.1:8000", help="回放目标地址"),
+         speed: float = typer.Option(1.0, help="回放倍速, 1为原始间隔, 0为尽快发送"),
+         concurrency: int = typer.Option(100, help="在途请求上限"),
+         limit: int = typer.Option(0, help="最多回放条数(0为不限)"),
+         header: List[str] = typer.Option([], help="替换请求头 'Name: value'(可多次)"),
+         report: str = typer.Option(None, help="JSON报告文件"),
+         max_connections: int = typer.Option(100, help="连接池最大连接数"),
+         max_keepalive: int = typer.Option(20, help="保持的空闲连接数"),
+         keepalive_expiry: float = typer.Option(5.0, help="空闲连接保持时间(秒)"),
+         pool_timeout: float = typer.Option(None, help="等待连接超时(秒, 默认同请求超时)"),
+         http2: bool = typer.Option(False, "--http2", help="使用HTTP/2(需要安装h2)")):
+    """
+    回放 CaptureMiddleware 录制的流量
+    """
+    overrides = parse_headers(header)
+    start = time.perf_counter()
+    client = HttpClient(uri, max_connections=max_connections, max_keepalive=max_keepalive,
+                        keepalive_expiry=keepalive_expiry, pool_timeout=pool_timeout, http2=http2)
+    stats = asyncio.run(replay(client, file, speed=speed, concurrency=concurrency, limit=limit,
+                               overrides=overrides))
+    logger.info("{} (wall {:.2f}s)", stats, time.perf_counter() - start)
+    if report:
+        loadgen.write_report(report, [stats])
+        logger.info("report: {}", report)
+
+
+if __name__ == '__main__':
+    typer.run(main)
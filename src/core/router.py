@@ -1,18 +1,523 @@
 # coding:utf-8
-
+import copy
+import dataclasses
+import inspect
+import re
+from enum import IntEnum
+from hashlib import md5
+from operator import itemgetter
 from typing import (Any, Callable, Dict, List, Optional, Sequence,
-                    Set, Type, Union)
+                    Set, Tuple, Type, Union)
 
+import fastapi
 from fastapi import params
 from fastapi.datastructures import Default, DefaultPlaceholder
+from fastapi.dependencies.models import Dependant
+from fastapi.dependencies.utils import (get_body_field, get_dependant,
+                                        get_flat_dependant,
+                                        get_parameterless_sub_dependant)
 from fastapi.encoders import DictIntStrAny, SetIntStr
+from fastapi.encoders import jsonable_encoder
 from fastapi.routing import APIRoute, APIRouter
-from fastapi.utils import (generate_unique_id,
-                           get_value_or_default)
+from fastapi.utils import (create_cloned_field, create_response_field,
+                           generate_unique_id, get_value_or_default,
+                           is_body_allowed_for_status_code)
+from loguru import logger
+from pydantic import BaseModel
+from pydantic.error_wrappers import ErrorWrapper, ValidationError
+from pydantic.fields import ModelField
 from starlette import routing
-from starlette.responses import JSONResponse, Response
-from starlette.routing import BaseRoute
-from starlette.types import ASGIApp
+from starlette.datastructures import URLPath
+from starlette.responses import Response
+from starlette.routing import BaseRoute, Match, NoMatchFound
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from util.serializer import FastJSONResponse
+
+# 单段路径参数, 如 {id} / {id:int}
+_PARAM_SEGMENT_ = re.compile(r"^{([a-zA-Z_][a-zA-Z0-9_]*)(?::([a-zA-Z_][a-zA-Z0-9_]*))?}$")
+# 不会跨越'/'的转换器
+_SEGMENT_CONVERTORS_ = (None, "str", "int", "uuid")
+# CachedAPIRoute 按这个版本的 APIRoute.__init__ 实现
+_CACHED_ROUTE_VERSION_ = "0.85."
+
+
+class _RouteNode(object):
+    __slots__ = ("children", "param", "routes")
+
+    def __init__(self):
+        self.children = {}
+        self.param = None
+        self.routes = []
+
+
+class RouteIndex(object):
+    """
+    路由索引: 静态路径用哈希表, 参数路径用分段前缀树,
+    无法按段索引的路径(path/float/自定义转换器, 段内混合参数)顺序匹配.
+    候选按注册顺序返回, 与逐个匹配的优先级一致.
+    """
+
+    def __init__(self):
+        self.static = {}
+        self.root = _RouteNode()
+        self.others = []
+
+    def add(self, order: int, route: routing.Route):
+        item = (order, route)
+        if "{" not in route.path:
+            self.static.setdefault(route.path, []).append(item)
+            return
+        node = self.root
+        for segment in route.path.split("/"):
+            if "{" not in segment:
+                node = node.children.setdefault(segment, _RouteNode())
+                continue
+            match = _PARAM_SEGMENT_.match(segment)
+            if not match or match.group(2) not in _SEGMENT_CONVERTORS_:
+                self.others.append(item)
+                return
+            if node.param is None:
+                node.param = _RouteNode()
+            node = node.param
+        node.routes.append(item)
+
+    def lookup(self, path: str) -> List[Tuple[int, routing.Route]]:
+        candidates = list(self.static.get(path, ()))
+        segments = path.split("/")
+        size = len(segments)
+        stack = [(self.root, 0)]
+        while stack:
+            node, idx = stack.pop()
+            if idx == size:
+                candidates.extend(node.routes)
+                continue
+            segment = segments[idx]
+            if node.param is not None and segment:
+                stack.append((node.param, idx + 1))
+            child = node.children.get(segment)
+            if child is not None:
+                stack.append((child, idx + 1))
+        candidates.extend(self.others)
+        if len(candidates) > 1:
+            candidates.sort(key=itemgetter(0))
+        return candidates
+
+
+class IndexedRoutes(BaseRoute):
+    """
+    索引分发: 替代Starlette逐个正则匹配路由列表,
+    按请求方法查索引, 命中后交给原路由处理(保持FastAPI的endpoint/OpenAPI行为).
+
+    原路由只保存在索引里, 不在路由列表中, 索引未命中的路径(404)不会再线性扫描这些路由;
+    OpenAPI 用 expand_routes 展开, url_path_for 交给原路由.
+    """
+
+    def __init__(self, routes: List[routing.Route]):
+        self.path = ""
+        self.routes = routes
+        self.build()
+
+    def build(self):
+        self.methods: Dict[str, RouteIndex] = {}
+        self.any = RouteIndex()
+        for order, route in enumerate(self.routes):
+            self.any.add(order, route)
+            for method in route.methods or ():
+                self.methods.setdefault(method, RouteIndex()).add(order, route)
+
+    def replace(self, old: BaseRoute, new: routing.Route) -> bool:
+        """
+        替换原路由(如延迟加载的插件路由), 重建索引
+
+        :param old:
+        :param new:
+        :return: 是否找到原路由
+        """
+        for i, route in enumerate(self.routes):
+            if route is old:
+                self.routes[i] = new
+                self.build()
+                return True
+        return False
+
+    def matches(self, scope: Scope) -> Tuple[Match, Scope]:
+        if scope["type"] != "http":
+            return Match.NONE, {}
+        path = scope["path"]
+        index = self.methods.get(scope["method"])
+        if index is not None:
+            for _, route in index.lookup(path):
+                match, child_scope = route.matches(scope)
+                if match == Match.FULL:
+                    child_scope["route"] = route
+                    return match, child_scope
+        # 路径匹配但方法不匹配(405)
+        for _, route in self.any.lookup(path):
+            match, child_scope = route.matches(scope)
+            if match != Match.NONE:
+                child_scope["route"] = route
+                return match, child_scope
+        return Match.NONE, {}
+
+    def url_path_for(self, name: str, **path_params: Any) -> URLPath:
+        # 交给原路由生成
+        for route in self.routes:
+            try:
+                return route.url_path_for(name, **path_params)
+            except NoMatchFound:
+                pass
+        raise NoMatchFound(name, path_params)
+
+    async def handle(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await scope["route"].handle(scope, receive, send)
+
+
+def expand_routes(routes: List[BaseRoute]) -> List[BaseRoute]:
+    """
+    展开索引分发的路由(OpenAPI等需要逐个路由的场合)
+
+    :param routes:
+    :return:
+    """
+    expanded = []
+    for route in routes:
+        expanded.extend(route.routes if isinstance(route, IndexedRoutes) else (route,))
+    return expanded
+
+
+def replace_route(routes: List[BaseRoute], old: BaseRoute, new: BaseRoute) -> bool:
+    """
+    在路由列表(含索引分发的路由)中替换路由
+
+    :param routes:
+    :param old:
+    :param new:
+    :return: 是否找到原路由
+    """
+    for i, route in enumerate(routes):
+        if route is old:
+            routes[i] = new
+            return True
+        if isinstance(route, IndexedRoutes) and route.replace(old, new):
+            return True
+    return False
+
+
+def named_field(field: ModelField, name: str) -> ModelField:
+    """
+    浅拷贝字段并改名(OpenAPI中非模型响应的title取自字段名)
+
+    :param field:
+    :param name:
+    :return:
+    """
+    field = copy.copy(field)
+    field.name = field.alias = name
+    return field
+
+
+def endpoint_key(endpoint: Callable[..., Any]) -> Any:
+    """
+    endpoint签名缓存键: 同一函数定义生成的闭包(代码, 默认值, 注解相同)签名相同
+
+    :param endpoint:
+    :return:
+    """
+    code = getattr(endpoint, "__code__", None)
+    if code is None:
+        return endpoint
+    return (code,
+            tuple(map(id, endpoint.__defaults__ or ())),
+            tuple((k, id(v)) for k, v in (endpoint.__kwdefaults__ or {}).items()),
+            tuple((k, id(v)) for k, v in endpoint.__annotations__.items()))
+
+
+class RouteAnalysisCache(object):
+    """
+    路由分析缓存
+
+    相同响应模型共享响应字段, 相同 (endpoint, 路径参数, 依赖) 共享依赖分析,
+    批量注册大量路由时避免FastAPI重复分析.
+    """
+
+    def __init__(self):
+        self.responses = {}
+        self.dependants = {}
+        self.hits = 0
+        self.misses = 0
+
+    def response_field(self, model: Any) -> Tuple[ModelField, ModelField]:
+        """
+        响应字段及其安全克隆
+
+        :param model: 响应模型
+        :return:
+        """
+        fields = self.responses.get(model)
+        if fields is None:
+            self.misses += 1
+            response_field = create_response_field(name="Response", type_=model)
+            fields = response_field, create_cloned_field(response_field)
+            self.responses[model] = fields
+        else:
+            self.hits += 1
+        return fields
+
+    def dependant(self, path_format: str, endpoint: Callable[..., Any],
+                  dependencies: List[params.Depends]) -> Tuple[Dependant, bool, Optional[ModelField]]:
+        """
+        依赖分析
+
+        :param path_format:
+        :param endpoint:
+        :param dependencies:
+        :return: (依赖, body字段是否可共享, 共享的body字段)
+        """
+        path_params = frozenset(routing.PARAM_REGEX.findall(path_format))
+        key = (endpoint_key(endpoint), path_params, tuple(map(id, dependencies)))
+        analysis = self.dependants.get(key)
+        if analysis is not None:
+            self.hits += 1
+            dependant, shared, body_field = analysis
+            if dependant.call is not endpoint:
+                # 同一函数定义生成的不同闭包, 签名相同, 只替换调用对象
+                dependant = copy.copy(dependant)
+                dependant.call = endpoint
+                dependant.cache_key = (endpoint, dependant.cache_key[1])
+            return dependant, shared, body_field
+        self.misses += 1
+        dependant = get_dependant(path=path_format, call=endpoint)
+        for depends in dependencies[::-1]:
+            dependant.dependencies.insert(
+                0,
+                get_parameterless_sub_dependant(depends=depends, path=path_format),
+            )
+        # 多个body参数时会按路由生成 Body_{unique_id} 模型, 不能共享
+        body_params = get_flat_dependant(dependant).body_params
+        shared = not body_params or (
+            len({param.name for param in body_params}) == 1
+            and not getattr(body_params[0].field_info, "embed", None))
+        body_field = get_body_field(dependant=dependant, name="") if shared else None
+        analysis = dependant, shared, body_field
+        self.dependants[key] = analysis
+        return analysis
+
+
+class CachedAPIRoute(APIRoute):
+    """
+    使用分析缓存构建的APIRoute (与 fastapi 0.85 APIRoute.__init__ 逻辑一致, 见cached_route_supported)
+    """
+
+    def __init__(
+            self,
+            path: str,
+            endpoint: Callable[..., Any],
+            *,
+            analysis_cache: RouteAnalysisCache,
+            response_model: Any = None,
+            status_code: Optional[int] = None,
+            tags: Optional[List[str]] = None,
+            dependencies: Optional[Sequence[params.Depends]] = None,
+            summary: Optional[str] = None,
+            description: Optional[str] = None,
+            response_description: str = "Successful Response",
+            responses: Optional[Dict[Union[int, str], Dict[str, Any]]] = None,
+            deprecated: Optional[bool] = None,
+            name: Optional[str] = None,
+            methods: Optional[Union[Set[str], List[str]]] = None,
+            operation_id: Optional[str] = None,
+            response_model_include: Optional[Union[SetIntStr, DictIntStrAny]] = None,
+            response_model_exclude: Optional[Union[SetIntStr, DictIntStrAny]] = None,
+            response_model_by_alias: bool = True,
+            response_model_exclude_unset: bool = False,
+            response_model_exclude_defaults: bool = False,
+            response_model_exclude_none: bool = False,
+            include_in_schema: bool = True,
+            response_class: Union[Type[Response], DefaultPlaceholder] = Default(
+                FastJSONResponse
+            ),
+            dependency_overrides_provider: Optional[Any] = None,
+            callbacks: Optional[List[BaseRoute]] = None,
+            openapi_extra: Optional[Dict[str, Any]] = None,
+            generate_unique_id_function: Union[
+                Callable[["APIRoute"], str], DefaultPlaceholder
+            ] = Default(generate_unique_id),
+    ) -> None:
+        self.path = path
+        self.endpoint = endpoint
+        self.response_model = response_model
+        self.summary = summary
+        self.response_description = response_description
+        self.deprecated = deprecated
+        self.operation_id = operation_id
+        self.response_model_include = response_model_include
+        self.response_model_exclude = response_model_exclude
+        self.response_model_by_alias = response_model_by_alias
+        self.response_model_exclude_unset = response_model_exclude_unset
+        self.response_model_exclude_defaults = response_model_exclude_defaults
+        self.response_model_exclude_none = response_model_exclude_none
+        self.include_in_schema = include_in_schema
+        self.response_class = response_class
+        self.dependency_overrides_provider = dependency_overrides_provider
+        self.callbacks = callbacks
+        self.openapi_extra = openapi_extra
+        self.generate_unique_id_function = generate_unique_id_function
+        self.tags = tags or []
+        self.responses = responses or {}
+        self.name = routing.get_name(endpoint) if name is None else name
+        self.path_regex, self.path_format, self.param_convertors = routing.compile_path(path)
+        if methods is None:
+            methods = ["GET"]
+        self.methods: Set[str] = {method.upper() for method in methods}
+        if isinstance(generate_unique_id_function, DefaultPlaceholder):
+            current_generate_unique_id = generate_unique_id_function.value
+        else:
+            current_generate_unique_id = generate_unique_id_function
+        self.unique_id = self.operation_id or current_generate_unique_id(self)
+        if isinstance(status_code, IntEnum):
+            status_code = int(status_code)
+        self.status_code = status_code
+        if self.response_model:
+            assert is_body_allowed_for_status_code(
+                status_code
+            ), f"Status code {status_code} must not have a response body"
+            response_field, self.secure_cloned_response_field = analysis_cache.response_field(
+                self.response_model)
+            self.response_field = named_field(response_field, "Response_" + self.unique_id)
+        else:
+            self.response_field = None  # type: ignore
+            self.secure_cloned_response_field = None
+        self.dependencies = list(dependencies) if dependencies else []
+        self.description = description or inspect.cleandoc(self.endpoint.__doc__ or "")
+        self.description = self.description.split("\f")[0].strip()
+        response_fields = {}
+        for additional_status_code, response in self.responses.items():
+            assert isinstance(response, dict), "An additional response must be a dict"
+            model = response.get("model")
+            if model:
+                assert is_body_allowed_for_status_code(
+                    additional_status_code
+                ), f"Status code {additional_status_code} must not have a response body"
+                response_fields[additional_status_code] = named_field(
+                    analysis_cache.response_field(model)[0],
+                    f"Response_{additional_status_code}_{self.unique_id}")
+        self.response_fields = response_fields
+
+        assert callable(endpoint), "An endpoint must be a callable"
+        self.dependant, shared, body_field = analysis_cache.dependant(
+            path_format=self.path_format, endpoint=self.endpoint, dependencies=self.dependencies)
+        if not shared:
+            body_field = get_body_field(dependant=self.dependant, name=self.unique_id)
+        self.body_field = body_field
+        self.app = routing.request_response(self.get_route_handler())
+
+
+def cached_route_supported() -> bool:
+    """
+    CachedAPIRoute 是否适用于当前 fastapi: 版本一致且 APIRoute.__init__ 参数一致,
+    否则批量注册退回 APIRouter.add_api_route
+
+    :return:
+    """
+    if not fastapi.__version__.startswith(_CACHED_ROUTE_VERSION_):
+        return False
+    params = [name for name in inspect.signature(CachedAPIRoute.__init__).parameters if name != "analysis_cache"]
+    return params == list(inspect.signature(APIRoute.__init__).parameters)
+
+
+CACHED_ROUTE_SUPPORTED = cached_route_supported()
+if not CACHED_ROUTE_SUPPORTED:
+    logger.warning("CachedAPIRoute does not match fastapi {}, bulk registration disabled", fastapi.__version__)
+
+
+def prepare_content(content: Any, **kwargs: bool) -> Any:
+    """
+    响应模型校验前转换响应内容(模型转dict, 同 fastapi 路由处理)
+
+    :param content:
+    :param kwargs: exclude_unset, exclude_defaults, exclude_none
+    :return:
+    """
+    if isinstance(content, BaseModel):
+        if getattr(content.__config__, "read_with_orm_mode", None):
+            return content
+        return content.dict(by_alias=True, **kwargs)
+    if isinstance(content, list):
+        return [prepare_content(item, **kwargs) for item in content]
+    if isinstance(content, dict):
+        return {key: prepare_content(value, **kwargs) for key, value in content.items()}
+    if dataclasses.is_dataclass(content):
+        return dataclasses.asdict(content)
+    return content
+
+
+class StaticResponse(object):
+    """
+    预序列化响应
+
+    注册时调用一次endpoint(无参数), 按路由的response_model/response_class渲染编码,
+    之后每个请求直接发送缓存的字节(含Content-Length, ETag), HEAD请求只发响应头, If-None-Match命中返回304.
+    """
+
+    def __init__(self, route: APIRoute):
+        content = route.endpoint()
+        if isinstance(content, Response):
+            response = content
+        else:
+            response_class = route.response_class
+            if isinstance(response_class, DefaultPlaceholder):
+                response_class = response_class.value
+            response = response_class(content=self.serialize(route, content), status_code=route.status_code or 200)
+        self.status_code = response.status_code
+        self.body = response.body
+        self.etag = f'"{md5(self.body).hexdigest()}"'
+        raw_etag = self.etag.encode("latin-1")
+        self.raw_headers = [(k, v) for k, v in response.raw_headers if k != b"etag"] + [(b"etag", raw_etag)]
+        self.not_modified_headers = [(k, v) for k, v in self.raw_headers
+                                     if k not in (b"content-length", b"content-type")]
+
+    @staticmethod
+    def serialize(route: APIRoute, content: Any) -> Any:
+        field = route.secure_cloned_response_field
+        if not field:
+            return jsonable_encoder(content)
+        content = prepare_content(
+            content,
+            exclude_unset=route.response_model_exclude_unset,
+            exclude_defaults=route.response_model_exclude_defaults,
+            exclude_none=route.response_model_exclude_none,
+        )
+        value, errors = field.validate(content, {}, loc=("response",))
+        if isinstance(errors, ErrorWrapper):
+            errors = [errors]
+        if errors:
+            raise ValidationError(errors, field.type_)
+        return jsonable_encoder(
+            value,
+            include=route.response_model_include,
+            exclude=route.response_model_exclude,
+            by_alias=route.response_model_by_alias,
+            exclude_unset=route.response_model_exclude_unset,
+            exclude_defaults=route.response_model_exclude_defaults,
+            exclude_none=route.response_model_exclude_none,
+        )
+
+    def not_modified(self, scope: Scope) -> bool:
+        for key, value in scope["headers"]:
+            if key == b"if-none-match":
+                tags = [tag.strip() for tag in value.decode("latin-1").split(",")]
+                return "*" in tags or self.etag in tags or f"W/{self.etag}" in tags
+        return False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.not_modified(scope):
+            await send({"type": "http.response.start", "status": 304, "headers": self.not_modified_headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        # HEAD只发响应头(保留Content-Length, ETag)
+        await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else self.body})
 
 
 class DeferredAPIRoute(object):
@@ -40,7 +545,7 @@ class DeferredAPIRoute(object):
             response_model_exclude_none: bool = False,
             include_in_schema: bool = True,
             response_class: Union[Type[Response], DefaultPlaceholder] = Default(
-                JSONResponse
+                FastJSONResponse
             ),
             name: Optional[str] = None,
             route_class_override: Optional[Type[APIRoute]] = None,
@@ -49,6 +554,7 @@ class DeferredAPIRoute(object):
             generate_unique_id_function: Union[
                 Callable[["APIRoute"], str], DefaultPlaceholder
             ] = Default(generate_unique_id),
+            static: bool = False,
     ) -> None:
         self.path = path
         self.endpoint = endpoint
@@ -76,6 +582,7 @@ class DeferredAPIRoute(object):
         self.callbacks = callbacks
         self.openapi_extra = openapi_extra
         self.generate_unique_id_function = generate_unique_id_function
+        self.static = static
 
 
 class DeferredAPIWebSocketRoute(object):
@@ -98,7 +605,7 @@ class DeferredAPIRouter(APIRouter):
             prefix: str = "",
             tags: Optional[List[str]] = None,
             dependencies: Optional[Sequence[params.Depends]] = None,
-            default_response_class: Type[Response] = Default(JSONResponse),
+            default_response_class: Type[Response] = Default(FastJSONResponse),
             responses: Optional[Dict[Union[int, str], Dict[str, Any]]] = None,
             callbacks: Optional[List[BaseRoute]] = None,
             routes: Optional[List[routing.BaseRoute]] = None,
@@ -137,6 +644,7 @@ class DeferredAPIRouter(APIRouter):
         self.generate_unique_id_function = generate_unique_id_function
 
         self.deferred_routes = []
+        self.analysis_cache: Optional[RouteAnalysisCache] = None
 
     def register(
             self,
@@ -145,7 +653,7 @@ class DeferredAPIRouter(APIRouter):
             prefix: str = "",
             tags: Optional[List[str]] = None,
             dependencies: Optional[Sequence[params.Depends]] = None,
-            default_response_class: Type[Response] = Default(JSONResponse),
+            default_response_class: Type[Response] = Default(FastJSONResponse),
             responses: Optional[Dict[Union[int, str], Dict[str, Any]]] = None,
             callbacks: Optional[List[BaseRoute]] = None,
             deprecated: Optional[bool] = None,
@@ -153,58 +661,55 @@ class DeferredAPIRouter(APIRouter):
             generate_unique_id_function: Callable[[APIRoute], str] = Default(
                 generate_unique_id
             ),
+            indexed: bool = False,
+            bulk: bool = True,
     ) -> None:
-        combined_routes = self.combine_routes(
-            self.deferred_routes,
-            prefix=prefix,
-            tags=tags,
-            dependencies=dependencies,
-            router_default_response_class=router.default_response_class,
-            default_response_class=default_response_class,
-            responses=responses,
-            callbacks=callbacks,
-            deprecated=deprecated,
-            include_in_schema=include_in_schema,
-            generate_unique_id_function=generate_unique_id_function
-        )
-        self.deferred_routes = combined_routes
+        """
+        注册到路由
+
+        :param indexed: 使用索引分发(原路由移入索引, 路由列表用 expand_routes 展开)
+        :param bulk: 批量注册(直接构建路由, 缓存依赖/响应字段分析)
+        """
+        start = len(router.routes)
+        self.check_prefix(self.deferred_routes, prefix=prefix)
+        if responses is None:
+            responses = {}
+        analysis_cache = RouteAnalysisCache() if bulk else None
         for route in self.deferred_routes:
             if isinstance(route, DeferredAPIRoute):
-                router.add_api_route(
-                    path=route.path,
-                    endpoint=route.endpoint,
-                    response_model=route.response_model,
-                    status_code=route.status_code,
-                    tags=route.tags,
-                    dependencies=route.dependencies,
-                    summary=route.summary,
-                    description=route.description,
-                    response_description=route.response_description,
-                    responses=route.responses,
-                    deprecated=route.deprecated or deprecated or self.deprecated,
-                    methods=route.methods,
-                    operation_id=route.operation_id,
-                    response_model_include=route.response_model_include,
-                    response_model_exclude=route.response_model_exclude,
-                    response_model_by_alias=route.response_model_by_alias,
-                    response_model_exclude_unset=route.response_model_exclude_unset,
-                    response_model_exclude_defaults=route.response_model_exclude_defaults,
-                    response_model_exclude_none=route.response_model_exclude_none,
-                    include_in_schema=route.include_in_schema
-                                      and self.include_in_schema
-                                      and include_in_schema,
-                    response_class=route.response_class,
-                    name=route.name,
-                    route_class_override=route.route_class_override,
-                    callbacks=route.callbacks,
-                    openapi_extra=route.openapi_extra
+                route_kwargs = self.combine_route(
+                    route,
+                    prefix=prefix,
+                    tags=tags,
+                    dependencies=dependencies,
+                    router_default_response_class=router.default_response_class,
+                    default_response_class=default_response_class,
+                    responses=responses,
+                    callbacks=callbacks,
+                    deprecated=deprecated,
+                    include_in_schema=include_in_schema,
+                    generate_unique_id_function=generate_unique_id_function
                 )
+                static = route_kwargs.pop("static")
+                if analysis_cache is not None and CACHED_ROUTE_SUPPORTED and \
+                        (route.route_class_override or router.route_class) is APIRoute:
+                    router.routes.append(CachedAPIRoute(analysis_cache=analysis_cache,
+                                                        **self.router_route_kwargs(router, route_kwargs)))
+                else:
+                    router.add_api_route(**route_kwargs)
+                if static:
+                    router.routes[-1].app = StaticResponse(router.routes[-1])
             elif isinstance(route, DeferredAPIWebSocketRoute):
                 router.add_api_websocket_route(
-                    path=route.path,
+                    path=prefix + route.path,
                     endpoint=route.endpoint,
                     name=route.name
                 )
+        self.analysis_cache = analysis_cache
+        if indexed:
+            routes = [route for route in router.routes[start:] if isinstance(route, routing.Route)]
+            others = [route for route in router.routes[start:] if not isinstance(route, routing.Route)]
+            router.routes[start:] = [IndexedRoutes(routes)] + others
 
     def add_api_route(
             self,
@@ -230,7 +735,7 @@ class DeferredAPIRouter(APIRouter):
             response_model_exclude_none: bool = False,
             include_in_schema: bool = True,
             response_class: Union[Type[Response], DefaultPlaceholder] = Default(
-                JSONResponse
+                FastJSONResponse
             ),
             name: Optional[str] = None,
             route_class_override: Optional[Type[APIRoute]] = None,
@@ -239,6 +744,7 @@ class DeferredAPIRouter(APIRouter):
             generate_unique_id_function: Union[
                 Callable[[APIRoute], str], DefaultPlaceholder
             ] = Default(generate_unique_id),
+            static: bool = False,
     ) -> None:
         route = DeferredAPIRoute(
             path=path,
@@ -266,10 +772,33 @@ class DeferredAPIRouter(APIRouter):
             route_class_override=route_class_override,
             callbacks=callbacks,
             openapi_extra=openapi_extra,
-            generate_unique_id_function=generate_unique_id_function
+            generate_unique_id_function=generate_unique_id_function,
+            static=static
         )
         self.deferred_routes.append(route)
 
+    def static(
+            self,
+            path: str,
+            *,
+            methods: Optional[List[str]] = None,
+            **kwargs: Any,
+    ) -> Callable[[Callable[[], Any]], Callable[[], Any]]:
+        """
+        静态响应路由: endpoint(无参数, 同步)在注册时调用一次, 响应预先编码
+
+        @router.static("/version", response_model=schemas.Response[dict])
+        def version():
+            return schemas.Response(data={"version": "0.0.1"})
+        """
+
+        def decorator(func: Callable[[], Any]) -> Callable[[], Any]:
+            assert not inspect.iscoroutinefunction(func), "A static endpoint must be a sync function"
+            self.add_api_route(path, func, methods=methods or ["GET"], static=True, **kwargs)
+            return func
+
+        return decorator
+
     def add_api_websocket_route(
             self, path: str, endpoint: Callable[..., Any], name: Optional[str] = None
     ) -> None:
@@ -280,6 +809,123 @@ class DeferredAPIRouter(APIRouter):
         )
         self.deferred_routes.append(route)
 
+    @staticmethod
+    def check_prefix(routes: List[Union["DeferredAPIRoute", "DeferredAPIWebSocketRoute"]], prefix: str = ""):
+        if prefix:
+            assert prefix.startswith("/"), "A path prefix must start with '/'"
+            assert not prefix.endswith(
+                "/"
+            ), "A path prefix must not end with '/', as the routes will start with '/'"
+        else:
+            for r in routes:
+                path = getattr(r, "path")
+                name = getattr(r, "name", "unknown")
+                if path is not None and not path:
+                    raise Exception(
+                        f"Prefix and path cannot be both empty (path operation: {name})"
+                    )
+
+    def combine_route(
+            self,
+            route: DeferredAPIRoute,
+            *,
+            prefix: str = "",
+            tags: Optional[List[str]] = None,
+            dependencies: Optional[Sequence[params.Depends]] = None,
+            router_default_response_class: Type[Response] = Default(FastJSONResponse),
+            default_response_class: Type[Response] = Default(FastJSONResponse),
+            responses: Optional[Dict[Union[int, str], Dict[str, Any]]] = None,
+            callbacks: Optional[List[BaseRoute]] = None,
+            deprecated: Optional[bool] = None,
+            include_in_schema: bool = True,
+            generate_unique_id_function: Callable[[APIRoute], str] = Default(
+                generate_unique_id
+            ),
+    ) -> Dict[str, Any]:
+        """
+        合并路由参数(DeferredAPIRoute / add_api_route 参数)
+        """
+        combined_responses = {**(responses or {}), **route.responses}
+        use_response_class = get_value_or_default(
+            route.response_class,
+            router_default_response_class,
+            default_response_class,
+            self.default_response_class,
+        )
+        current_tags = []
+        if tags:
+            current_tags.extend(tags)
+        if route.tags:
+            current_tags.extend(route.tags)
+        current_dependencies: List[params.Depends] = []
+        if dependencies:
+            current_dependencies.extend(dependencies)
+        if route.dependencies:
+            current_dependencies.extend(route.dependencies)
+        current_callbacks = []
+        if callbacks:
+            current_callbacks.extend(callbacks)
+        if route.callbacks:
+            current_callbacks.extend(route.callbacks)
+        current_generate_unique_id = get_value_or_default(
+            route.generate_unique_id_function,
+            generate_unique_id_function,
+            self.generate_unique_id_function,
+        )
+        return dict(
+            path=prefix + route.path,
+            endpoint=route.endpoint,
+            response_model=route.response_model,
+            status_code=route.status_code,
+            tags=current_tags,
+            dependencies=current_dependencies,
+            summary=route.summary,
+            description=route.description,
+            response_description=route.response_description,
+            responses=combined_responses,
+            deprecated=route.deprecated or deprecated or self.deprecated,
+            methods=route.methods,
+            operation_id=route.operation_id,
+            response_model_include=route.response_model_include,
+            response_model_exclude=route.response_model_exclude,
+            response_model_by_alias=route.response_model_by_alias,
+            response_model_exclude_unset=route.response_model_exclude_unset,
+            response_model_exclude_defaults=route.response_model_exclude_defaults,
+            response_model_exclude_none=route.response_model_exclude_none,
+            include_in_schema=(route.include_in_schema
+                               and self.include_in_schema
+                               and include_in_schema),
+            response_class=use_response_class,
+            name=route.name,
+            route_class_override=route.route_class_override,
+            callbacks=current_callbacks,
+            openapi_extra=route.openapi_extra,
+            generate_unique_id_function=current_generate_unique_id,
+            static=route.static
+        )
+
+    @staticmethod
+    def router_route_kwargs(router: APIRouter, route_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        按 APIRouter.add_api_route 合并目标路由的参数, 得到 APIRoute 构造参数
+        """
+        route_kwargs = dict(route_kwargs)
+        route_kwargs.pop("route_class_override", None)
+        route_kwargs.update(
+            path=router.prefix + route_kwargs["path"],
+            responses={**router.responses, **(route_kwargs["responses"] or {})},
+            response_class=get_value_or_default(route_kwargs["response_class"], router.default_response_class),
+            tags=router.tags + (route_kwargs["tags"] or []),
+            dependencies=router.dependencies + list(route_kwargs["dependencies"] or []),
+            callbacks=router.callbacks + (route_kwargs["callbacks"] or []),
+            deprecated=route_kwargs["deprecated"] or router.deprecated,
+            include_in_schema=route_kwargs["include_in_schema"] and router.include_in_schema,
+            generate_unique_id_function=get_value_or_default(route_kwargs["generate_unique_id_function"],
+                                                             router.generate_unique_id_function),
+            dependency_overrides_provider=router.dependency_overrides_provider,
+        )
+        return route_kwargs
+
     def combine_routes(
             self,
             routes: List[Union["DeferredAPIRoute", "DeferredAPIWebSocketRoute"]],
@@ -287,8 +933,8 @@ class DeferredAPIRouter(APIRouter):
             prefix: str = "",
             tags: Optional[List[str]] = None,
             dependencies: Optional[Sequence[params.Depends]] = None,
-            router_default_response_class: Type[Response] = Default(JSONResponse),
-            default_response_class: Type[Response] = Default(JSONResponse),
+            router_default_response_class: Type[Response] = Default(FastJSONResponse),
+            default_response_class: Type[Response] = Default(FastJSONResponse),
             responses: Optional[Dict[Union[int, str], Dict[str, Any]]] = None,
             callbacks: Optional[List[BaseRoute]] = None,
             deprecated: Optional[bool] = None,
@@ -297,81 +943,25 @@ class DeferredAPIRouter(APIRouter):
                 generate_unique_id
             ),
     ) -> List[Union[DeferredAPIRoute, DeferredAPIWebSocketRoute]]:
-        if prefix:
-            assert prefix.startswith("/"), "A path prefix must start with '/'"
-            assert not prefix.endswith(
-                "/"
-            ), "A path prefix must not end with '/', as the routes will start with '/'"
-        else:
-            for r in routes:
-                path = getattr(r, "path")
-                name = getattr(r, "name", "unknown")
-                if path is not None and not path:
-                    raise Exception(
-                        f"Prefix and path cannot be both empty (path operation: {name})"
-                    )
+        self.check_prefix(routes, prefix=prefix)
         if responses is None:
             responses = {}
         combined_routes = []
         for route in routes:
             if isinstance(route, DeferredAPIRoute):
-                combined_responses = {**responses, **route.responses}
-                use_response_class = get_value_or_default(
-                    route.response_class,
-                    router_default_response_class,
-                    default_response_class,
-                    self.default_response_class,
-                )
-                current_tags = []
-                if tags:
-                    current_tags.extend(tags)
-                if route.tags:
-                    current_tags.extend(route.tags)
-                current_dependencies: List[params.Depends] = []
-                if dependencies:
-                    current_dependencies.extend(dependencies)
-                if route.dependencies:
-                    current_dependencies.extend(route.dependencies)
-                current_callbacks = []
-                if callbacks:
-                    current_callbacks.extend(callbacks)
-                if route.callbacks:
-                    current_callbacks.extend(route.callbacks)
-                current_generate_unique_id = get_value_or_default(
-                    route.generate_unique_id_function,
-                    generate_unique_id_function,
-                    self.generate_unique_id_function,
-                )
-                combined_routes.append(DeferredAPIRoute(
-                    prefix + route.path,
-                    route.endpoint,
-                    response_model=route.response_model,
-                    status_code=route.status_code,
-                    tags=current_tags,
-                    dependencies=current_dependencies,
-                    summary=route.summary,
-                    description=route.description,
-                    response_description=route.response_description,
-                    responses=combined_responses,
-                    deprecated=route.deprecated or deprecated or self.deprecated,
-                    methods=route.methods,
-                    operation_id=route.operation_id,
-                    response_model_include=route.response_model_include,
-                    response_model_exclude=route.response_model_exclude,
-                    response_model_by_alias=route.response_model_by_alias,
-                    response_model_exclude_unset=route.response_model_exclude_unset,
-                    response_model_exclude_defaults=route.response_model_exclude_defaults,
-                    response_model_exclude_none=route.response_model_exclude_none,
-                    include_in_schema=route.include_in_schema
-                                      and self.include_in_schema
-                                      and include_in_schema,
-                    response_class=use_response_class,
-                    name=route.name,
-                    route_class_override=route.route_class_override,
-                    callbacks=current_callbacks,
-                    openapi_extra=route.openapi_extra,
-                    generate_unique_id_function=current_generate_unique_id
-                ))
+                combined_routes.append(DeferredAPIRoute(**self.combine_route(
+                    route,
+                    prefix=prefix,
+                    tags=tags,
+                    dependencies=dependencies,
+                    router_default_response_class=router_default_response_class,
+                    default_response_class=default_response_class,
+                    responses=responses,
+                    callbacks=callbacks,
+                    deprecated=deprecated,
+                    include_in_schema=include_in_schema,
+                    generate_unique_id_function=generate_unique_id_function
+                )))
             elif isinstance(route, DeferredAPIWebSocketRoute):
                 combined_routes.append(DeferredAPIWebSocketRoute(
                     prefix + route.path, route.endpoint, name=route.name
@@ -385,7 +975,7 @@ class DeferredAPIRouter(APIRouter):
             prefix: str = "",
             tags: Optional[List[str]] = None,
             dependencies: Optional[Sequence[params.Depends]] = None,
-            default_response_class: Type[Response] = Default(JSONResponse),
+            default_response_class: Type[Response] = Default(FastJSONResponse),
             responses: Optional[Dict[Union[int, str], Dict[str, Any]]] = None,
             callbacks: Optional[List[BaseRoute]] = None,
             deprecated: Optional[bool] = None,
@@ -29,7 +29,6 @@ class ApiStarter:
         self.action_url.append(self.root + uri)
 
     def filter(self, api):
-        url_routes = {route.path: route for route in api.routes}
-        for url, route in url_routes.items():
-            if url not in self.action_url:
-                api.routes.remove(route)
+        # 构建新列表后整体替换, 不在遍历时修改路由表
+        router = getattr(api, "router", api)
+        router.routes = [route for route in router.routes if getattr(route, "path", None) in self.action_url]
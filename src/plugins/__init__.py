@@ -1,6 +1,23 @@
+from core import plugin
+from core.config import settings
 from core.router import DeferredAPIRouter
-from plugins.ryd.api import router as ryd_router
+from plugins import ryd
 
-api_router = DeferredAPIRouter()
 
-api_router.include_router(ryd_router, prefix="/ryd", tags=["ryd"])
+def get_router() -> DeferredAPIRouter:
+    """
+    汇总插件路由(mock定义文件每次重新读取)
+
+    :return:
+    """
+    router = DeferredAPIRouter()
+    for manifest in plugin.discover(builtins=[ryd.MANIFEST]):
+        plugin.include(router, manifest, lazy=settings.plugin_lazy)
+    if settings.mock_definitions:
+        from core import definition, precompile
+        precompile.setup()
+        router.include_router(definition.load_router(settings.mock_definitions), tags=["mock"])
+    return router
+
+
+api_router = get_router()
@@ -0,0 +1,16 @@
+MANIFEST = {
+    "name": "ryd",
+    "module": "plugins.ryd.api",
+    "prefix": "/ryd",
+    "tags": ["ryd"],
+    "routes": [
+        {"path": "/test", "methods": ["POST"], "summary": "库信息"},
+        {"path": "/jobs", "methods": ["GET"], "summary": "发送任务列表"},
+        {"path": "/jobs/{job}/start", "methods": ["POST"], "summary": "启动发送任务"},
+        {"path": "/tasks", "methods": ["GET"], "summary": "后台任务列表"},
+        {"path": "/tasks/{task_id}", "methods": ["GET"], "summary": "后台任务进度"},
+        {"path": "/tasks/{task_id}/stop", "methods": ["POST"], "summary": "停止后台任务"},
+        {"path": "/tasks/{task_id}/pause", "methods": ["POST"], "summary": "暂停后台任务"},
+        {"path": "/tasks/{task_id}/resume", "methods": ["POST"], "summary": "继续后台任务"},
+    ],
+}
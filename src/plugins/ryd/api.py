@@ -1,12 +1,42 @@
 # -*- coding: utf-8 -*-
-from typing import Any, List
+import os
+from typing import Any, List, Optional
+
+from fastapi import HTTPException
+from pydantic import BaseModel
 
 from core import schemas
+from core.config import settings
+from core.event import ManagedTask, scheduler_starter
 from core.router import DeferredAPIRouter
+from plugins.ryd import mock
 
 router = DeferredAPIRouter()
 
 
+class JobOptions(BaseModel):
+    rate: float = 0
+    duration: Optional[float] = None
+    uri: Optional[str] = None
+    synthetic: int = 0
+    snapshot_dir: str = ""
+    refresh_snapshot: bool = False
+    checkpoint_dir: str = ".checkpoint"
+    resume: bool = False
+    # 连接池
+    max_connections: int = 100
+    max_keepalive: int = 20
+    keepalive_expiry: float = 5.0
+    pool_timeout: Optional[float] = None
+    http2: bool = False
+    # 重试和熔断
+    retries: int = 0
+    retry_budget: float = 0.1
+    retry_post: bool = False
+    breaker_threshold: int = 0
+    breaker_reset: float = 10.0
+
+
 @router.post("/test", response_model=schemas.Response[List], summary="库信息")
 async def test(*, conn: dict) -> Any:
     """
@@ -16,3 +46,118 @@ async def test(*, conn: dict) -> Any:
     :return:
     """
     return schemas.Response(data=conn)
+
+
+def resolve_dir(name: str, path: str) -> str:
+    """
+    请求中的目录限制在 ryd_data_dir 下(不能用绝对路径或..跳出)
+
+    :param name: 参数名
+    :param path: 相对目录(为空不使用)
+    :return: 实际目录
+    """
+    if not path:
+        return path
+    base = os.path.realpath(settings.ryd_data_dir)
+    resolved = os.path.realpath(os.path.join(base, path))
+    if os.path.isabs(path) or os.path.commonpath([base, resolved]) != base:
+        raise HTTPException(status_code=400, detail=f"{name} must be a relative path inside the data dir: {path}")
+    return resolved
+
+
+def check_uri(uri: Optional[str]) -> Optional[str]:
+    """
+    目标地址只能是 ryd_api 或 ryd_allowed_uris 中的地址
+
+    :param uri: 为空时使用 ryd_api
+    :return:
+    """
+    if not uri:
+        return settings.ryd_api or None
+    allowed = {item.strip().rstrip("/") for item in settings.ryd_allowed_uris.split(",") if item.strip()}
+    if settings.ryd_api:
+        allowed.add(settings.ryd_api.rstrip("/"))
+    if uri.rstrip("/") not in allowed:
+        raise HTTPException(status_code=403, detail=f"uri not allowed: {uri}")
+    return uri
+
+
+def get_task(task_id: str) -> ManagedTask:
+    task = scheduler_starter.get(task_id)
+    if task is None or task.meta.get("job") is None:
+        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
+    return task
+
+
+@router.get("/jobs", response_model=schemas.Response[List[dict]], summary="发送任务列表")
+async def list_jobs() -> Any:
+    """
+    发送任务定义(序号用于启动)
+
+    :return:
+    """
+    return schemas.Response(data=[{
+        "job": index,
+        "title": send_data.get("title"),
+        "path": send_data.get("path"),
+        "pages": send_data.get("pages", 0),
+        "concurrency": send_data.get("concurrency", 1),
+    } for index, send_data in enumerate(mock._SEND_LIST_)])
+
+
+@router.post("/jobs/{job}/start", response_model=schemas.Response[dict], summary="启动发送任务")
+async def start_job(job: int, options: JobOptions = JobOptions()) -> Any:
+    """
+    启动发送任务(后台运行)
+
+    :param job: 任务序号
+    :param options: rate>0为压测模式; synthetic为合成数据页数;
+        uri只能是配置允许的地址, checkpoint_dir/snapshot_dir 为 ryd_data_dir 下的相对目录
+    :return:
+    """
+    if not 0 <= job < len(mock._SEND_LIST_):
+        raise HTTPException(status_code=404, detail=f"Job {job} not found")
+    # 同一任务同时运行会互相覆盖检查点
+    for task in scheduler_starter.list():
+        if task.meta.get("job") == job and not task.done:
+            raise HTTPException(status_code=409, detail=f"Job {job} is already {task.state} as task {task.id}")
+    options = options.dict()
+    options["uri"] = check_uri(options["uri"])
+    options["checkpoint_dir"] = resolve_dir("checkpoint_dir", options["checkpoint_dir"])
+    options["snapshot_dir"] = resolve_dir("snapshot_dir", options["snapshot_dir"])
+    task = mock.submit_job(job, options)
+    return schemas.Response(data=task.info())
+
+
+@router.get("/tasks", response_model=schemas.Response[List[dict]], summary="后台任务列表")
+async def list_tasks() -> Any:
+    return schemas.Response(data=[task.info() for task in scheduler_starter.list() if task.meta.get("job") is not None])
+
+
+@router.get("/tasks/{task_id}", response_model=schemas.Response[dict], summary="后台任务进度")
+async def get_task_info(task_id: str) -> Any:
+    return schemas.Response(data=get_task(task_id).info())
+
+
+@router.post("/tasks/{task_id}/stop", response_model=schemas.Response[dict], summary="停止后台任务")
+async def stop_task(task_id: str) -> Any:
+    task = get_task(task_id)
+    task.stop()
+    return schemas.Response(data=task.info())
+
+
+@router.post("/tasks/{task_id}/pause", response_model=schemas.Response[dict], summary="暂停后台任务")
+async def pause_task(task_id: str) -> Any:
+    task = get_task(task_id)
+    if not task.pause():
+        reason = "does not support pause" if not task.pausable else f"is {task.state}"
+        raise HTTPException(status_code=409, detail=f"Task {task_id} {reason}")
+    return schemas.Response(data=task.info())
+
+
+@router.post("/tasks/{task_id}/resume", response_model=schemas.Response[dict], summary="继续后台任务")
+async def resume_task(task_id: str) -> Any:
+    task = get_task(task_id)
+    if not task.resume():
+        raise HTTPException(status_code=409, detail=f"Task {task_id} is {task.state}")
+    return schemas.Response(data=task.info())
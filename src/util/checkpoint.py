@@ -0,0 +1,167 @@
+# coding:utf-8
+import hashlib
+import os
+import time
+from typing import Any, Dict, List
+
+from loguru import logger
+
+from util import serializer
+
+# 重发上次失败数据时登记的页号(页号从1开始)
+RETRY_PAGE = 0
+
+
+def job_hash(*parts: Any) -> str:
+    """
+    任务定义摘要(定义变化后不能续传)
+
+    :param parts: 可JSON序列化的任务定义
+    :return:
+    """
+    return hashlib.sha1(serializer.dumps(list(parts))).hexdigest()
+
+
+class Checkpoint(object):
+    """
+    发送进度检查点
+
+    记录已确认的页(该页及之前所有页的数据都已发送完成)、该页的数据源游标和累计计数;
+    页可以乱序完成, 只有连续完成的页才推进检查点. 写文件按时间间隔合并,
+    先写临时文件再替换, 中途退出不会留下半个文件.
+    续传从检查点的游标(下一页)开始, 中断时未确认页里已发出的数据会再发一次(至少一次);
+    counts 是累计发送次数, 包含这部分重发.
+    已确认页里发送失败的数据记在检查点的 failed 中, 续传时先重发(见retry), 重发全部结束前一直保留.
+    """
+
+    def __init__(self, file: str, digest: str, resume: bool = False, interval: float = 1.0):
+        """
+
+        :param file: 检查点文件
+        :param digest: 任务定义摘要
+        :param resume: 从已有检查点继续
+        :param interval: 写文件最小间隔(秒)
+        """
+        self.file = file
+        self.digest = digest
+        self.interval = interval
+        self.page = 0
+        self.cursor = None
+        self.counts: Dict[str, int] = {"sent": 0, "errors": 0}
+        self.finished = False
+        self.pending: Dict[int, int] = {}
+        self.cursors: Dict[int, Any] = {}
+        self.completed = set()
+        # 已确认页的失败数据, 续传时重发; 未确认页的失败数据按页暂存
+        self.failed: List[Any] = []
+        self.failures: Dict[int, List[Any]] = {}
+        self.retrying: List[Any] = []
+        self.flushed = 0.0
+        self.dirty = False
+        if resume:
+            self.load()
+
+    @property
+    def start_page(self) -> int:
+        return self.page + 1
+
+    def load(self):
+        if not os.path.exists(self.file):
+            return
+        with open(self.file, 'rb') as f:
+            data = serializer.loads(f.read())
+        if data.get("hash") != self.digest or "cursor" not in data:
+            logger.warning("Checkpoint {} does not match the job definition, start over", self.file)
+            return
+        self.page = data.get("page", 0)
+        self.cursor = data.get("cursor")
+        self.counts.update(data.get("counts", {}))
+        self.finished = data.get("finished", False)
+        self.failed = data.get("failed", [])
+        logger.info("Resume from checkpoint {}: page {} {}, {} failed", self.file, self.page, self.counts,
+                    len(self.failed))
+
+    def retry(self) -> List[Any]:
+        """
+        取出上次失败的数据重发, 作为第 RETRY_PAGE 页登记(add); 全部发完前仍写在检查点里,
+        再次失败的数据重新记入 failed
+
+        :return:
+        """
+        self.retrying, self.failed = self.failed, []
+        return self.retrying
+
+    def add(self, page: int, count: int, cursor: Any = None):
+        """
+        登记一页待发送的数据
+
+        :param page:
+        :param count: 数据条数
+        :param cursor: 数据源游标(从这里继续即为下一页)
+        :return:
+        """
+        self.pending[page] = self.pending.get(page, 0) + count
+        if page != RETRY_PAGE:
+            self.cursors[page] = cursor
+        if not count:
+            self._complete(page)
+
+    def done(self, page: int, ok: bool = True, data: Any = None):
+        """
+        一条数据发送完成(成功或失败)
+
+        :param page:
+        :param ok:
+        :param data: 失败时记录的数据(续传时重发)
+        :return:
+        """
+        self.counts["sent" if ok else "errors"] += 1
+        if not ok and data is not None:
+            self.failures.setdefault(page, []).append(data)
+        self.pending[page] -= 1
+        self.dirty = True
+        if self.pending[page] <= 0:
+            self._complete(page)
+        if time.monotonic() - self.flushed >= self.interval:
+            self.flush()
+
+    def _complete(self, page: int):
+        del self.pending[page]
+        self.dirty = True
+        if page == RETRY_PAGE:
+            self.retrying = []
+            self.failed.extend(self.failures.pop(page, []))
+            return
+        self.completed.add(page)
+        while self.page + 1 in self.completed:
+            self.page += 1
+            self.completed.discard(self.page)
+            self.cursor = self.cursors.pop(self.page, None)
+            self.failed.extend(self.failures.pop(self.page, []))
+
+    def finish(self):
+        self.finished = True
+        self.dirty = True
+        self.flush()
+
+    def flush(self):
+        if not self.dirty:
+            return
+        data = {
+            "hash": self.digest,
+            "page": self.page,
+            "cursor": self.cursor,
+            "counts": self.counts,
+            "failed": self.retrying + self.failed,
+            "finished": self.finished,
+            "updated": time.time(),
+        }
+        parent = os.path.dirname(self.file)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        tmp = f"{self.file}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(serializer.dumps(data))
+        os.replace(tmp, self.file)
+        self.flushed = time.monotonic()
+        self.dirty = False
@@ -0,0 +1,128 @@
+# coding:utf-8
+from typing import Dict, Iterable, Optional
+
+# 每个2的幂区间再分 _SUB_BUCKETS_//2 个桶, 相对误差 < 1/64
+_SUB_BITS_ = 7
+_SUB_BUCKETS_ = 1 << _SUB_BITS_
+_HALF_BUCKETS_ = _SUB_BUCKETS_ >> 1
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def bucket_index(value: int) -> int:
+    """
+    值所在桶(对数-线性分桶, 同HdrHistogram)
+
+    :param value: 非负整数
+    :return:
+    """
+    if value < _SUB_BUCKETS_:
+        return value
+    shift = value.bit_length() - _SUB_BITS_
+    return _SUB_BUCKETS_ + (shift - 1) * _HALF_BUCKETS_ + ((value >> shift) - _HALF_BUCKETS_)
+
+
+def bucket_value(index: int) -> int:
+    """
+    桶内最大值(报告时取上界, 不低估延迟)
+
+    :param index:
+    :return:
+    """
+    if index < _SUB_BUCKETS_:
+        return index
+    shift = (index - _SUB_BUCKETS_) // _HALF_BUCKETS_ + 1
+    sub = (index - _SUB_BUCKETS_) % _HALF_BUCKETS_ + _HALF_BUCKETS_
+    return ((sub + 1) << shift) - 1
+
+
+class Histogram(object):
+    """
+    延迟直方图(HDR风格, 固定相对精度, 可合并)
+
+    记录整数值(如微秒), 桶按需创建; 百分位取桶上界, 最大/最小值精确记录.
+    """
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min: Optional[int] = None
+        self.max: Optional[int] = None
+
+    def record(self, value: int, count: int = 1):
+        value = max(0, int(value))
+        index = bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.count += count
+        self.total += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other: "Histogram"):
+        """
+        合并另一个直方图
+
+        :param other:
+        :return:
+        """
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    def percentile(self, percent: float) -> int:
+        """
+        百分位值
+
+        :param percent: 0-100
+        :return:
+        """
+        if not self.count:
+            return 0
+        target = max(1, int(round(self.count * percent / 100.0)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(bucket_value(index), self.max)
+        return self.max
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self, percentiles: Iterable[float] = PERCENTILES) -> dict:
+        res = {
+            "count": self.count,
+            "min": self.min or 0,
+            "mean": round(self.mean(), 1),
+        }
+        for percent in percentiles:
+            res[f"p{percent:g}"] = self.percentile(percent)
+        res["max"] = self.max or 0
+        return res
+
+    def to_dict(self) -> dict:
+        return {
+            "counts": {str(index): count for index, count in self.counts.items()},
+            "count": self.count,
+            "total": self.total,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Histogram":
+        histogram = cls()
+        histogram.counts = {int(index): count for index, count in data.get("counts", {}).items()}
+        histogram.count = data.get("count", 0)
+        histogram.total = data.get("total", 0)
+        histogram.min = data.get("min")
+        histogram.max = data.get("max")
+        return histogram
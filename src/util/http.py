@@ -1,8 +1,24 @@
 # coding: utf-8
+import asyncio
+import random
 import ssl
-from typing import Union
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple, Union
 
-from httpx import AsyncClient, HTTPStatusError, Response, TimeoutException
+from httpx import (AsyncClient, ConnectError, ConnectTimeout, Headers, HTTPError as HttpxError, HTTPStatusError,
+                   Limits, NetworkError, PoolTimeout, RemoteProtocolError, Request, Response, Timeout,
+                   TimeoutException, TransportError)
+from loguru import logger
+
+from util import serializer
+from util.histogram import Histogram
+
+try:
+    import h2
+except ImportError:
+    h2 = None
 
 try:
     from urllib.error import HTTPError
@@ -13,9 +29,162 @@ except ImportError:
 
 try:
     ssl._create_default_https_context = ssl._create_stdlib_context
-except:
+except AttributeError:
     pass
 
+# 开始建连接或发送请求头, 之前的时间是在连接池排队(含客户端组装请求的开销)
+_CONNECT_EVENTS_ = ("connection.connect_tcp.started",)
+_SEND_EVENTS_ = ("http11.send_request_headers.started", "http2.send_request_headers.started")
+
+# 当前任务的连接池等待回调(等待秒数, 是否新建连接), 任务内创建的协程继承
+pool_observer: ContextVar[Optional[Callable[[float, bool], None]]] = ContextVar("pool_observer", default=None)
+# 当前任务的重试/熔断事件回调(事件名, 见HttpClient.counters), 任务内创建的协程继承
+retry_observer: ContextVar[Optional[Callable[[str], None]]] = ContextVar("retry_observer", default=None)
+
+# 幂等方法(重复执行没有副作用, 可以重试)
+_IDEMPOTENT_METHODS_ = frozenset(("GET", "HEAD", "PUT", "DELETE", "OPTIONS", "TRACE"))
+# 带这个请求头的非幂等请求由服务端去重, 可以重试
+_IDEMPOTENCY_HEADER_ = "idempotency-key"
+# 请求没有发到服务端的错误, 任何方法都可以重试
+_NOT_SENT_ERRORS_ = (ConnectError, ConnectTimeout, PoolTimeout)
+
+
+class PoolTiming(object):
+    """
+    连接池计时: 请求取到连接前的等待时间(微秒)和新建连接数
+    """
+
+    def __init__(self):
+        self.wait = Histogram()
+        self.connections = 0
+
+    def record(self, wait: float, connected: bool):
+        self.wait.record(wait * 1e6)
+        if connected:
+            self.connections += 1
+
+    def summary(self) -> dict:
+        return {"connections": self.connections, "wait_us": self.wait.summary()}
+
+
+class CircuitOpenError(HttpxError):
+    """
+    熔断中, 请求没有发出
+    """
+
+    def __init__(self, message: str, request: Request):
+        super().__init__(message)
+        self.request = request
+
+
+@dataclass(frozen=True)
+class RetryPolicy(object):
+    """
+    重试策略
+
+    只重试幂等请求(幂等方法, 或带 Idempotency-Key 请求头), unsafe为True时也重试POST等非幂等请求;
+    连接失败或等待连接超时(请求没有发出)时任何请求都重试.
+    退避时间为 [0, min(max_backoff, backoff * 2^重试次数)] 的随机值(full jitter), 响应带 Retry-After 时不少于它.
+    每个请求存入 budget_ratio 个令牌(最多 budget_reserve 个), 每次重试取一个, 令牌不够不重试:
+    服务整体出错时重试最多增加 budget_ratio 的请求量, 不会放大成重试风暴.
+    """
+    max_retries: int = 2
+    backoff: float = 0.1
+    max_backoff: float = 5.0
+    retry_status: FrozenSet[int] = frozenset((408, 429, 502, 503, 504))
+    unsafe: bool = False
+    budget_ratio: float = 0.1
+    budget_reserve: float = 10.0
+
+    def retryable(self, method: str, headers: Headers, err: Exception) -> bool:
+        if isinstance(err, _NOT_SENT_ERRORS_):
+            return True
+        if not (self.unsafe or method.upper() in _IDEMPOTENT_METHODS_ or _IDEMPOTENCY_HEADER_ in headers):
+            return False
+        if isinstance(err, HTTPStatusError):
+            return err.response.status_code in self.retry_status
+        return isinstance(err, (TimeoutException, NetworkError, RemoteProtocolError))
+
+    def delay(self, attempt: int, err: Exception) -> float:
+        """
+        第attempt次重试前的等待时间(秒)
+
+        :param attempt: 重试次数(从0开始)
+        :param err:
+        :return:
+        """
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if isinstance(err, HTTPStatusError):
+            retry_after = err.response.headers.get("retry-after", "")
+            if retry_after.isdigit():
+                delay = max(delay, min(float(retry_after), self.max_backoff))
+        return delay
+
+
+class RetryBudget(object):
+    """
+    重试预算(令牌桶, 见RetryPolicy)
+    """
+
+    def __init__(self, ratio: float, reserve: float):
+        self.ratio = ratio
+        self.reserve = reserve
+        self.tokens = reserve
+
+    def deposit(self):
+        self.tokens = min(self.reserve, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class CircuitBreaker(object):
+    """
+    熔断器(按主机共用, 见host_breaker)
+
+    连续 threshold 次失败(超时, 连接错误, 5xx, 429)后打开, 打开期间请求直接抛出 CircuitOpenError,
+    不再排队等超时; reset_timeout 秒后放一个探测请求(半开), 成功则关闭, 失败则重新打开.
+    """
+
+    def __init__(self, host: str, threshold: int = 5, reset_timeout: float = 10.0):
+        self.host = host
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened = 0.0
+
+    def allow(self) -> bool:
+        """
+        是否放行请求(半开时每 reset_timeout 秒放行一个)
+
+        :return:
+        """
+        if self.state == "closed":
+            return True
+        now = time.monotonic()
+        if now - self.opened < self.reset_timeout:
+            return False
+        self.state = "half_open"
+        self.opened = now
+        return True
+
+    def record(self, ok: bool):
+        if ok:
+            if self.state != "closed":
+                logger.info("Circuit closed: {}", self.host)
+            self.state = "closed"
+            self.failures = 0
+            return
+        self.failures += 1
+        if self.state == "half_open" or (self.state == "closed" and self.failures >= self.threshold):
+            logger.warning("Circuit open: {} ({} failures)", self.host, self.failures)
+            self.state = "open"
+            self.opened = time.monotonic()
+
 
 class HttpClient(object):
     """
@@ -31,7 +200,15 @@ class HttpClient(object):
                  uri,
                  ssl_verify=False,
                  proxies: dict = {},
-                 headers: dict = {}, ):
+                 headers: dict = {},
+                 max_connections: Optional[int] = 100,
+                 max_keepalive: Optional[int] = 20,
+                 keepalive_expiry: Optional[float] = 5.0,
+                 pool_timeout: Optional[float] = None,
+                 http2: bool = False,
+                 retry: Optional[RetryPolicy] = None,
+                 breaker_threshold: int = 0,
+                 breaker_reset: float = 10.0, ):
         """
         Initialize the class with the URL of the API
 
@@ -40,8 +217,17 @@ class HttpClient(object):
 
         :param ssl_verify: SSL certificates
 
+        :param max_connections: 连接池最大连接数(None不限), 超出的请求排队等待连接
+        :param max_keepalive: 保持的空闲连接数
+        :param keepalive_expiry: 空闲连接保持时间(秒)
+        :param pool_timeout: 等待连接的超时时间(秒, 默认同请求超时), 超时抛出 PoolTimeout
+        :param http2: 使用HTTP/2(需要安装h2, 一个连接多路复用)
+        :param retry: 重试策略(None不重试), 流式请求不重试
+        :param breaker_threshold: 连续失败多少次熔断(0不熔断), 同一主机的客户端共用熔断器
+        :param breaker_reset: 熔断后多久放行探测请求(秒)
+
         :raises SaltApiException: if the uri is misformed
-        
+
         """
         split = urlparse.urlsplit(uri)
         if split.scheme not in ['http', 'https']:
@@ -53,10 +239,102 @@ class HttpClient(object):
         self.header_default = headers
         self.stream_resp = []
         self.timeout_default = 15
+        self.limits = Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive,
+                             keepalive_expiry=keepalive_expiry)
+        self.pool_timeout = pool_timeout
+        self.http2 = http2
+        if http2 and h2 is None:
+            logger.warning("h2 is not installed, fall back to HTTP/1.1: {}", uri)
+            self.http2 = False
+        self.timing = PoolTiming()
+        self.retry = retry
+        self.budget = RetryBudget(retry.budget_ratio, retry.budget_reserve) if retry else None
+        self.breaker = host_breaker(split.netloc, breaker_threshold, breaker_reset) if breaker_threshold else None
+        self.counters = {"retries": 0, "retry_budget_exhausted": 0, "circuit_open": 0}
         self.client = self.get_client()
 
     def get_client(self) -> AsyncClient:
-        return AsyncClient(verify=self.ssl_verify, proxies=self.proxies)
+        return AsyncClient(verify=self.ssl_verify, proxies=self.proxies, limits=self.limits, http2=self.http2)
+
+    def _timeout(self, timeout) -> Union[float, Timeout]:
+        if self.pool_timeout is None:
+            return timeout
+        return Timeout(timeout, pool=self.pool_timeout)
+
+    def _extensions(self) -> dict:
+        """
+        请求跟踪: 记录从发起请求到开始建连接或发送请求头的时间(连接池排队)
+
+        :return:
+        """
+        start = time.perf_counter()
+        observer = pool_observer.get()
+        waited = False
+
+        async def trace(event: str, info: dict):
+            nonlocal waited
+            if waited:
+                return
+            connected = event in _CONNECT_EVENTS_
+            if connected or event in _SEND_EVENTS_:
+                waited = True
+                wait = time.perf_counter() - start
+                self.timing.record(wait, connected)
+                if observer is not None:
+                    observer(wait, connected)
+
+        return {"trace": trace}
+
+    def _count(self, event: str):
+        self.counters[event] += 1
+        observer = retry_observer.get()
+        if observer is not None:
+            observer(event)
+
+    def _check_circuit(self, method: str, url: str):
+        if self.breaker is not None and not self.breaker.allow():
+            self._count("circuit_open")
+            raise CircuitOpenError(f"Circuit open: {self.breaker.host}", request=Request(method, url))
+
+    def _record_circuit(self, err: Optional[Exception] = None):
+        if self.breaker is not None:
+            self.breaker.record(err is None or not self.is_overload(err))
+
+    async def _send(self, method: str, url: str, retry: bool = True, **kwargs) -> Response:
+        """
+        发送请求: 熔断检查, 按重试策略重试(见RetryPolicy), 非2xx抛出 HTTPStatusError
+
+        :param method:
+        :param url:
+        :param retry: 是否可以重试(请求体只能读一次时为False)
+        :param kwargs: AsyncClient.request 参数
+        :return:
+        """
+        policy = self.retry if retry else None
+        if policy is not None:
+            self.budget.deposit()
+        attempt = 0
+        while True:
+            self._check_circuit(method, url)
+            try:
+                resp = await self.client.request(method=method, url=url, extensions=self._extensions(), **kwargs)
+                resp.raise_for_status()
+            except (HTTPStatusError, TransportError) as e:
+                self._record_circuit(e)
+                if policy is None or attempt >= policy.max_retries or \
+                        not policy.retryable(method, Headers(kwargs.get("headers")), e):
+                    raise
+                if not self.budget.withdraw():
+                    self._count("retry_budget_exhausted")
+                    raise
+                delay = policy.delay(attempt, e)
+                self._count("retries")
+                logger.debug("Retry {} {} in {:.3f}s: {}", method, url, delay, e)
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self._record_circuit()
+            return resp
 
     async def req_stream(self, path, timeout=120, headers: dict = {}):
         """
@@ -75,12 +353,20 @@ class HttpClient(object):
         :rtype: requests.Response
         """
 
-        async with self.client.stream(method='GET', url=self._construct_url(path),
-                                      headers=self.__get_headers__(headers), timeout=timeout) as resp:
-            resp.raise_for_status()
-            self.stream_resp.append(resp)
-            async for line in resp.aiter_lines():
-                yield line
+        url = self._construct_url(path)
+        self._check_circuit('GET', url)
+        try:
+            async with self.client.stream(method='GET', url=url,
+                                          headers=self.__get_headers__(headers), timeout=self._timeout(timeout),
+                                          extensions=self._extensions()) as resp:
+                resp.raise_for_status()
+                self._record_circuit()
+                self.stream_resp.append(resp)
+                async for line in resp.aiter_lines():
+                    yield line
+        except (HTTPStatusError, TransportError) as e:
+            self._record_circuit(e)
+            raise
 
     async def req_get(self, path, timeout=None, headers: dict = {}) -> dict:
         """
@@ -91,22 +377,35 @@ class HttpClient(object):
         if not timeout:
             timeout = self.timeout_default
 
-        resp = await self.client.get(url=self._construct_url(path), headers=self.__get_headers__(headers),
-                                     timeout=timeout)
-        resp.raise_for_status()
-        return resp.json()
+        resp = await self._send('GET', self._construct_url(path), headers=self.__get_headers__(headers),
+                                timeout=self._timeout(timeout))
+        return serializer.loads(resp.content)
 
-    async def req_post(self, path: str, data=None, timeout=None, headers: dict = {},
+    async def req_post(self, path: str, data=None, timeout=None, headers: dict = {}, content: bytes = None,
                        **kwargs) -> Response:
+        """
+        POST请求
+
+        :param path:
+        :param data: JSON数据
+        :param timeout:
+        :param headers:
+        :param content: 已编码的JSON请求体(优先于data)
+        :return:
+        """
         if not timeout:
             timeout = self.timeout_default
 
-        resp = await self.client.post(url=self._construct_url(path),
-                                      headers=self.__get_headers__(headers),
-                                      json=data,
-                                      timeout=timeout)
-        resp.raise_for_status()
-        return resp.json()
+        req_headers = self.__get_headers__(headers)
+        if content is None and data is not None:
+            content = serializer.dumps(data)
+        if content is not None:
+            req_headers.setdefault('Content-Type', 'application/json')
+        resp = await self._send('POST', self._construct_url(path),
+                                headers=req_headers,
+                                content=content,
+                                timeout=self._timeout(timeout))
+        return serializer.loads(resp.content)
 
     async def req_json(self, path, data=None, timeout=None, headers: dict = {}, **kwargs) -> dict:
         """
@@ -129,6 +428,65 @@ class HttpClient(object):
 
         return await self.req_post(path=path, data=data, timeout=timeout, headers=req_headers)
 
+    async def req_post_stream(self, path: str, content: Iterable[bytes], timeout=None, headers: dict = {},
+                              **kwargs) -> dict:
+        """
+        流式发送请求体(分块传输), 不在内存中拼接完整请求体
+
+        api = HttpClient('http://ipaddress/api/')
+        print(await api.req_post_stream('/keys', jinja.render_stream(data, tpl)))
+
+        :param path:
+        :param content: 请求体块(同步迭代器, 如 jinja.render_stream)
+        :param timeout:
+        :param headers:
+        :return:
+        """
+        if not timeout:
+            timeout = self.timeout_default
+
+        req_headers = {
+            'Content-Type': 'application/json',
+        }
+        req_headers.update(headers)
+
+        async def body() -> AsyncIterator[bytes]:
+            # AsyncClient只接受异步迭代器
+            for chunk in content:
+                yield chunk
+
+        # 请求体只能读一次, 不重试
+        resp = await self._send('POST', self._construct_url(path), retry=False,
+                                headers=self.__get_headers__(req_headers),
+                                content=body(),
+                                timeout=self._timeout(timeout))
+        return serializer.loads(resp.content)
+
+    async def request(self, method: str, path: str, content: bytes = None, timeout=None,
+                      headers: Union[dict, List[Tuple[str, str]]] = ()) -> Response:
+        """
+        原样发送请求(不设置Content-Type, 不解析响应), 用于流量回放
+
+        :param method:
+        :param path: 路径(可带查询串)
+        :param content: 请求体
+        :param timeout:
+        :param headers: 原始请求头(可重复, 覆盖默认请求头时不区分大小写)
+        :return:
+        """
+        if not timeout:
+            timeout = self.timeout_default
+
+        req_headers = Headers(self.header_default)
+        req_headers.update(Headers(headers))
+        return await self._send(method, self._construct_url(path),
+                                headers=req_headers,
+                                content=content or None,
+                                timeout=self._timeout(timeout))
+
+    async def close(self):
+        await self.client.aclose()
+
     async def close_stream(self):
         for resp in self.stream_resp:
             await resp.aclose()
@@ -148,6 +506,17 @@ class HttpClient(object):
     def is_timeout(cls, err: HTTPError):
         return err.code in [408, 502, 504]
 
+    @classmethod
+    def is_overload(cls, err: Union[TimeoutException, HTTPStatusError, TransportError]) -> bool:
+        """
+        服务过载或不可用(计入熔断): 超时, 连接错误, 429, 5xx
+
+        :param err:
+        :return:
+        """
+        error = cls.to_http_error(err)
+        return cls.is_timeout(error) or error.code == 429 or error.code >= 500
+
     def _construct_url(self, path):
         """
         Construct the url to salt-api for the given path
@@ -171,3 +540,55 @@ class HttpClient(object):
         req_headers.update(self.header_default)
         req_headers.update(headers)
         return req_headers
+
+
+# 按主机共用的熔断器
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def host_breaker(host: str, threshold: int = 5, reset_timeout: float = 10.0) -> CircuitBreaker:
+    """
+    主机的熔断器(同一主机的客户端共用, 参数以首次创建时为准)
+
+    :param host: 主机(含端口)
+    :param threshold: 连续失败次数
+    :param reset_timeout: 熔断时间(秒)
+    :return:
+    """
+    breaker = _breakers.get(host)
+    if breaker is None:
+        breaker = _breakers[host] = CircuitBreaker(host, threshold=threshold, reset_timeout=reset_timeout)
+    return breaker
+
+
+# 共用的客户端(同一地址和参数共用一个连接池)
+_clients: Dict[tuple, HttpClient] = {}
+
+
+def shared_client(uri: str, headers: dict = {}, **kwargs) -> HttpClient:
+    """
+    共用客户端: 地址, 请求头和连接池参数相同时返回同一个实例, 多个任务共用连接池.
+    AsyncClient的连接属于创建它的事件循环, 事件循环结束前需调用 close_clients.
+
+    :param uri:
+    :param headers: 默认请求头
+    :param kwargs: HttpClient 参数
+    :return:
+    """
+    key = (uri, tuple(sorted(headers.items())), tuple(sorted(kwargs.items())))
+    client = _clients.get(key)
+    if client is None:
+        client = _clients[key] = HttpClient(uri, headers=headers, **kwargs)
+    return client
+
+
+async def close_clients():
+    """
+    关闭所有共用客户端
+
+    :return:
+    """
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.close()
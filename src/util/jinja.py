@@ -1,27 +1,187 @@
 # coding:utf-8
+import hashlib
+import json
+import os
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, Iterator, Optional, Tuple
 
-from jinja2 import Environment, meta, Template
+from jinja2 import DictLoader, Environment, ModuleLoader, meta, Template
+from jinja2.utils import import_string
+
+# 已编译模板缓存数
+_CACHE_SIZE_ = 256
+# 流式渲染合并块大小(字符)
+_CHUNK_SIZE_ = 64 * 1024
+# 预编译模板清单(模板名 -> 模板变量)
+_MANIFEST_ = "templates.json"
+
+# 已加载的预编译模板: (Environment, 清单)
+_precompiled: Optional[Tuple[Environment, Dict[str, list]]] = None
+
+
+@lru_cache(maxsize=32)
+def get_environment(extensions: tuple = ()) -> Environment:
+    """
+    按扩展集合复用Environment
+
+    :param extensions:
+    :return:
+    """
+    return Environment(extensions=list(extensions))
+
+
+@lru_cache(maxsize=_CACHE_SIZE_)
+def compile_template(tpl_content: str, extensions: tuple = ()) -> Tuple[FrozenSet[str], Template]:
+    """
+    解析并编译模板(按模板内容+扩展缓存)
+
+    :param tpl_content: 模板内容
+    :param extensions: 扩展
+    :return: 模板变量, 模板
+    """
+    precompiled = get_precompiled(tpl_content, extensions)
+    if precompiled is not None:
+        return precompiled
+    env = get_environment(extensions)
+    parsed_content = env.parse(tpl_content)
+    return frozenset(meta.find_undeclared_variables(parsed_content)), env.from_string(parsed_content)
+
+
+@lru_cache(maxsize=_CACHE_SIZE_)
+def compile_file(tpl_file: str, mtime: float, extensions: tuple = ()) -> Tuple[FrozenSet[str], Template]:
+    """
+    解析并编译模板文件(按路径+修改时间+扩展缓存, 文件修改后自动失效)
+
+    :param tpl_file: 模板文件
+    :param mtime: 修改时间
+    :param extensions: 扩展
+    :return: 模板变量, 模板
+    """
+    with open(tpl_file, 'r') as f:
+        data = f.read()
+    return compile_template.__wrapped__(data, extensions)
+
+
+def extension_names(extensions: Iterable = ()) -> Tuple[str, ...]:
+    """
+    扩展标识(扩展类, 实例或导入路径), 排序后返回
+
+    :param extensions:
+    :return:
+    """
+    return tuple(sorted((import_string(item) if isinstance(item, str) else item).identifier
+                        for item in extensions))
+
+
+def template_name(tpl_content: str, extensions: Iterable = ()) -> str:
+    """
+    预编译模板名(按模板内容+扩展, 扩展不同的编译结果不通用)
+
+    :param tpl_content:
+    :param extensions: 扩展
+    :return:
+    """
+    key = "\0".join((tpl_content,) + extension_names(extensions))
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def precompile(sources: Iterable[str], target: str, extensions=[]) -> int:
+    """
+    把模板预编译成Python模块, 运行时通过ModuleLoader加载, 不再解析模板
+
+    :param sources: 模板内容
+    :param target: 输出目录
+    :param extensions: 扩展
+    :return: 模板数
+    """
+    templates = {template_name(source, extensions): source for source in sources}
+    env = Environment(loader=DictLoader(templates), extensions=list(extensions))
+    os.makedirs(target, exist_ok=True)
+    env.compile_templates(target, zip=None, ignore_errors=False)
+    manifest = {}
+    for name, source in templates.items():
+        manifest[name] = sorted(meta.find_undeclared_variables(env.parse(source)))
+    with open(os.path.join(target, _MANIFEST_), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    return len(templates)
+
+
+def load_precompiled(path: str, extensions=[]) -> int:
+    """
+    加载预编译模板目录(render/compile_template优先使用)
+
+    :param path: precompile输出目录
+    :param extensions: 扩展
+    :return: 模板数
+    """
+    global _precompiled
+    with open(os.path.join(path, _MANIFEST_), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    _precompiled = Environment(loader=ModuleLoader(path), extensions=list(extensions)), manifest
+    cache_clear()
+    return len(manifest)
+
+
+def get_precompiled(tpl_content: str, extensions: Iterable = ()) -> Optional[Tuple[FrozenSet[str], Template]]:
+    """
+    取得预编译模板(未预编译或预编译时的扩展不同返回None)
+
+    :param tpl_content:
+    :param extensions: 扩展
+    :return: 模板变量, 模板
+    """
+    if _precompiled is None:
+        return None
+    env, manifest = _precompiled
+    name = template_name(tpl_content, extensions)
+    if name not in manifest:
+        return None
+    return frozenset(manifest[name]), env.get_template(name)
 
 
 # 从模板中取得所有变量
 def get_all_variables(tpl_content: str, extensions=[]):
-    env = Environment(extensions=extensions)
-    parsed_content = env.parse(tpl_content)
-    return meta.find_undeclared_variables(parsed_content), Template(parsed_content)
+    return compile_template(tpl_content, tuple(extensions))
 
 
 # 从文件取得模板和模板中变量
 def get_all_variables_from_file(tpl_file, extensions=[]):
-    with open(tpl_file, 'r') as f:
-        data = f.read()
-    return get_all_variables(data, extensions)
+    return compile_file(tpl_file, os.stat(tpl_file).st_mtime, tuple(extensions))
 
 
-# 替换变量
-def render(kv_list, content=None, file=None, extensions=[]):
-    if content and ("{{" not in content):
-        return content
+def cache_stats() -> dict:
+    """
+    模板缓存统计
+
+    :return:
+    """
+    stats = {}
+    for name, func in (("content", compile_template), ("file", compile_file)):
+        info = func.cache_info()
+        stats[name] = {
+            "size": info.currsize,
+            "maxsize": info.maxsize,
+            "hits": info.hits,
+            "misses": info.misses,
+        }
+    return stats
+
+
+def cache_clear():
+    compile_template.cache_clear()
+    compile_file.cache_clear()
 
+
+def prepare(kv_list, content=None, file=None, extensions=[]) -> Tuple[Template, dict]:
+    """
+    取得编译后的模板和模板用到的变量
+
+    :param kv_list: 数据
+    :param content: 模板内容
+    :param file: 模板文件
+    :param extensions: 扩展
+    :return: 模板, 变量
+    """
     # 导入模板， 检查变量是否都有
     if file:
         var_list, template = get_all_variables_from_file(file, extensions)
@@ -31,9 +191,49 @@ def render(kv_list, content=None, file=None, extensions=[]):
     for v in var_list:
         if v in kv_list.keys():
             variables[v] = kv_list[v]
+    return template, variables
+
+
+# 替换变量
+def render(kv_list, content=None, file=None, extensions=[]):
+    if content and ("{{" not in content):
+        return content
+
+    template, variables = prepare(kv_list, content, file, extensions)
 
     # if len(variables.keys())==0:
     #    return template_content  # 没匹配到变量
 
     # 替换变量
     return template.render(variables)
+
+
+def iter_chunks(parts: Iterator[str], chunk_size: int = _CHUNK_SIZE_) -> Iterator[bytes]:
+    """
+    合并渲染片段并编码, Template.generate产出的片段很碎, 逐个发送开销太大
+
+    :param parts: 渲染片段
+    :param chunk_size: 合并块大小(字符)
+    :return:
+    """
+    buffer = []
+    size = 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield "".join(buffer).encode("utf-8")
+            buffer.clear()
+            size = 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+# 流式替换变量, 不拼接完整结果
+def render_stream(kv_list, content=None, file=None, extensions=[], chunk_size: int = _CHUNK_SIZE_) -> Iterator[bytes]:
+    if content and ("{{" not in content):
+        yield content.encode("utf-8")
+        return
+
+    template, variables = prepare(kv_list, content, file, extensions)
+    yield from iter_chunks(template.generate(variables), chunk_size=chunk_size)
@@ -0,0 +1,307 @@
+# coding:utf-8
+import asyncio
+import multiprocessing
+import queue
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from httpx import HTTPStatusError
+from loguru import logger
+
+from util import http, serializer
+from util.histogram import Histogram
+
+
+def error_kind(err: Exception) -> str:
+    """
+    错误分类(HTTP状态码或异常类名)
+
+    :param err:
+    :return:
+    """
+    if isinstance(err, HTTPStatusError):
+        return f"http_{err.response.status_code}"
+    return err.__class__.__name__
+
+
+class LoadStats(object):
+    """
+    压测统计: 延迟直方图(微秒, 从计划发送时间算起) + 错误计数 + 连接池等待直方图(微秒) + 重试/熔断计数
+
+    连接池等待是延迟的一部分, 等待高说明瓶颈在客户端连接数而不是服务端.
+    重试的等待也计入延迟, 一个请求不管重试几次只记一次完成或失败.
+    """
+
+    def __init__(self, name: str = "", rate: float = 0):
+        self.name = name
+        self.rate = rate
+        self.histogram = Histogram()
+        self.pool_wait = Histogram()
+        self.errors: Dict[str, int] = {}
+        self.events: Dict[str, int] = {}
+        self.started = time.time()
+        self.elapsed = 0.0
+
+    @property
+    def completed(self) -> int:
+        return self.histogram.count
+
+    @property
+    def failed(self) -> int:
+        return sum(self.errors.values())
+
+    def record(self, latency: float):
+        self.histogram.record(latency * 1e6)
+
+    def error(self, kind: str, latency: float):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+        self.histogram.record(latency * 1e6)
+
+    def record_pool(self, wait: float, connected: bool = False):
+        self.pool_wait.record(wait * 1e6)
+
+    def record_event(self, event: str):
+        self.events[event] = self.events.get(event, 0) + 1
+
+    def merge(self, other: "LoadStats"):
+        """
+        合并并行执行的统计(速率相加, 耗时取最长)
+
+        :param other:
+        :return:
+        """
+        self.rate += other.rate
+        self.histogram.merge(other.histogram)
+        self.pool_wait.merge(other.pool_wait)
+        for kind, count in other.errors.items():
+            self.errors[kind] = self.errors.get(kind, 0) + count
+        for event, count in other.events.items():
+            self.events[event] = self.events.get(event, 0) + count
+        self.started = min(self.started, other.started)
+        self.elapsed = max(self.elapsed, other.elapsed)
+
+    def summary(self) -> dict:
+        return {
+            "name": self.name,
+            "rate": self.rate,
+            "completed": self.completed,
+            "failed": self.failed,
+            "elapsed": round(self.elapsed, 3),
+            "throughput": round(self.completed / self.elapsed, 1) if self.elapsed else 0,
+            "latency_us": self.histogram.summary(),
+            "pool_wait_us": self.pool_wait.summary(),
+            "errors": dict(self.errors),
+            "events": dict(self.events),
+        }
+
+    def to_dict(self) -> dict:
+        res = self.summary()
+        res["started"] = self.started
+        res["histogram"] = self.histogram.to_dict()
+        res["pool_histogram"] = self.pool_wait.to_dict()
+        return res
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LoadStats":
+        stats = cls(name=data.get("name", ""), rate=data.get("rate", 0))
+        stats.histogram = Histogram.from_dict(data.get("histogram", {}))
+        stats.pool_wait = Histogram.from_dict(data.get("pool_histogram", {}))
+        stats.errors = dict(data.get("errors", {}))
+        stats.events = dict(data.get("events", {}))
+        stats.started = data.get("started", stats.started)
+        stats.elapsed = data.get("elapsed", 0.0)
+        return stats
+
+    def __str__(self):
+        latency = self.histogram.summary()
+        pool_wait = self.pool_wait.summary()
+        events = "".join(f", {event}={count}" for event, count in sorted(self.events.items()))
+        return ("{name}: {completed} requests ({failed} failed) in {elapsed:.1f}s, {throughput:.1f}/s, "
+                "latency ms p50={p50:.1f} p90={p90:.1f} p99={p99:.1f} p99.9={p999:.1f} max={max:.1f}, "
+                "pool wait ms p50={wait50:.1f} p99={wait99:.1f}").format(
+            name=self.name, completed=self.completed, failed=self.failed, elapsed=self.elapsed,
+            throughput=self.completed / self.elapsed if self.elapsed else 0,
+            p50=latency["p50"] / 1e3, p90=latency["p90"] / 1e3, p99=latency["p99"] / 1e3,
+            p999=latency["p99.9"] / 1e3, max=latency["max"] / 1e3,
+            wait50=pool_wait["p50"] / 1e3, wait99=pool_wait["p99"] / 1e3) + events
+
+
+async def _pace(start: float, offset: Optional[float], in_flight: set, max_in_flight: int) -> float:
+    """
+    等到计划时间, 在途请求达到上限时再等其中一个完成
+
+    :param start: 开始时间(loop.time)
+    :param offset: 计划时间(相对开始, None为不排时间线)
+    :param in_flight: 在途请求
+    :param max_in_flight: 在途请求上限
+    :return: 延迟的起算时间
+    """
+    loop = asyncio.get_running_loop()
+    if offset is not None:
+        delay = start + offset - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    while len(in_flight) >= max_in_flight:
+        await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+    return loop.time() if offset is None else start + offset
+
+
+async def run_scheduled(request: Callable[[Any], Awaitable],
+                        schedule: AsyncIterator[Tuple[Optional[float], Any]],
+                        max_in_flight: int = 10000,
+                        stats: Optional[LoadStats] = None) -> LoadStats:
+    """
+    按计划时间发送: schedule 产出 (相对开始的计划时间(秒), 数据), 不等待之前的响应;
+    延迟从计划时间算起, 服务变慢时排队时间也计入(避免coordinated omission).
+    计划时间为None时不排时间线, 只受在途上限约束, 延迟从实际发出算起.
+
+    :param request: 发送一条数据
+    :param schedule: (计划时间, 数据)
+    :param max_in_flight: 在途请求上限(防止服务卡死时无限堆积, 超出时延后发送, 延迟照常计入)
+    :param stats:
+    :return:
+    """
+    if stats is None:
+        stats = LoadStats()
+    loop = asyncio.get_running_loop()
+    in_flight = set()
+    # 请求协程在设置之后创建, 继承这些回调
+    observer = http.pool_observer.set(stats.record_pool)
+    retry_observer = http.retry_observer.set(stats.record_event)
+
+    async def one(record, intended: float):
+        try:
+            await request(record)
+            stats.record(loop.time() - intended)
+        except Exception as e:
+            stats.error(error_kind(e), loop.time() - intended)
+            logger.debug("Load Error: {} {}", stats.name, e)
+
+    start = loop.time()
+    try:
+        async for offset, record in schedule:
+            intended = await _pace(start, offset, in_flight, max_in_flight)
+            task = asyncio.create_task(one(record, intended))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        if in_flight:
+            await asyncio.wait(in_flight)
+    finally:
+        for task in in_flight:
+            task.cancel()
+        http.pool_observer.reset(observer)
+        http.retry_observer.reset(retry_observer)
+        stats.elapsed = loop.time() - start
+    return stats
+
+
+async def run_open_loop(request: Callable[[Any], Awaitable],
+                        records: AsyncIterator[Any],
+                        rate: float,
+                        duration: Optional[float] = None,
+                        max_in_flight: int = 10000,
+                        stats: Optional[LoadStats] = None) -> LoadStats:
+    """
+    开环压测: 第i个请求固定在 start + i/rate 发出, 不等待之前的响应(见run_scheduled)
+
+    :param request: 发送一条数据
+    :param records: 数据
+    :param rate: 目标请求数/秒
+    :param duration: 最长时间(秒), 默认发完数据为止
+    :param max_in_flight: 在途请求上限
+    :param stats:
+    :return:
+    """
+    if stats is None:
+        stats = LoadStats(rate=rate)
+    interval = 1.0 / rate
+
+    async def schedule():
+        i = 0
+        async for record in records:
+            offset = i * interval
+            if duration and offset >= duration:
+                return
+            yield offset, record
+            i += 1
+
+    return await run_scheduled(request=request, schedule=schedule(), max_in_flight=max_in_flight, stats=stats)
+
+
+def write_report(file: str, stats_list: Iterable[LoadStats]):
+    """
+    输出JSON报告
+
+    :param file:
+    :param stats_list:
+    :return:
+    """
+    report: List[dict] = [stats.summary() for stats in stats_list]
+    with open(file, 'wb') as f:
+        f.write(serializer.dumps({"jobs": report}))
+
+
+def merge_snapshots(snapshots: Iterable[dict]) -> Union[LoadStats, Dict[str, int]]:
+    """
+    合并各进程的统计快照(压测统计合并直方图, 发送统计累加计数)
+
+    :param snapshots:
+    :return:
+    """
+    snapshots = list(snapshots)
+    if snapshots and "histogram" in snapshots[0]:
+        merged = LoadStats.from_dict(snapshots[0])
+        for snapshot in snapshots[1:]:
+            merged.merge(LoadStats.from_dict(snapshot))
+        return merged
+    counters = {}
+    for snapshot in snapshots:
+        for key, value in snapshot.items():
+            counters[key] = counters.get(key, 0) + value
+    return counters
+
+
+def run_workers(target: Callable, workers: int, args: tuple = (), interval: float = 1.0,
+                progress: Callable[[Any], None] = None) -> Union[LoadStats, Dict[str, int]]:
+    """
+    多进程执行, 父进程实时合并统计
+
+    target(worker_id, workers, *args, snapshots) 在子进程执行, 定期往snapshots队列放
+    (worker_id, 是否结束, 统计快照), 快照是累计值, 父进程只保留每个进程最新的一份.
+
+    :param target: 子进程函数(需可pickle)
+    :param workers: 进程数
+    :param args:
+    :param interval: 进度回调间隔(秒)
+    :param progress: 进度回调(合并后的统计)
+    :return: 合并后的统计
+    """
+    snapshots = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=target, args=(worker_id, workers) + tuple(args) + (snapshots,))
+                 for worker_id in range(workers)]
+    for process in processes:
+        process.start()
+    latest: Dict[int, dict] = {}
+    done = set()
+    last = time.monotonic()
+    try:
+        while len(done) < workers:
+            try:
+                worker_id, finished, snapshot = snapshots.get(timeout=interval)
+                latest[worker_id] = snapshot
+                if finished:
+                    done.add(worker_id)
+            except queue.Empty:
+                pass
+            if len(done) < workers and not any(process.is_alive() for process in processes):
+                logger.error("Workers exited without result: {}", sorted(set(range(workers)) - done))
+                break
+            if progress and latest and time.monotonic() - last >= interval:
+                last = time.monotonic()
+                progress(merge_snapshots(latest.values()))
+    finally:
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+    return merge_snapshots(latest.values())
@@ -1,4 +1,7 @@
-from typing import Optional, List
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional, List, Tuple
 
 import pymysql
 from pydantic import BaseModel
@@ -26,6 +29,53 @@ def connect(settings: dict) -> pymysql.Connect:
                            charset='utf8mb4')
 
 
+class Pool(object):
+    """
+    连接池: 连接用完放回复用, 取出时ping检查(断开自动重连), 同时取出的连接数不超过size;
+    使用中出错的连接直接关闭, 不放回.
+
+    pool = Pool({"host": "127.0.0.1", "password": ""})
+    with pool.connection() as conn:
+        query(conn, "select 1")
+    """
+
+    def __init__(self, settings: dict, size: int = 1):
+        """
+
+        :param settings: 连接配置(见connect)
+        :param size: 最大连接数
+        """
+        self.settings = settings
+        self.size = size
+        self.idle = queue.LifoQueue()
+        self.semaphore = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def connection(self) -> Iterator[pymysql.Connect]:
+        self.semaphore.acquire()
+        try:
+            try:
+                conn = self.idle.get_nowait()
+                conn.ping(reconnect=True)
+            except queue.Empty:
+                conn = connect(self.settings)
+            try:
+                yield conn
+            except BaseException:
+                conn.close()
+                raise
+            self.idle.put(conn)
+        finally:
+            self.semaphore.release()
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
 def query(conn: pymysql.Connect, sql: str, args: Optional[list] = None, close: bool = False) -> ResultSet:
     """
     查询
@@ -116,6 +166,44 @@ def batch_execute(conn: pymysql.Connect, sqls: List[str], args: Optional[list] =
             conn.close()
 
 
+def keyset(conn: pymysql.Connect, table: str, key: str = "id", columns: str = None, where: str = None,
+           args: Optional[list] = None, after=None, limit: int = 1000, shard: Tuple[int, int] = (0, 1)) -> List[dict]:
+    """
+    按主键分页查询(keyset): where key > after order by key limit n, 走索引定位, 不随页数变慢
+
+    :param conn:
+    :param table: 表名
+    :param key: 排序/分页的唯一键
+    :param columns: 查询列(默认key)
+    :param where: 附加条件(有参数时 % 需写成 %%)
+    :param args: 附加条件的参数
+    :param after: 上一页最后一条的key(None为第一页)
+    :param limit: 每页条数
+    :param shard: (分片序号, 分片数), 按 key % 分片数 分片(key需为整数)
+    :return:
+    """
+    conditions = []
+    params = []
+    if where:
+        conditions.append(f"({where})")
+        params.extend(args or [])
+    if after is not None:
+        conditions.append(f"{key} > %s")
+        params.append(after)
+    if shard[1] > 1:
+        conditions.append(f"{key} %% %s = %s")
+        params.extend([shard[1], shard[0]])
+    sql = f"select {columns or key} from {table}"
+    if conditions:
+        sql += " where " + " and ".join(conditions)
+    sql += f" order by {key} limit %s"
+    params.append(limit)
+    # 不经过ResultSet校验, 大页时省一次逐行复制
+    with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+        cursor.execute(query=sql, args=params)
+        return cursor.fetchall()
+
+
 def is_query(sql: str) -> bool:
     return sql.strip().split()[0].upper() in _TYPE_QUERY_
 
@@ -0,0 +1,119 @@
+# coding:utf-8
+import re
+from typing import Any, Callable, Dict, List, Tuple
+
+from util import serializer
+
+# 占位符: "${name}" 或 "${name:type}", 必须是完整的字符串值
+_RE_PLACEHOLDER_ = re.compile(r'^\$\{(\w+)(?::(\w+))?\}$')
+
+_NULL_ = b"null"
+
+
+def _encode_int(value) -> bytes:
+    return str(int(value)).encode("ascii")
+
+
+def _encode_float(value) -> bytes:
+    return serializer.dumps(float(value))
+
+
+def _encode_bool(value) -> bytes:
+    return b"true" if value else b"false"
+
+
+def _encode_str(value) -> bytes:
+    return serializer.dumps(str(value))
+
+
+def _encode_list(value) -> bytes:
+    return serializer.dumps(list(value))
+
+
+_ENCODERS_: Dict[str, Callable[[Any], bytes]] = {
+    "int": _encode_int,
+    "float": _encode_float,
+    "bool": _encode_bool,
+    "str": _encode_str,
+    "list": _encode_list,
+    "json": serializer.dumps,
+}
+
+
+def _compile(node: Any, segments: List[Any]):
+    """
+    展开骨架: 静态部分预先编码, 占位符记录为 (变量名, 编码函数)
+
+    :param node:
+    :param segments:
+    :return:
+    """
+    if isinstance(node, dict):
+        segments.append(b"{")
+        for i, (key, value) in enumerate(node.items()):
+            if i:
+                segments.append(b",")
+            segments.append(serializer.dumps(str(key)) + b":")
+            _compile(value, segments)
+        segments.append(b"}")
+    elif isinstance(node, (list, tuple)):
+        segments.append(b"[")
+        for i, value in enumerate(node):
+            if i:
+                segments.append(b",")
+            _compile(value, segments)
+        segments.append(b"]")
+    elif isinstance(node, str) and _RE_PLACEHOLDER_.match(node):
+        name, kind = _RE_PLACEHOLDER_.match(node).groups()
+        kind = kind or "json"
+        if kind not in _ENCODERS_:
+            raise ValueError(f"Unknown placeholder type: {kind} ({node})")
+        segments.append((name, _ENCODERS_[kind]))
+    else:
+        segments.append(serializer.dumps(node))
+
+
+def compile_payload(skeleton: Any) -> Callable[[dict], bytes]:
+    """
+    把JSON骨架编译成请求体生成函数(只编译一次, 每次调用一遍拼接出最终字节)
+
+    骨架中 "${name:type}" 形式的字符串值为占位符, type可选 int/float/bool/str/list/json(默认),
+    缺失的变量输出null.
+
+        build = compile_payload({"accountId": "${agent_id:int}", "terminals": "${terminal_ids:list}"})
+        build({"agent_id": 1, "terminal_ids": [1, 2]})  # b'{"accountId":1,"terminals":[1,2]}'
+
+    :param skeleton: JSON骨架
+    :return:
+    """
+    segments = []
+    _compile(skeleton, segments)
+
+    # 合并相邻静态部分, 得到 head + [(变量名, 编码函数, 静态后缀), ...]
+    head = b""
+    fields: List[Tuple[str, Callable[[Any], bytes], bytes]] = []
+    for segment in segments:
+        if isinstance(segment, bytes):
+            if fields:
+                name, encode, tail = fields[-1]
+                fields[-1] = (name, encode, tail + segment)
+            else:
+                head += segment
+        else:
+            fields.append((segment[0], segment[1], b""))
+
+    if not fields:
+        def build(data: dict) -> bytes:
+            return head
+
+        return build
+
+    def build(data: dict) -> bytes:
+        parts = [head]
+        for name, encode, tail in fields:
+            value = data.get(name)
+            parts.append(_NULL_ if value is None else encode(value))
+            parts.append(tail)
+        return b"".join(parts)
+
+    return build
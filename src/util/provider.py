@@ -0,0 +1,106 @@
+# coding:utf-8
+import asyncio
+import functools
+from typing import Any, AsyncIterator, Callable, List, Optional, Tuple
+
+from util import mysql
+
+# 数据源: provider(cursor=None, shard=(0, 1)) 异步产出 (游标, 本批数据);
+# 游标可JSON序列化, 传回 cursor 从该批之后继续;
+# shard 为 (分片序号, 分片数), 各分片数据不重叠
+Batch = Tuple[Any, List[dict]]
+Provider = Callable[..., AsyncIterator[Batch]]
+
+
+def blocking(func: Callable) -> Callable:
+    """
+    把阻塞函数放到线程池执行, 不阻塞事件循环
+
+    :param func:
+    :return:
+    """
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+    return wrapper
+
+
+@blocking
+def _keyset(pool: mysql.Pool, **kwargs) -> List[dict]:
+    with pool.connection() as conn:
+        return mysql.keyset(conn=conn, **kwargs)
+
+
+@blocking
+def query(pool: mysql.Pool, sql: str, args: Optional[list] = None) -> List[dict]:
+    """
+    查询(线程池执行)
+
+    :param pool: 连接池
+    :param sql:
+    :param args:
+    :return:
+    """
+    with pool.connection() as conn:
+        return mysql.query(conn=conn, sql=sql, args=args).rs
+
+
+async def iter_keyset(pool: mysql.Pool, table: str, key: str = "id", columns: str = None, where: str = None,
+                      args: Optional[list] = None, batch_size: int = 1000, limit: int = 0, cursor: dict = None,
+                      shard: Tuple[int, int] = (0, 1)) -> AsyncIterator[Batch]:
+    """
+    按主键分批读取(见mysql.keyset)
+
+    :param pool: 连接池
+    :param table: 表名
+    :param key: 分页键(整数主键, 分片按 key % 分片数)
+    :param columns: 查询列(默认key)
+    :param where: 附加条件
+    :param args: 附加条件的参数
+    :param batch_size: 每批条数
+    :param limit: 最多条数(0为不限), 分片时每片取 limit/分片数
+    :param cursor: 上次的游标 {"after": 最后一条的key, "count": 已取条数}
+    :param shard: (分片序号, 分片数)
+    :return: (游标, 本批数据)
+    """
+    cursor = dict(cursor or {"after": None, "count": 0})
+    if limit and shard[1] > 1:
+        limit = -(-limit // shard[1])
+    while not limit or cursor["count"] < limit:
+        size = min(batch_size, limit - cursor["count"]) if limit else batch_size
+        rows = await _keyset(pool, table=table, key=key, columns=columns, where=where, args=args,
+                             after=cursor["after"], limit=size, shard=shard)
+        if not rows:
+            return
+        cursor = {"after": rows[-1][key], "count": cursor["count"] + len(rows)}
+        yield cursor, rows
+        if len(rows) < size:
+            return
+
+
+async def prefetch(batches: AsyncIterator) -> AsyncIterator:
+    """
+    预取: 消费当前批时已经在取下一批
+
+    :param batches:
+    :return:
+    """
+    iterator = batches.__aiter__()
+    pending = asyncio.ensure_future(iterator.__anext__())
+    try:
+        while True:
+            try:
+                item = await pending
+            except StopAsyncIteration:
+                return
+            pending = asyncio.ensure_future(iterator.__anext__())
+            yield item
+    finally:
+        if not pending.done():
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+        if hasattr(iterator, "aclose"):
+            await iterator.aclose()
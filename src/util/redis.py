@@ -6,7 +6,7 @@ from typing import List, Any, Callable
 import redis
 
 from core.config import settings
-from security.util import aes_decrypt
+from util import security
 from plugins.redis import enums
 from plugins.redis.schemas import RedisPage, RedisPagination, KeyInfo
 
@@ -30,7 +30,7 @@ def add_conn_setting(conn_settings: dict) -> dict:
     # 密码解密
     pwd = cache_settings.get("password", None)
     if pwd:
-        cache_settings.update({"password": aes_decrypt(key=settings.key, data=pwd)})
+        cache_settings.update({"password": security.get_codec(key=settings.key).decrypt(pwd)})
     _REDIS_SETTINGS_.update({conn_id: cache_settings})
     return cache_settings
 
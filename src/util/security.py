@@ -1,6 +1,9 @@
 import base64
-import datetime
+import time
+from collections import OrderedDict
+from functools import lru_cache
 from hashlib import md5
+from typing import List, Optional
 
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import padding
@@ -8,30 +11,199 @@ from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from loguru import logger
 
 
+class AesCodec(object):
+    """
+    AES(ECB)编解码器
+
+    密码器和填充器按密钥只创建一次, 重复使用.
+    """
+
+    def __init__(self, key: str, block_size=128):
+        """
+
+        :param key: 加密秘钥
+        :param block_size: 块大小(位)
+        """
+        self.block_size = block_size
+        self.cipher = Cipher(
+            algorithms.AES(key.encode("utf-8")),
+            mode=modes.ECB(),
+            backend=default_backend()
+        )
+        self.pkcs7 = padding.PKCS7(block_size)
+
+    def pad(self, data: bytes) -> bytes:
+        padder = self.pkcs7.padder()
+        return padder.update(data) + padder.finalize()
+
+    def unpad(self, data: bytes) -> bytes:
+        un_padder = self.pkcs7.unpadder()
+        return un_padder.update(data) + un_padder.finalize()
+
+    def encrypt(self, data: str) -> str:
+        """
+        加密数据
+
+        :param data: 需要加密数据
+        :return:
+        """
+        encrypted_data = self.cipher.encryptor().update(self.pad(data.encode("utf-8")))
+        return base64.urlsafe_b64encode(encrypted_data).decode()
+
+    def decrypt(self, data: str) -> str:
+        """
+        解密数据
+
+        :param data:
+        :return:
+        """
+        decrypt_data = self.cipher.decryptor().update(base64.urlsafe_b64decode(data))
+        return self.unpad(decrypt_data).decode("utf-8")
+
+    def encrypt_batch(self, datas: List[str]) -> List[str]:
+        """
+        批量加密(ECB按块独立加密, 拼接后一次加密再切分)
+
+        :param datas:
+        :return:
+        """
+        pad_datas = [self.pad(data.encode("utf-8")) for data in datas]
+        encrypted_data = self.cipher.encryptor().update(b"".join(pad_datas))
+        res = []
+        pos = 0
+        for pad_data in pad_datas:
+            res.append(base64.urlsafe_b64encode(encrypted_data[pos:pos + len(pad_data)]).decode())
+            pos += len(pad_data)
+        return res
+
+    def decrypt_batch(self, datas: List[str]) -> List[Optional[str]]:
+        """
+        批量解密(无法解密的数据返回None)
+
+        :param datas:
+        :return:
+        """
+        block = self.block_size // 8
+        raw_datas = []
+        for data in datas:
+            try:
+                raw_data = base64.urlsafe_b64decode(data)
+            except Exception as e:
+                logger.error("Decrypt Error: %s" % e)
+                raw_data = None
+            if raw_data is not None and (not raw_data or len(raw_data) % block):
+                raw_data = None
+            raw_datas.append(raw_data)
+        decrypt_data = self.cipher.decryptor().update(b"".join(filter(None, raw_datas)))
+        res = []
+        pos = 0
+        for raw_data in raw_datas:
+            if raw_data is None:
+                res.append(None)
+                continue
+            try:
+                res.append(self.unpad(decrypt_data[pos:pos + len(raw_data)]).decode("utf-8"))
+            except Exception as e:
+                logger.error("Decrypt Error: %s" % e)
+                res.append(None)
+            pos += len(raw_data)
+        return res
+
+
+class TokenCodec(object):
+    """
+    token签发/校验, token内容为 {salt}.{签发时间戳}
+    """
+
+    def __init__(self, key: str, salt: str):
+        self.aes = get_codec(key=key)
+        self.salt = salt
+        self.prefix = f'{salt}.'
+
+    def issue(self, timestamp: int = None) -> str:
+        """
+        签发token
+
+        :param timestamp: 签发时间戳(默认当前时间)
+        :return:
+        """
+        if timestamp is None:
+            timestamp = int(time.time())
+        return self.aes.encrypt(f'{self.prefix}{timestamp}')
+
+    def issue_tokens(self, n: int, timestamp: int = None, step: int = 1) -> List[str]:
+        """
+        批量签发不同的token
+
+        同一秒签发的token相同, 所以签发时间戳按step秒依次往前错开, 注意 n * step 不要超过有效期.
+
+        :param n: 数量
+        :param timestamp: 签发时间戳(默认当前时间)
+        :param step: 时间戳间隔(秒, 大于0)
+        :return:
+        """
+        if step <= 0:
+            raise ValueError(f"step must be positive: {step}")
+        if timestamp is None:
+            timestamp = int(time.time())
+        return self.aes.encrypt_batch([f'{self.prefix}{timestamp - i * step}' for i in range(n)])
+
+    def parse_data(self, data: Optional[str]) -> Optional[int]:
+        if data is None or not data.startswith(self.salt):
+            return None
+        try:
+            return int(data[len(self.salt) + 1:])
+        except ValueError:
+            # 时间戳无效按0(已过期)处理: 不校验有效期(expired=0)时仍然有效, 和原来的check_token一致
+            return 0
+
+    def parse(self, token: str) -> Optional[int]:
+        """
+        解析token, 返回签发时间戳(无效token返回None)
+
+        :param token:
+        :return:
+        """
+        try:
+            data = self.aes.decrypt(token)
+        except Exception as e:
+            logger.error("Check Token Error: %s" % e)
+            return None
+        return self.parse_data(data)
+
+    def parse_tokens(self, tokens: List[str]) -> List[Optional[int]]:
+        return [self.parse_data(data) for data in self.aes.decrypt_batch(tokens)]
+
+    def check(self, token: str, expired: int = 0, tolerance: int = 60) -> bool:
+        token_time = self.parse(token)
+        if token_time is None:
+            return False
+        return alive_token(token_time=token_time, expired=expired, tolerance=tolerance)
+
+    def check_tokens(self, tokens: List[str], expired: int = 0, tolerance: int = 60) -> List[bool]:
+        now = int(time.time())
+        return [token_time is not None
+                and alive_token(token_time=token_time, expired=expired, tolerance=tolerance, now=now)
+                for token_time in self.parse_tokens(tokens)]
+
+
+@lru_cache(maxsize=32)
+def get_codec(key: str, block_size=128) -> AesCodec:
+    return AesCodec(key=key, block_size=block_size)
+
+
+@lru_cache(maxsize=32)
+def get_token_codec(key: str, salt: str) -> TokenCodec:
+    return TokenCodec(key=key, salt=salt)
+
+
 def aes_encrypt(key: str, data: str, block_size=128):
     """加密数据
         :param key: 加密秘钥
         :param data: 需要加密数据
         :param block_size: 需要加密数据
         """
-    # 将数据转换为byte类型
-    data = data.encode("utf-8")
-    secret_key = key.encode("utf-8")
-
-    # 填充数据采用pkcs7
-    padder = padding.PKCS7(block_size).padder()
-    pad_data = padder.update(data) + padder.finalize()
-
-    # 创建密码器
-    cipher = Cipher(
-        algorithms.AES(secret_key),
-        mode=modes.ECB(),
-        backend=default_backend()
-    )
-    # 加密数据
-    encryptor = cipher.encryptor()
-    encrypted_data = encryptor.update(pad_data)
-    return base64.urlsafe_b64encode(encrypted_data).decode()
+    return get_codec(key=key, block_size=block_size).encrypt(data)
 
 
 def aes_decrypt(key: str, data: str, block_size=128):
@@ -43,25 +215,53 @@ def aes_decrypt(key: str, data: str, block_size=128):
     :param block_size: 需要加密数据
     :return:
     """
-    key = key.encode("utf-8")
-    data = base64.urlsafe_b64decode(data)
-
-    # 创建密码器
-    cipher = Cipher(
-        algorithms.AES(key),
-        mode=modes.ECB(),
-        backend=default_backend()
-    )
-    decryptor = cipher.decryptor()
-    decrypt_data = decryptor.update(data)
-    un_padder = padding.PKCS7(block_size).unpadder()
-    origin_data = un_padder.update(decrypt_data) + un_padder.finalize()
-    return origin_data.decode("utf-8")
+    return get_codec(key=key, block_size=block_size).decrypt(data)
 
 
 def auth_token(key: str, salt: str) -> str:
-    data = f'{salt}.{int(datetime.datetime.now().timestamp())}'
-    return aes_encrypt(key=key, data=data)
+    return get_token_codec(key=key, salt=salt).issue()
+
+
+def issue_tokens(key: str, salt: str, n: int, step: int = 1) -> List[str]:
+    """
+    批量签发不同的token
+
+    :param key:
+    :param salt:
+    :param n: 数量
+    :param step: 时间戳间隔(秒, 大于0)
+    :return:
+    """
+    return get_token_codec(key=key, salt=salt).issue_tokens(n=n, step=step)
+
+
+def parse_token(key: str, salt: str, token: str) -> Optional[int]:
+    """
+    解析token, 返回签发时间戳(无效token返回None)
+
+    :param key:
+    :param salt:
+    :param token:
+    :return:
+    """
+    return get_token_codec(key=key, salt=salt).parse(token)
+
+
+def alive_token(token_time: int, expired: int = 0, tolerance: int = 60, now: int = None) -> bool:
+    """
+    token是否在有效期内
+
+    :param token_time: 签发时间戳
+    :param expired: 超时(秒)
+    :param tolerance: 容错范围(秒)
+    :param now: 当前时间戳
+    :return:
+    """
+    if not expired:
+        return True
+    if now is None:
+        now = int(time.time())
+    return -tolerance < now - token_time < expired + tolerance
 
 
 def check_token(key: str, salt: str, token: str, expired: int = 0, tolerance: int = 60) -> bool:
@@ -74,18 +274,91 @@ def check_token(key: str, salt: str, token: str, expired: int = 0, tolerance: in
     :param tolerance: 容错范围(秒)
     :return:
     """
-    try:
-        data = aes_decrypt(key=key, data=token)
-        if not data.startswith(salt):
-            return False
-        if not expired:
-            return True
-        token_time = int(data[len(salt) + 1:])
-        now = int(datetime.datetime.now().timestamp())
-        return -tolerance < now - token_time < expired + tolerance
-    except Exception as e:
-        logger.error("Check Token Error: %s" % e)
-        return False
+    return get_token_codec(key=key, salt=salt).check(token, expired=expired, tolerance=tolerance)
+
+
+def check_tokens(key: str, salt: str, tokens: List[str], expired: int = 0, tolerance: int = 60) -> List[bool]:
+    """
+    批量校验token
+
+    :param key:
+    :param salt:
+    :param tokens:
+    :param expired: 超时(秒)
+    :param tolerance: 容错范围(秒)
+    :return:
+    """
+    return get_token_codec(key=key, salt=salt).check_tokens(tokens, expired=expired, tolerance=tolerance)
+
+
+class TokenCache(object):
+    """
+    已验证token缓存(LRU + TTL)
+
+    缓存token的签发时间戳, 命中时只做过期判断, 不再解密;
+    超过 expired + tolerance 的token被淘汰.
+    """
+
+    def __init__(self, maxsize: int = 1024, expired: int = 0, tolerance: int = 60):
+        """
+
+        :param maxsize: 最大缓存数(0不缓存)
+        :param expired: 超时(秒)
+        :param tolerance: 容错范围(秒)
+        """
+        self.maxsize = maxsize
+        self.expired = expired
+        self.tolerance = tolerance
+        self.hits = 0
+        self.misses = 0
+        self._tokens = OrderedDict()
+
+    def get(self, token: str) -> Optional[int]:
+        """
+        取得有效token的签发时间戳(未命中或已过期返回None)
+
+        :param token:
+        :return:
+        """
+        token_time = self._tokens.get(token)
+        if token_time is None:
+            self.misses += 1
+            return None
+        if not alive_token(token_time=token_time, expired=self.expired, tolerance=self.tolerance):
+            del self._tokens[token]
+            self.misses += 1
+            return None
+        self._tokens.move_to_end(token)
+        self.hits += 1
+        return token_time
+
+    def put(self, token: str, token_time: int):
+        """
+        缓存已验证token
+
+        :param token:
+        :param token_time: 签发时间戳
+        :return:
+        """
+        if self.maxsize <= 0:
+            return
+        self._tokens[token] = token_time
+        self._tokens.move_to_end(token)
+        while len(self._tokens) > self.maxsize:
+            self._tokens.popitem(last=False)
+
+    def clear(self):
+        self._tokens.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._tokens),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
 
 
 def md5_token(key, salt):
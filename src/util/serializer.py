@@ -0,0 +1,56 @@
+# coding:utf-8
+import json
+from typing import Any, Union
+
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+if orjson:
+    name = "orjson"
+    _OPTION_ = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, option=_OPTION_)
+
+    def loads(data: Union[str, bytes]) -> Any:
+        return orjson.loads(data)
+
+elif ujson:
+    name = "ujson"
+
+    def dumps(obj: Any) -> bytes:
+        return ujson.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+    def loads(data: Union[str, bytes]) -> Any:
+        return ujson.loads(data)
+
+else:
+    name = "json"
+
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(data: Union[str, bytes]) -> Any:
+        return json.loads(data)
+
+
+def dumps_str(obj: Any) -> str:
+    return dumps(obj).decode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON响应, 使用可用的最快编码器(orjson > ujson > json)
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,223 @@
+# coding:utf-8
+import array
+import mmap
+import os
+import struct
+import time
+from typing import AsyncIterator, List, Optional, Tuple
+
+from loguru import logger
+
+from util import serializer
+from util.provider import Batch, Provider
+
+_MAGIC_ = b"MOCKSNP1"
+# 文件头: magic, 数据项数, 批索引位置, 说明位置, 说明长度
+_PREAMBLE_ = struct.Struct("<8sqqqq")
+_ITEM_ = "q"
+
+
+class Snapshot(object):
+    """
+    数据源快照(只读, 内存映射)
+
+    文件布局: 定长文件头 | 数据(int64数组) | 批索引(int64数组, 每批起始位置) | 说明(JSON)
+    每条数据按字段顺序展开: 整数字段一个值, 列表字段先写长度再写元素; 只支持整数ID.
+
+    with Snapshot(file) as snapshot:
+        rows = snapshot.batch(0)
+    """
+
+    def __init__(self, file: str):
+        self.file = file
+        self._f = open(file, 'rb')
+        try:
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, items, index_offset, header_offset, header_len = _PREAMBLE_.unpack_from(self._mm, 0)
+            if magic != _MAGIC_:
+                raise ValueError(f"not a snapshot file: {file}")
+            self.header: dict = serializer.loads(self._mm[header_offset:header_offset + header_len])
+            self.fields: List[Tuple[str, str]] = [tuple(field) for field in self.header["fields"]]
+            self._data = memoryview(self._mm)[_PREAMBLE_.size:_PREAMBLE_.size + items * 8].cast(_ITEM_)
+            count = self.header["batches"] + 1
+            self._index = memoryview(self._mm)[index_offset:index_offset + count * 8].cast(_ITEM_)
+        except Exception:
+            self.close()
+            raise
+
+    @property
+    def digest(self) -> str:
+        return self.header.get("hash")
+
+    def __len__(self) -> int:
+        return self.header["batches"]
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def batch(self, i: int) -> List[dict]:
+        """
+        读取第i批数据
+
+        :param i:
+        :return:
+        """
+        data = self._data
+        pos, end = self._index[i], self._index[i + 1]
+        rows = []
+        while pos < end:
+            row = {}
+            for name, kind in self.fields:
+                if kind == "list":
+                    size = data[pos]
+                    row[name] = data[pos + 1:pos + 1 + size].tolist()
+                    pos += 1 + size
+                else:
+                    row[name] = data[pos]
+                    pos += 1
+            rows.append(row)
+        return rows
+
+    def close(self):
+        for view in ("_data", "_index"):
+            if getattr(self, view, None) is not None:
+                getattr(self, view).release()
+                setattr(self, view, None)
+        if getattr(self, "_mm", None) is not None:
+            self._mm.close()
+            self._mm = None
+        self._f.close()
+
+
+def read_digest(file: str) -> Optional[str]:
+    """
+    快照的数据源摘要(文件不存在或损坏返回None)
+
+    :param file:
+    :return:
+    """
+    if not os.path.exists(file):
+        return None
+    try:
+        with Snapshot(file) as snapshot:
+            return snapshot.digest
+    except (ValueError, KeyError, struct.error, OSError) as e:
+        logger.warning("Invalid snapshot {}: {}", file, e)
+        return None
+
+
+def get_fields(row: dict) -> List[Tuple[str, str]]:
+    fields = []
+    for name, value in row.items():
+        if isinstance(value, (list, tuple)):
+            fields.append((name, "list"))
+        elif isinstance(value, int) and not isinstance(value, bool):
+            fields.append((name, "int"))
+        else:
+            raise ValueError(f"snapshot only supports integer fields: {name}={value!r}")
+    return fields
+
+
+def encode(rows: List[dict], fields: List[Tuple[str, str]]) -> array.array:
+    items = array.array(_ITEM_)
+    for row in rows:
+        for name, kind in fields:
+            value = row[name]
+            if kind == "list":
+                items.append(len(value))
+                items.extend(value)
+            else:
+                items.append(value)
+    return items
+
+
+async def build(source: Provider, file: str, digest: str) -> dict:
+    """
+    读取数据源全部数据写入快照(先写临时文件再替换)
+
+    :param source: 数据源
+    :param file: 快照文件
+    :param digest: 数据源摘要
+    :return: 快照说明
+    """
+    start = time.perf_counter()
+    parent = os.path.dirname(file)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    tmp = f"{file}.tmp"
+    index = array.array(_ITEM_, [0])
+    fields = None
+    records = 0
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(b"\0" * _PREAMBLE_.size)
+            async for _, rows in source():
+                if not rows:
+                    continue
+                if fields is None:
+                    fields = get_fields(rows[0])
+                items = encode(rows, fields)
+                f.write(items.tobytes())
+                index.append(index[-1] + len(items))
+                records += len(rows)
+            header = {"version": 1, "hash": digest, "fields": fields or [], "batches": len(index) - 1,
+                      "records": records, "created": time.time()}
+            index_offset = f.tell()
+            f.write(index.tobytes())
+            header_offset = f.tell()
+            header_bytes = serializer.dumps(header)
+            f.write(header_bytes)
+            f.seek(0)
+            f.write(_PREAMBLE_.pack(_MAGIC_, index[-1], index_offset, header_offset, len(header_bytes)))
+        os.replace(tmp, file)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    logger.info("Snapshot {} built: {} batches, {} records in {:.2f}s",
+                file, header["batches"], records, time.perf_counter() - start)
+    return header
+
+
+async def ensure(source: Provider, file: str, digest: str, refresh: bool = False) -> bool:
+    """
+    快照不存在, 数据源摘要不一致或要求刷新时重建
+
+    :param source: 数据源
+    :param file: 快照文件
+    :param digest: 数据源摘要(查询变化后快照失效)
+    :param refresh: 强制刷新
+    :return: 是否重建
+    """
+    if not refresh and read_digest(file) == digest:
+        return False
+    await build(source, file, digest)
+    return True
+
+
+def cached(source: Provider, file: str, digest: str, refresh: bool = False) -> Provider:
+    """
+    带快照的数据源: 首次使用时建快照(之后不再访问数据源), 从内存映射的快照读数据
+
+    游标为已读批数, 分片按批序号取模.
+
+    :param source: 数据源
+    :param file: 快照文件
+    :param digest: 数据源摘要
+    :param refresh: 首次使用时强制刷新
+    :return:
+    """
+    state = {"refresh": refresh}
+
+    async def data_call(cursor: int = None, shard: Tuple[int, int] = (0, 1)) -> AsyncIterator[Batch]:
+        await ensure(source, file, digest, refresh=state["refresh"])
+        state["refresh"] = False
+        index, total = shard
+        with Snapshot(file) as snapshot:
+            for i in range(cursor or 0, len(snapshot)):
+                if i % total == index:
+                    yield i + 1, snapshot.batch(i)
+
+    return data_call
@@ -0,0 +1,85 @@
+# coding:utf-8
+import asyncio
+import multiprocessing
+import random
+import socket
+from typing import List, Tuple
+
+import uvicorn
+from starlette.types import Receive, Scope, Send
+
+_RESPONSE_ = b'{"code":0,"msg":"ok"}'
+_HEADERS_ = [(b"content-type", b"application/json"), (b"content-length", str(len(_RESPONSE_)).encode())]
+_ERROR_RESPONSE_ = b'{"code":-1,"msg":"standin error"}'
+_ERROR_HEADERS_ = [(b"content-type", b"application/json"),
+                   (b"content-length", str(len(_ERROR_RESPONSE_)).encode())]
+
+
+class Standin(object):
+    """
+    替身服务: 读完请求体, 任何请求都返回成功, 用于本地压测发送端
+
+    按 fail_rate 的概率返回 fail_status(测试重试和熔断), 每个响应延迟 delay 秒(模拟慢服务).
+    """
+
+    def __init__(self, fail_rate: float = 0.0, fail_status: int = 502, delay: float = 0.0):
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.delay = delay
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return
+        more_body = True
+        while more_body:
+            message = await receive()
+            more_body = message.get("more_body", False)
+        if self.delay > 0:
+            await asyncio.sleep(self.delay)
+        if self.fail_rate > 0 and random.random() < self.fail_rate:
+            await send({"type": "http.response.start", "status": self.fail_status, "headers": _ERROR_HEADERS_})
+            await send({"type": "http.response.body", "body": _ERROR_RESPONSE_})
+            return
+        await send({"type": "http.response.start", "status": 200, "headers": _HEADERS_})
+        await send({"type": "http.response.body", "body": _RESPONSE_})
+
+
+app = Standin()
+
+
+def _serve(sock: socket.socket, config: uvicorn.Config):
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def start(host: str = "127.0.0.1", port: int = 0, workers: int = 1, fail_rate: float = 0.0, fail_status: int = 502,
+          delay: float = 0.0) -> Tuple[str, List[multiprocessing.Process]]:
+    """
+    启动替身服务(多个进程共用一个监听socket)
+
+    :param host:
+    :param port: 0为随机端口
+    :param workers: 进程数
+    :param fail_rate: 返回错误的比例
+    :param fail_status: 错误状态码
+    :param delay: 响应延迟(秒)
+    :return: (uri, 进程)
+    """
+    server = Standin(fail_rate=fail_rate, fail_status=fail_status, delay=delay) if fail_rate or delay else app
+    config = uvicorn.Config(server, host=host, port=port, log_level="warning", access_log=False)
+    sock = config.bind_socket()
+    # 响应头和响应体分两次写出, 不关Nagle会碰上客户端的延迟ACK(每个请求多等40ms)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    processes = []
+    for _ in range(max(1, workers)):
+        process = multiprocessing.Process(target=_serve, args=(sock, config), daemon=True)
+        process.start()
+        processes.append(process)
+    uri = f"http://{host}:{sock.getsockname()[1]}"
+    return uri, processes
+
+
+def stop(processes: List[multiprocessing.Process]):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
@@ -0,0 +1,208 @@
+# coding:utf-8
+import itertools
+import math
+import random
+from typing import Any, AsyncIterator, Callable, Dict, List, Tuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from util.provider import Batch, Provider
+
+_TYPES_ = ("const", "sequence", "uniform", "choice", "normal")
+
+# 字段生成函数: (起始序号, 条数, 批序号) -> 一列数据
+Column = Callable[[int, int, int], Any]
+# 取值函数: (起始序号, 条数, 批序号) -> 条数*列表长度 个值(numpy数组或列表)
+Values = Callable[[int, int, int], Any]
+
+
+def _rng(seed: int, batch: int, field: int):
+    # 每批每个字段独立的随机源, 批可以任意顺序生成(分片, 续传)且结果不变
+    if numpy is not None:
+        return numpy.random.default_rng([seed, batch, field])
+    return random.Random(f"{seed}:{batch}:{field}")
+
+
+def _permutation(low: int, high: int, seed: int) -> Tuple[int, int, int]:
+    """
+    [low, high] 上的仿射置换 idx -> (a * idx + c) % n: 不用存储就能取出不重复的随机值
+
+    :return: (n, a, c)
+    """
+    n = high - low + 1
+    rng = random.Random(f"{seed}:permutation:{low}:{high}")
+    a = rng.randrange(1, min(n, 1 << 31)) if n > 1 else 1
+    while math.gcd(a, n) != 1:
+        a = rng.randrange(1, min(n, 1 << 31))
+    return n, a, rng.randrange(n)
+
+
+def _sequence(name: str, spec: dict, index: int, seed: int, width: int) -> Values:
+    first, step = spec.get("start", 1), spec.get("step", 1)
+
+    def values(start: int, count: int, batch: int):
+        if numpy is not None:
+            return numpy.arange(start * width, (start + count) * width, dtype=numpy.int64) * step + first
+        return [first + i * step for i in range(start * width, (start + count) * width)]
+
+    return values
+
+
+def _unique(name: str, spec: dict, index: int, seed: int, width: int) -> Values:
+    low = spec["low"]
+    n, a, c = _permutation(low, spec["high"], seed + index)
+
+    def values(start: int, count: int, batch: int):
+        if (start + count) * width > n:
+            raise ValueError(f"synthetic field {name}: unique values exhausted ({n})")
+        if numpy is not None:
+            idx = numpy.arange(start * width, (start + count) * width, dtype=numpy.int64)
+            return (idx * a + c) % n + low
+        return [(i * a + c) % n + low for i in range(start * width, (start + count) * width)]
+
+    return values
+
+
+def _uniform(name: str, spec: dict, index: int, seed: int, width: int) -> Values:
+    if spec.get("unique"):
+        return _unique(name, spec, index, seed, width)
+    low, high = spec["low"], spec["high"]
+
+    def values(start: int, count: int, batch: int):
+        rng = _rng(seed, batch, index)
+        if numpy is not None:
+            return rng.integers(low, high + 1, count * width)
+        return [rng.randint(low, high) for _ in range(count * width)]
+
+    return values
+
+
+def _choice(name: str, spec: dict, index: int, seed: int, width: int) -> Values:
+    choices, weights = spec["values"], spec.get("weights")
+
+    def values(start: int, count: int, batch: int):
+        rng = _rng(seed, batch, index)
+        if numpy is not None:
+            p = numpy.asarray(weights, dtype=float) / sum(weights) if weights else None
+            return numpy.asarray(choices)[rng.choice(len(choices), count * width, p=p)]
+        return rng.choices(choices, weights=weights, k=count * width)
+
+    return values
+
+
+def _normal(name: str, spec: dict, index: int, seed: int, width: int) -> Values:
+    mean, std = spec["mean"], spec["std"]
+    low, high = spec.get("low", 0), spec.get("high", 0)
+
+    def values(start: int, count: int, batch: int):
+        rng = _rng(seed, batch, index)
+        if numpy is not None:
+            res = numpy.rint(rng.normal(mean, std, count * width)).astype(numpy.int64)
+            return numpy.clip(res, low, high) if low < high else res
+        res = [round(rng.gauss(mean, std)) for _ in range(count * width)]
+        return [min(max(x, low), high) for x in res] if low < high else res
+
+    return values
+
+
+# 类型 -> 编译函数(字段名, 定义, 字段序号, 随机种子, 列表长度), const 单独处理
+_COMPILERS_: Dict[str, Callable[[str, dict, int, int, int], Values]] = {
+    "sequence": _sequence,
+    "uniform": _uniform,
+    "choice": _choice,
+    "normal": _normal,
+}
+
+
+def compile_field(name: str, spec: dict, index: int, seed: int) -> Column:
+    """
+    编译字段定义
+
+    {"type": "const", "value": 1000}: 常量
+    {"type": "sequence", "start": 1, "step": 1}: 递增序列(不重复)
+    {"type": "uniform", "low": 1, "high": 100, "unique": false}: 均匀分布整数, unique时不重复(最多 high-low+1 个)
+    {"type": "choice", "values": [1, 2], "weights": [0.9, 0.1]}: 按权重取值
+    {"type": "normal", "mean": 100, "std": 10, "low": 0, "high": 0}: 正态分布取整, 按low/high截断(相等时不截断)
+    任一类型加 "size": n 生成长度为n的列表, 序列和unique按列表元素计数.
+
+    :param name: 字段名
+    :param spec: 字段定义
+    :param index: 字段序号
+    :param seed: 随机种子
+    :return:
+    """
+    kind = spec.get("type")
+    if kind not in _TYPES_:
+        raise ValueError(f"synthetic field {name}: unknown type {kind!r}, expected one of {_TYPES_}")
+    size = spec.get("size", 0)
+
+    if kind == "const":
+        value = spec["value"]
+        if size:
+            # 每条数据一个新列表, 修改一条不影响其他数据
+            return lambda start, count, batch: [[value] * size for _ in range(count)]
+        return lambda start, count, batch: itertools.repeat(value, count)
+
+    values = _COMPILERS_[kind](name, spec, index, seed, size or 1)
+
+    def column(start: int, count: int, batch: int):
+        res = values(start, count, batch)
+        if numpy is not None:
+            return (res.reshape(count, size) if size else res).tolist()
+        return [res[i:i + size] for i in range(0, len(res), size)] if size else res
+
+    return column
+
+
+def compile_spec(spec: Dict[str, dict], seed: int = 0) -> Callable[[int, int, int], List[dict]]:
+    """
+    编译数据定义, 返回批量生成函数: (起始序号, 条数, 批序号) -> 数据列表
+
+    numpy可用时按列向量化生成, 否则逐个生成(结果不同, 但同一环境下可重复).
+
+    :param spec: {字段名: 字段定义}(见compile_field)
+    :param seed: 随机种子
+    :return:
+    """
+    columns = [compile_field(name, field, index, seed) for index, (name, field) in enumerate(spec.items())]
+    if not columns:
+        return lambda start, count, batch=0: []
+    first, others = (next(iter(spec)), columns[0]), list(zip(tuple(spec)[1:], columns[1:]))
+
+    def generate(start: int, count: int, batch: int = 0) -> List[dict]:
+        # 按列填充: 第一列用字典字面量建行, 其余列逐列赋值, 比逐行 dict(zip()) 快约50%;
+        # 瓶颈是逐条创建字典(每条约0.1us/字段), 数值列本身已向量化
+        name, column = first
+        rows = [{name: value} for value in column(start, count, batch)]
+        for name, column in others:
+            for row, value in zip(rows, column(start, count, batch)):
+                row[name] = value
+        return rows
+
+    return generate
+
+
+def provider(spec: Dict[str, dict], batches: int = 0, batch_size: int = 1000, seed: int = 0) -> Provider:
+    """
+    合成数据源(接口同数据库数据源, 游标为已生成批数)
+
+    :param spec: 数据定义(见compile_spec)
+    :param batches: 批数(0为不限, 压测按时长结束)
+    :param batch_size: 每批条数
+    :param seed: 随机种子
+    :return:
+    """
+    generate = compile_spec(spec, seed)
+
+    async def data_call(cursor: int = None, shard: Tuple[int, int] = (0, 1)) -> AsyncIterator[Batch]:
+        index, total = shard
+        batch = cursor or 0
+        batch += (index - batch) % total
+        while not batches or batch < batches:
+            yield batch + 1, generate(batch * batch_size, batch_size, batch)
+            batch += total
+
+    return data_call
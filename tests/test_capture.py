@@ -0,0 +1,90 @@
+# coding:utf-8
+import asyncio
+import json
+
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from core import replay
+from core.capture import CaptureMiddleware, CaptureWriter
+from util.http import HttpClient
+
+
+async def echo(request: Request):
+    body = await request.body()
+    return JSONResponse({"size": len(body)})
+
+
+async def forbidden(request: Request):
+    # 不读请求体
+    return PlainTextResponse("Forbidden", status_code=403)
+
+
+def make_client(writer: CaptureWriter, max_body: int) -> TestClient:
+    app = Starlette(routes=[Route("/echo", echo, methods=["POST"]), Route("/deny", forbidden, methods=["POST"])])
+    app.add_middleware(CaptureMiddleware, writer=writer, max_body=max_body)
+    return TestClient(app)
+
+
+def records(writer: CaptureWriter) -> list:
+    res = []
+    while not writer.queue.empty():
+        res.append(writer.queue.get_nowait())
+    return res
+
+
+def chunks(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def test_capture_body():
+    writer = CaptureWriter("unused.jsonl")
+    client = make_client(writer, max_body=100)
+    assert client.post("/echo?a=1", data=b"hello").json() == {"size": 5}
+    assert client.post("/deny", data=b"secret").status_code == 403
+    first, second = records(writer)
+    assert (first["path"], first["query"], first["status"], first["body"]) == ("/echo", "a=1", 200, "hello")
+    assert "truncated" not in first
+    assert (second["status"], second["body"]) == (403, "secret")
+
+
+def test_capture_truncates_large_body():
+    writer = CaptureWriter("unused.jsonl")
+    client = make_client(writer, max_body=10)
+    data = b"x" * 1000
+    # 应用收到完整请求体, 录制只保留前 max_body 字节
+    assert client.post("/echo", data=chunks(data, 64)).json() == {"size": 1000}
+    record, = records(writer)
+    assert record["body"] == "x" * 10 and record["truncated"] == 1000
+
+
+def test_writer_drops_when_full(tmp_path):
+    writer = CaptureWriter(str(tmp_path / "capture.jsonl"), max_queue=2)
+    for i in range(5):
+        writer.write({"i": i})
+    assert writer.dropped == 3
+    writer.start()
+    writer.close()
+    with open(tmp_path / "capture.jsonl") as f:
+        assert [json.loads(line)["i"] for line in f] == [0, 1]
+
+
+def test_replay_compares_captured_status(tmp_path):
+    file = tmp_path / "capture.jsonl"
+    captured = [("/ok", 200), ("/missing", 404), ("/error", 500), ("/changed", 200)]
+    with open(file, "w") as f:
+        for i, (path, status) in enumerate(captured):
+            f.write(json.dumps({"ts": i, "method": "GET", "path": path, "query": "", "headers": [],
+                                "status": status, "body": ""}) + "\n")
+    replies = {"/ok": 200, "/missing": 404, "/error": 500, "/changed": 503}
+    client = HttpClient("http://replay.test")
+    client.client = httpx.AsyncClient(transport=httpx.MockTransport(
+        lambda request: httpx.Response(replies[request.url.path])))
+    stats = asyncio.run(replay.replay(client, str(file), speed=0))
+    # 录制时的 404/500 原样返回不算错误, 状态码变化才算
+    assert (stats.completed, stats.errors) == (4, {"StatusMismatch": 1})
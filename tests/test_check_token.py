@@ -0,0 +1,92 @@
+# coding:utf-8
+import time
+
+import pytest
+from starlette.applications import Starlette
+from starlette.datastructures import QueryParams
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from core.check_token import CheckTokenMiddleware, UriMatcher, get_query_param
+from util import security
+
+KEY = "XjgX3zAkA2hDT0ySpzOU1uq3iZ9F6yA9"
+SALT = "MockAPI"
+HEADER = "X-Mock-Api"
+
+
+@pytest.mark.parametrize("query_string", [
+    b"",
+    b"a=1",
+    b"token=abc",
+    b"a=1&token=x&token=y",
+    b"%74oken=abc",
+    b"tok%65n=a%2Bb",
+    b"token=a+b%20c",
+    b"token=%E4%BD%A0",
+    b"token=\xe9",
+    b"x=%41&token",
+])
+def test_query_param_same_as_starlette(query_string):
+    expected = QueryParams(query_string.decode("latin-1")).get("token")
+    assert get_query_param(query_string, "token") == expected
+
+
+def test_encoded_key():
+    assert get_query_param(b"a=1&%74%6Fken=abc", "token") == "abc"
+
+
+async def ok(request):
+    return PlainTextResponse("ok")
+
+
+@pytest.fixture
+def token_cache():
+    return security.TokenCache(maxsize=16, expired=600)
+
+
+@pytest.fixture
+def client(token_cache):
+    app = Starlette(routes=[Route("/api/{name:path}", ok), Route("/other", ok)])
+    app.add_middleware(CheckTokenMiddleware, key=KEY, salt=SALT, expired=600, prefix="/api", header=HEADER,
+                       white_uris=["/api/docs", "/api/public/.*"], token_cache=token_cache)
+    return TestClient(app)
+
+
+def test_middleware_token(client):
+    token = security.auth_token(KEY, SALT)
+    assert client.get("/api/a", headers={HEADER: token}).text == "ok"
+    assert client.get("/api/a", params={"token": token}).text == "ok"
+    assert client.get("/api/a?%74oken=" + token).text == "ok"
+    assert client.get("/api/a").status_code == 403
+    assert client.get("/api/a", headers={HEADER: "bad"}).status_code == 401
+    assert client.get("/api/a", headers={HEADER: security.auth_token(KEY, "Other")}).status_code == 401
+
+
+def test_middleware_expired(client):
+    token = security.get_token_codec(KEY, SALT).issue(int(time.time()) - 100000)
+    assert client.get("/api/a", headers={HEADER: token}).status_code == 401
+
+
+def test_middleware_skips_white_uris_and_other_prefixes(client):
+    assert client.get("/api/docs").text == "ok"
+    assert client.get("/api/public/x/y").text == "ok"
+    assert client.get("/other").text == "ok"
+    assert client.get("/api/docs/x").status_code == 403
+
+
+def test_middleware_cache(client, token_cache):
+    token = security.auth_token(KEY, SALT)
+    for _ in range(3):
+        assert client.get("/api/a", headers={HEADER: token}).text == "ok"
+    # 第一次解密后缓存, 之后命中
+    assert token_cache.stats() == {"size": 1, "maxsize": 16, "hits": 2, "misses": 1}
+    client.get("/api/a", headers={HEADER: "bad"})
+    assert token_cache.stats()["size"] == 1
+
+
+def test_uri_matcher():
+    matcher = UriMatcher(["/docs", "/static/.*"])
+    assert matcher.match("/docs") and matcher.match("/static/a.js")
+    assert not matcher.match("/docs/x") and not matcher.match("/api/static/a.js")
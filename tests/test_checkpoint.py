@@ -0,0 +1,185 @@
+# coding:utf-8
+import asyncio
+import json
+
+import pytest
+
+from plugins.ryd import mock
+from util.checkpoint import RETRY_PAGE, Checkpoint, job_hash
+
+
+@pytest.fixture
+def file(tmp_path):
+    return str(tmp_path / "job.json")
+
+
+def send_page(checkpoint: Checkpoint, page: int, ok: int = 0, errors: int = 0):
+    for _ in range(ok):
+        checkpoint.done(page)
+    for _ in range(errors):
+        checkpoint.done(page, ok=False)
+
+
+def test_out_of_order_pages(file):
+    checkpoint = Checkpoint(file, digest="a", interval=3600)
+    for page in (1, 2, 3):
+        checkpoint.add(page, 2, cursor={"after": page * 10})
+    send_page(checkpoint, 3, ok=2)
+    send_page(checkpoint, 2, ok=1, errors=1)
+    # 第1页未完成, 检查点不前进
+    assert (checkpoint.page, checkpoint.cursor) == (0, None)
+    send_page(checkpoint, 1, ok=1)
+    assert checkpoint.page == 0
+    send_page(checkpoint, 1, ok=1)
+    assert (checkpoint.page, checkpoint.cursor) == (3, {"after": 30})
+    assert checkpoint.start_page == 4
+    assert checkpoint.counts == {"sent": 5, "errors": 1}
+    assert not checkpoint.pending and not checkpoint.completed
+
+
+def test_empty_page_completes_immediately(file):
+    checkpoint = Checkpoint(file, digest="a", interval=3600)
+    checkpoint.add(1, 0, cursor=1)
+    assert (checkpoint.page, checkpoint.cursor) == (1, 1)
+
+
+def test_resume(file):
+    checkpoint = Checkpoint(file, digest="a", interval=3600)
+    for page in (1, 2, 3):
+        checkpoint.add(page, 1, cursor=page)
+    send_page(checkpoint, 1, ok=1)
+    send_page(checkpoint, 3, ok=1)
+    checkpoint.flush()
+
+    resumed = Checkpoint(file, digest="a", resume=True)
+    # 第3页已发送但第2页未完成: 从第2页重发(至少一次)
+    assert (resumed.page, resumed.cursor, resumed.start_page) == (1, 1, 2)
+    assert resumed.counts == {"sent": 2, "errors": 0}
+    assert not resumed.finished
+
+
+def test_resume_finished(file):
+    checkpoint = Checkpoint(file, digest="a")
+    checkpoint.add(1, 1, cursor=1)
+    send_page(checkpoint, 1, ok=1)
+    checkpoint.finish()
+    assert Checkpoint(file, digest="a", resume=True).finished
+
+
+def test_without_resume_starts_over(file):
+    checkpoint = Checkpoint(file, digest="a")
+    checkpoint.add(1, 0, cursor=1)
+    checkpoint.flush()
+    assert Checkpoint(file, digest="a").page == 0
+
+
+def test_digest_mismatch_starts_over(file):
+    checkpoint = Checkpoint(file, digest="a")
+    checkpoint.add(1, 0, cursor=1)
+    checkpoint.flush()
+    resumed = Checkpoint(file, digest="b", resume=True)
+    assert (resumed.page, resumed.cursor) == (0, None)
+
+
+def test_file_without_cursor_rejected(file):
+    with open(file, "w") as f:
+        json.dump({"hash": "a", "page": 5, "counts": {"sent": 500}}, f)
+    resumed = Checkpoint(file, digest="a", resume=True)
+    assert (resumed.page, resumed.counts["sent"]) == (0, 0)
+
+
+def test_failed_records_kept_for_confirmed_pages(file):
+    checkpoint = Checkpoint(file, digest="a", interval=3600)
+    for page in (1, 2):
+        checkpoint.add(page, 2, cursor=page)
+    checkpoint.done(1, ok=True)
+    checkpoint.done(1, ok=False, data={"id": 1})
+    checkpoint.done(2, ok=False, data={"id": 3})
+    # 第2页未确认: 续传时整页重发, 失败数据不单独记录
+    assert checkpoint.failed == [{"id": 1}]
+    checkpoint.flush()
+    with open(file) as f:
+        assert json.load(f)["failed"] == [{"id": 1}]
+
+
+def test_retry_failed_after_resume(file):
+    checkpoint = Checkpoint(file, digest="a", interval=3600)
+    checkpoint.add(1, 3, cursor=1)
+    checkpoint.done(1, ok=False, data={"id": 1})
+    checkpoint.done(1, ok=False, data={"id": 2})
+    checkpoint.done(1, ok=True)
+    checkpoint.flush()
+
+    resumed = Checkpoint(file, digest="a", resume=True, interval=3600)
+    retry = resumed.retry()
+    assert retry == [{"id": 1}, {"id": 2}]
+    resumed.add(RETRY_PAGE, len(retry))
+    resumed.done(RETRY_PAGE, ok=True)
+    # 重发结束前中断: 检查点里仍有全部失败数据
+    resumed.flush()
+    assert Checkpoint(file, digest="a", resume=True).failed == retry
+    resumed.done(RETRY_PAGE, ok=False, data={"id": 2})
+    assert (resumed.failed, resumed.retrying, resumed.page, resumed.cursor) == ([{"id": 2}], [], 1, 1)
+    assert resumed.counts == {"sent": 2, "errors": 3}
+
+
+class FlakyClient(object):
+    """
+    记录发送的数据, fail 中的id发送失败
+    """
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.sent = []
+
+    async def req_post(self, path: str, content: bytes = None, **kwargs):
+        data = json.loads(content)
+        if data["id"] in self.fail:
+            raise ValueError(f"fail {data['id']}")
+        self.sent.append(data["id"])
+        return {}
+
+
+def pages(n: int, size: int = 2):
+    async def data_call(cursor=None, shard=(0, 1)):
+        for page in range((cursor or 0) + 1, n + 1):
+            yield page, [{"id": (page - 1) * size + i} for i in range(size)]
+
+    return data_call
+
+
+def test_send_resends_failed_records(file):
+    def run(client, resume):
+        checkpoint = Checkpoint(file, digest="a", resume=resume)
+        return asyncio.run(mock.send(client, "/send", pages(3), body={"id": "${id:int}"}, concurrency=2,
+                                     checkpoint=checkpoint))
+
+    first = FlakyClient(fail={1, 4})
+    stats = run(first, resume=False)
+    assert sorted(first.sent) == [0, 2, 3, 5] and stats["errors"] == 2
+
+    second = FlakyClient()
+    run(second, resume=True)
+    # 任务已完成, 只重发失败的数据
+    assert sorted(second.sent) == [1, 4]
+    resumed = Checkpoint(file, digest="a", resume=True)
+    assert resumed.finished and resumed.failed == []
+    assert resumed.counts == {"sent": 6, "errors": 2}
+
+    third = FlakyClient()
+    run(third, resume=True)
+    assert third.sent == []
+
+
+def test_flush_is_atomic(file, tmp_path):
+    checkpoint = Checkpoint(file, digest="a")
+    checkpoint.add(1, 0, cursor={"after": 7})
+    checkpoint.flush()
+    with open(file) as f:
+        assert json.load(f)["cursor"] == {"after": 7}
+    assert [p.name for p in tmp_path.iterdir()] == ["job.json"]
+
+
+def test_job_hash_stable():
+    assert job_hash("/path", {"a": 1}) == job_hash("/path", {"a": 1})
+    assert job_hash("/path", {"a": 1}) != job_hash("/path", {"a": 2})
@@ -0,0 +1,93 @@
+# coding:utf-8
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from core import definition
+
+DEFINITIONS = [
+    {"path": "/static", "body": {"a": 1, "b": "中文"}, "headers": {"X-Mock": "1"}},
+    {"method": "post", "path": "/echo/{name}", "status": 201,
+     "body": '{"name": "{{ path.name }}", "q": "{{ query.q }}", "id": {{ body.id }}}'},
+    {"path": "/text", "body": "plain", "media_type": "text/plain"},
+    {"path": "/stream", "stream": True, "media_type": "text/plain",
+     "body": "{% for i in range(query.n | int) %}{{ i }},{% endfor %}"},
+    {"path": "/empty", "status": 204},
+]
+
+
+def make_client(root) -> TestClient:
+    app = FastAPI()
+    definition.load_router(str(root)).register(app.router)
+    return TestClient(app)
+
+
+@pytest.fixture
+def root(tmp_path):
+    # 单个定义和定义列表, 子目录递归, 空文件和其他后缀忽略
+    (tmp_path / "a.json").write_text(json.dumps(DEFINITIONS[:2]), encoding="utf-8")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "b.json").write_text(json.dumps(DEFINITIONS[2]), encoding="utf-8")
+    (tmp_path / "sub" / "c.json").write_text(json.dumps(DEFINITIONS[3:]), encoding="utf-8")
+    (tmp_path / "sub" / "empty.json").write_text("[]", encoding="utf-8")
+    (tmp_path / "readme.txt").write_text("skip", encoding="utf-8")
+    return tmp_path
+
+
+def test_list_files(root):
+    files = definition.list_files(str(root))
+    assert [file[len(str(root)) + 1:].replace("\\", "/") for file in files] == \
+           ["a.json", "sub/b.json", "sub/c.json", "sub/empty.json"]
+
+
+def test_load_router(root):
+    router = definition.load_router(str(root))
+    assert len(router.deferred_routes) == len(DEFINITIONS)
+
+
+def test_static_body(root):
+    client = make_client(root)
+    resp = client.get("/static")
+    assert resp.json() == {"a": 1, "b": "中文"}
+    assert resp.headers["x-mock"] == "1" and resp.headers["content-type"] == "application/json"
+    resp = client.get("/text")
+    assert resp.text == "plain" and resp.headers["content-type"].startswith("text/plain")
+    resp = client.get("/empty")
+    assert resp.status_code == 204 and resp.content == b""
+
+
+def test_template_body(root):
+    client = make_client(root)
+    resp = client.post("/echo/bob", params={"q": "x"}, json={"id": 3})
+    assert resp.status_code == 201
+    assert resp.json() == {"name": "bob", "q": "x", "id": 3}
+    assert client.get("/echo/bob").status_code == 405
+
+
+def test_stream_body(root):
+    client = make_client(root)
+    assert client.get("/stream", params={"n": 5}).text == "0,1,2,3,4,"
+
+
+def test_compile_body_variables():
+    env = definition.Environment()
+    content, template, variables = definition.compile_body(env, "{{ path.id }}-{{ query.q }}")
+    assert content is None and template is not None
+    assert {"path", "query"} <= variables and "body" not in variables
+    assert definition.compile_body(env, "static")[:2] == (b"static", None)
+    assert definition.compile_body(env, None)[:2] == (b"", None)
+
+
+def test_yaml_definition(tmp_path):
+    pytest.importorskip("yaml")
+    (tmp_path / "a.yaml").write_text("path: /yaml\nbody:\n  ok: true\n", encoding="utf-8")
+    assert make_client(tmp_path).get("/yaml").json() == {"ok": True}
+
+
+def test_yaml_skipped_without_pyyaml(tmp_path, monkeypatch):
+    monkeypatch.setattr(definition, "yaml", None)
+    (tmp_path / "a.yaml").write_text("path: /yaml\n", encoding="utf-8")
+    (tmp_path / "b.json").write_text(json.dumps({"path": "/json"}), encoding="utf-8")
+    assert definition.list_files(str(tmp_path)) == [str(tmp_path / "b.json")]
@@ -0,0 +1,83 @@
+# coding:utf-8
+import random
+
+import pytest
+
+from util.histogram import Histogram, bucket_index, bucket_value
+
+# 分桶的相对误差上界
+_PRECISION_ = 1 / 64
+
+
+def exact_percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[max(1, int(round(len(ordered) * percent / 100.0))) - 1]
+
+
+@pytest.mark.parametrize("value", [0, 1, 127, 128, 129, 255, 256, 1000, 65535, 10 ** 6, 10 ** 9, 2 ** 40 + 1])
+def test_bucket_upper_bound(value):
+    upper = bucket_value(bucket_index(value))
+    assert value <= upper <= value * (1 + _PRECISION_) + 1
+
+
+def test_bucket_index_monotonic():
+    indexes = [bucket_index(value) for value in range(0, 200000, 7)]
+    assert indexes == sorted(indexes)
+
+
+@pytest.mark.parametrize("percent", [50, 90, 99, 99.9, 100])
+def test_percentile_accuracy(percent):
+    rng = random.Random(percent)
+    values = [int(rng.lognormvariate(8, 1.5)) for _ in range(20000)]
+    histogram = Histogram()
+    for value in values:
+        histogram.record(value)
+    exact = exact_percentile(values, percent)
+    assert exact <= histogram.percentile(percent) <= exact * (1 + _PRECISION_) + 1
+
+
+def test_min_max_mean_exact():
+    histogram = Histogram()
+    for value in (5, 1000, 123456):
+        histogram.record(value)
+    summary = histogram.summary()
+    assert (summary["min"], summary["max"], summary["count"]) == (5, 123456, 3)
+    assert histogram.mean() == pytest.approx((5 + 1000 + 123456) / 3)
+    # 百分位不超过精确的最大值
+    assert histogram.percentile(100) == 123456
+
+
+def test_empty():
+    histogram = Histogram()
+    assert histogram.percentile(99) == 0
+    assert histogram.summary()["max"] == 0
+
+
+def test_merge_equals_single_histogram():
+    rng = random.Random(1)
+    parts = [[rng.randrange(1, 10 ** 6) for _ in range(1000)] for _ in range(4)]
+    merged, single = Histogram(), Histogram()
+    for part in parts:
+        histogram = Histogram()
+        for value in part:
+            histogram.record(value)
+            single.record(value)
+        merged.merge(histogram)
+    assert merged.counts == single.counts
+    assert merged.summary() == single.summary()
+
+
+def test_merge_empty():
+    histogram = Histogram()
+    histogram.record(10)
+    histogram.merge(Histogram())
+    assert (histogram.count, histogram.min, histogram.max) == (1, 10, 10)
+
+
+def test_dict_round_trip():
+    histogram = Histogram()
+    for value in (1, 50, 5000, 5000, 10 ** 7):
+        histogram.record(value)
+    restored = Histogram.from_dict(histogram.to_dict())
+    assert restored.counts == histogram.counts
+    assert restored.summary() == histogram.summary()
@@ -0,0 +1,156 @@
+# coding:utf-8
+import asyncio
+import itertools
+
+import httpx
+import pytest
+
+from util import http
+from util.http import CircuitBreaker, CircuitOpenError, HttpClient, RetryBudget, RetryPolicy
+
+_hosts = itertools.count()
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(http.time, "monotonic", clock)
+    return clock
+
+
+def make_client(handler, **kwargs) -> HttpClient:
+    # 熔断器按主机共用, 每个用例一个主机
+    client = HttpClient(f"http://host{next(_hosts)}.test", **kwargs)
+    client.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+def status_error(status: int, method: str = "GET") -> httpx.HTTPStatusError:
+    request = httpx.Request(method, "http://host.test/")
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(status, request=request))
+
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker("a", threshold=3, reset_timeout=10)
+    for _ in range(2):
+        breaker.record(False)
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record(False)
+    assert breaker.state == "open"
+    clock.now += 9.9
+    assert not breaker.allow()
+
+
+def test_breaker_success_resets_failures():
+    breaker = CircuitBreaker("a", threshold=2)
+    breaker.record(False)
+    breaker.record(True)
+    breaker.record(False)
+    assert breaker.state == "closed"
+
+
+def test_breaker_half_open_probe(clock):
+    breaker = CircuitBreaker("a", threshold=1, reset_timeout=10)
+    breaker.record(False)
+    clock.now += 10
+    # 每 reset_timeout 只放行一个探测请求
+    assert breaker.allow() and breaker.state == "half_open"
+    assert not breaker.allow()
+    breaker.record(False)
+    assert breaker.state == "open" and not breaker.allow()
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == "closed" and breaker.allow() and breaker.allow()
+
+
+def test_retry_budget_exhausted():
+    budget = RetryBudget(ratio=0.5, reserve=2)
+    assert budget.withdraw() and budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+    for _ in range(10):
+        budget.deposit()
+    assert budget.tokens == 2
+
+
+def test_retryable():
+    policy = RetryPolicy()
+    headers = httpx.Headers()
+    timeout = httpx.ReadTimeout("timeout")
+    assert policy.retryable("GET", headers, timeout)
+    assert not policy.retryable("POST", headers, timeout)
+    assert policy.retryable("POST", httpx.Headers({"Idempotency-Key": "1"}), timeout)
+    assert RetryPolicy(unsafe=True).retryable("POST", headers, timeout)
+    # 请求没有发出, 非幂等请求也可以重试
+    assert policy.retryable("POST", headers, httpx.ConnectError("refused"))
+    assert policy.retryable("GET", headers, status_error(503))
+    assert not policy.retryable("GET", headers, status_error(500))
+    assert not policy.retryable("GET", headers, status_error(404))
+
+
+def test_retry_after():
+    policy = RetryPolicy(backoff=0.001, max_backoff=5)
+    err = status_error(429)
+    err.response.headers["Retry-After"] = "3"
+    assert policy.delay(0, err) == 3
+    err.response.headers["Retry-After"] = "60"
+    assert policy.delay(0, err) == 5
+
+
+def test_send_retries_until_success():
+    statuses = iter((503, 502, 200))
+    client = make_client(lambda request: httpx.Response(next(statuses)), retry=RetryPolicy(backoff=0))
+    resp = asyncio.run(client._send("GET", client.uri))
+    assert resp.status_code == 200
+    assert client.counters == {"retries": 2, "retry_budget_exhausted": 0, "circuit_open": 0}
+
+
+def test_send_budget_exhausted():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503)
+
+    policy = RetryPolicy(max_retries=5, backoff=0, budget_ratio=0.1, budget_reserve=2)
+    client = make_client(handler, retry=policy)
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(client._send("GET", client.uri))
+    # 预算2个令牌: 首次请求加2次重试
+    assert len(calls) == 3
+    assert client.counters["retries"] == 2 and client.counters["retry_budget_exhausted"] == 1
+
+
+def test_send_circuit_open(clock):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503 if len(calls) <= 2 else 200)
+
+    client = make_client(handler, breaker_threshold=2, breaker_reset=10)
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(httpx.HTTPStatusError):
+                await client._send("GET", client.uri)
+        with pytest.raises(CircuitOpenError):
+            await client._send("GET", client.uri)
+        assert len(calls) == 2 and client.counters["circuit_open"] == 1
+        clock.now += 10
+        assert (await client._send("GET", client.uri)).status_code == 200
+        assert client.breaker.state == "closed"
+
+    asyncio.run(run())
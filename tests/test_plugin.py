@@ -0,0 +1,70 @@
+# coding:utf-8
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from core import plugin
+from core.router import DeferredAPIRouter, expand_routes
+from plugins import ryd
+
+router = DeferredAPIRouter()
+
+
+@router.get("/items/{item_id}", summary="真实路由")
+async def get_item(item_id: int):
+    return {"id": item_id}
+
+
+MANIFEST = {
+    "name": "test",
+    "module": __name__,
+    "prefix": "/test",
+    "routes": [
+        {"path": "/items/{item_id}", "methods": ["GET"]},
+        {"path": "/missing", "methods": ["GET"]},
+    ],
+}
+
+
+def route_set(routes) -> set:
+    return {(route.path, frozenset(m.upper() for m in route.methods or ["GET"])) for route in routes}
+
+
+def test_ryd_manifest_matches_router():
+    from plugins.ryd import api
+    manifest = plugin.PluginManifest(**ryd.MANIFEST)
+    assert route_set(manifest.routes) == route_set(api.router.deferred_routes)
+
+
+def make_app(indexed: bool) -> FastAPI:
+    app = FastAPI()
+    deferred = DeferredAPIRouter()
+    plugin.include(deferred, plugin.PluginManifest(**MANIFEST))
+    deferred.register(app.router, indexed=indexed)
+    return app
+
+
+def lazy_routes(app: FastAPI) -> list:
+    return [route for route in expand_routes(app.router.routes) if isinstance(route, plugin.LazyAPIRoute)]
+
+
+def test_lazy_route_swapped_on_first_hit():
+    for indexed in (False, True):
+        app = make_app(indexed)
+        assert len(lazy_routes(app)) == 2
+        client = TestClient(app)
+        assert client.get("/test/items/7").json() == {"id": 7}
+        # 真实路由替换占位路由, 之后直接匹配真实路由
+        assert [route.path for route in lazy_routes(app)] == ["/test/missing"]
+        assert client.get("/test/items/x").status_code == 422
+        assert client.get("/test/missing").status_code == 501
+
+
+def test_openapi_from_real_routes():
+    app = make_app(indexed=False)
+    # 占位路由不列入OpenAPI
+    assert "/test/items/{item_id}" not in app.openapi()["paths"]
+    app.openapi_schema = None
+    plugin.load_routes(app.router.routes)
+    operation = app.openapi()["paths"]["/test/items/{item_id}"]["get"]
+    assert operation["summary"] == "真实路由"
+    assert operation["parameters"][0]["name"] == "item_id"
@@ -0,0 +1,143 @@
+# coding:utf-8
+import asyncio
+import sqlite3
+from contextlib import contextmanager
+
+import pytest
+
+from util import provider
+
+
+class SqliteConnection(object):
+    """
+    用sqlite执行mysql.keyset生成的SQL(%s占位符), 记录执行过的SQL
+    """
+
+    def __init__(self, conn: sqlite3.Connection, executed: list):
+        self.conn = conn
+        self.executed = executed
+
+    @contextmanager
+    def cursor(self, cursor_class=None):
+        yield SqliteCursor(self)
+
+
+class SqliteCursor(object):
+
+    def __init__(self, connection: SqliteConnection):
+        self.connection = connection
+        self.rows = []
+
+    def execute(self, query, args=None):
+        self.connection.executed.append((query, list(args or [])))
+        cursor = self.connection.conn.execute(query.replace("%%", "%").replace("%s", "?"), args or [])
+        names = [column[0] for column in cursor.description]
+        self.rows = [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def fetchall(self):
+        return self.rows
+
+
+class SqlitePool(object):
+
+    def __init__(self, count: int):
+        self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self.conn.execute("create table account (id integer primary key, type text)")
+        self.conn.executemany("insert into account values (?, ?)",
+                              [(i, "AGENT" if i % 3 == 0 else "USER") for i in range(1, count + 1)])
+        self.executed = []
+
+    @contextmanager
+    def connection(self):
+        yield SqliteConnection(self.conn, self.executed)
+
+
+def collect(batches) -> list:
+    async def run():
+        return [batch async for batch in batches]
+
+    return asyncio.run(run())
+
+
+def ids(batches) -> list:
+    return [row["id"] for _, rows in batches for row in rows]
+
+
+def test_iter_keyset_all():
+    pool = SqlitePool(25)
+    batches = collect(provider.iter_keyset(pool, "account", batch_size=10))
+    assert [len(rows) for _, rows in batches] == [10, 10, 5]
+    assert ids(batches) == list(range(1, 26))
+    assert batches[-1][0] == {"after": 25, "count": 25}
+    # 最后一批不满时不再多查一次
+    assert len(pool.executed) == 3
+
+
+def test_iter_keyset_exact_batches():
+    pool = SqlitePool(20)
+    batches = collect(provider.iter_keyset(pool, "account", batch_size=10))
+    assert [len(rows) for _, rows in batches] == [10, 10]
+    assert len(pool.executed) == 3
+
+
+def test_iter_keyset_where_and_columns():
+    pool = SqlitePool(30)
+    batches = collect(provider.iter_keyset(pool, "account", columns="id, type", where="type=%s", args=["AGENT"],
+                                           batch_size=4))
+    assert ids(batches) == list(range(3, 31, 3))
+    assert all(row["type"] == "AGENT" for _, rows in batches for row in rows)
+
+
+def test_iter_keyset_limit():
+    pool = SqlitePool(30)
+    batches = collect(provider.iter_keyset(pool, "account", batch_size=4, limit=10))
+    assert [len(rows) for _, rows in batches] == [4, 4, 2]
+    assert pool.executed[-1][1][-1] == 2
+
+
+def test_iter_keyset_resume():
+    pool = SqlitePool(25)
+    first = collect(provider.iter_keyset(pool, "account", batch_size=10, limit=20))[0]
+    rest = collect(provider.iter_keyset(pool, "account", batch_size=10, limit=20, cursor=first[0]))
+    assert ids([first] + rest) == list(range(1, 21))
+    assert rest[-1][0] == {"after": 20, "count": 20}
+
+
+@pytest.mark.parametrize("shards", [2, 3])
+def test_iter_keyset_shards(shards):
+    pool = SqlitePool(25)
+    parts = [ids(collect(provider.iter_keyset(pool, "account", batch_size=4, shard=(i, shards))))
+             for i in range(shards)]
+    # 各分片不重叠, 合起来是全部数据
+    assert sorted(sum(parts, [])) == list(range(1, 26))
+    assert all(key % shards == i for i, part in enumerate(parts) for key in part)
+
+
+def test_iter_keyset_shard_limit():
+    pool = SqlitePool(25)
+    parts = [ids(collect(provider.iter_keyset(pool, "account", batch_size=4, limit=7, shard=(i, 2))))
+             for i in range(2)]
+    assert [len(part) for part in parts] == [4, 4]
+
+
+def test_prefetch_order_and_close():
+    closed = []
+
+    async def batches():
+        try:
+            for i in range(5):
+                await asyncio.sleep(0)
+                yield i
+        finally:
+            closed.append(True)
+
+    async def run(stop: int):
+        items = []
+        async for item in provider.prefetch(batches()):
+            items.append(item)
+            if item == stop:
+                break
+        return items
+
+    assert asyncio.run(run(-1)) == [0, 1, 2, 3, 4]
+    assert asyncio.run(run(1)) == [0, 1] and closed == [True, True]
@@ -0,0 +1,112 @@
+# coding:utf-8
+import itertools
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.routing import Match
+
+from core.router import DeferredAPIRouter, IndexedRoutes, expand_routes
+
+# (方法, 路径): 静态路径, 各种参数路径, 同一路径多个候选, 按段无法索引的路径
+ROUTES = [
+    ("GET", "/users/me"),
+    ("GET", "/users/{user_id:int}"),
+    ("GET", "/users/{name}"),
+    ("POST", "/users/{name}"),
+    ("GET", "/a/{x}/c"),
+    ("GET", "/a/b/{y}"),
+    ("GET", "/a/b/c"),
+    ("GET", "/files/{path:path}"),
+    ("GET", "/files/readme"),
+    ("GET", "/prices/{value:float}"),
+    ("GET", "/items-{item_id}"),
+    ("PUT", "/orders/{order_id:uuid}"),
+    ("DELETE", "/orders/{order_id}"),
+]
+
+REQUESTS = [
+    (method, path)
+    for method, path in itertools.product(["GET", "POST", "PUT", "DELETE"], [
+        "/users/me", "/users/7", "/users/bob", "/users/", "/users/7/x",
+        "/a/b/c", "/a/x/c", "/a/b/z", "/a/b", "/files/readme", "/files/a/b.txt",
+        "/prices/1.5", "/prices/x", "/items-9", "/orders/2b8a6f3e-0c4a-4b8e-9a55-2f8d9b3c1e77",
+        "/orders/1", "/missing", "/",
+    ])
+]
+
+
+def make_endpoint(index: int):
+    async def endpoint():
+        return index
+
+    return endpoint
+
+
+def build(indexed: bool) -> FastAPI:
+    router = DeferredAPIRouter()
+    for index, (method, path) in enumerate(ROUTES):
+        router.add_api_route(path, make_endpoint(index), methods=[method], name=f"route{index}")
+    app = FastAPI()
+    router.register(app.router, indexed=indexed)
+    return app
+
+
+def linear_match(routes, scope):
+    # 与 starlette.routing.Router.__call__ 相同: 第一个FULL, 否则第一个PARTIAL
+    partial = None
+    for route in routes:
+        match, child_scope = route.matches(scope)
+        if match == Match.FULL:
+            return match, route, child_scope.get("path_params")
+        if match == Match.PARTIAL and partial is None:
+            partial = match, route, child_scope.get("path_params")
+    return partial or (Match.NONE, None, None)
+
+
+@pytest.fixture(scope="module")
+def indexed_routes() -> IndexedRoutes:
+    routes = build(indexed=True).router.routes
+    return next(route for route in routes if isinstance(route, IndexedRoutes))
+
+
+@pytest.mark.parametrize("method,path", REQUESTS)
+def test_same_as_linear_scan(indexed_routes, method, path):
+    scope = {"type": "http", "method": method, "path": path}
+    expected = linear_match(indexed_routes.routes, scope)
+    match, child_scope = indexed_routes.matches(dict(scope))
+    actual = match, child_scope.get("route"), child_scope.get("path_params")
+    assert actual == expected
+
+
+def test_routes_removed_from_list():
+    app = build(indexed=True)
+    assert len(app.router.routes) == len(build(indexed=False).router.routes) - len(ROUTES) + 1
+    assert [route.path for route in expand_routes(app.router.routes)] == \
+           [route.path for route in build(indexed=False).router.routes]
+
+
+def test_responses_same_as_linear():
+    clients = [TestClient(build(indexed)) for indexed in (False, True)]
+    for method, path in REQUESTS:
+        plain, indexed = (client.request(method, path) for client in clients)
+        assert (indexed.status_code, indexed.content) == (plain.status_code, plain.content), (method, path)
+
+
+def test_precedence():
+    client = TestClient(build(indexed=True))
+    # 先注册的优先: 静态 /users/me 在参数路径之前, {user_id:int} 在 {name} 之前
+    assert client.get("/users/me").json() == 0
+    assert client.get("/users/7").json() == 1
+    assert client.get("/users/bob").json() == 2
+    assert client.get("/a/b/c").json() == 4
+    assert client.get("/files/readme").json() == 7
+    assert client.post("/users/7").json() == 3
+    assert client.put("/users/7").status_code == 405
+    assert client.get("/missing").status_code == 404
+
+
+def test_url_path_for():
+    app = build(indexed=True)
+    assert app.url_path_for("route1", user_id=5) == "/users/5"
+    assert app.url_path_for("route7", path="a/b") == "/files/a/b"
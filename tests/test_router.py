@@ -0,0 +1,117 @@
+# coding:utf-8
+import asyncio
+from typing import List
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from core import router as router_module
+from core.router import CachedAPIRoute, DeferredAPIRouter
+
+
+class Item(BaseModel):
+    id: int
+    name: str = ""
+
+
+class Error(BaseModel):
+    message: str
+
+
+def token(x_token: str = ""):
+    return x_token
+
+
+def make_router() -> DeferredAPIRouter:
+    router = DeferredAPIRouter()
+
+    def item_endpoint(value: int):
+        async def endpoint(item_id: int, q: str = "") -> Item:
+            return Item(id=item_id + value, name=q)
+
+        return endpoint
+
+    # 同一函数定义生成的闭包共用依赖分析
+    for i in range(3):
+        router.add_api_route(f"/items{i}/{{item_id}}", item_endpoint(i), response_model=Item,
+                             responses={404: {"model": Error}})
+
+    @router.post("/items", response_model=List[Item])
+    async def create(items: List[Item], user: str = Depends(token)):
+        return items
+
+    @router.put("/items/{item_id}")
+    async def update(item_id: int, item: Item, extra: Item):
+        return {"id": item_id, "item": item, "extra": extra}
+
+    @router.static("/version", response_model=Item)
+    def version():
+        return Item(id=1, name="v")
+
+    return router
+
+
+def make_app(bulk: bool) -> FastAPI:
+    app = FastAPI()
+    make_router().register(app.router, bulk=bulk)
+    return app
+
+
+def test_cached_route_supported():
+    # fastapi 升级后失败: 需要按新版本的 APIRoute.__init__ 更新 CachedAPIRoute
+    assert router_module.CACHED_ROUTE_SUPPORTED
+
+
+def test_cached_route_same_as_api_route():
+    cached, plain = make_app(bulk=True), make_app(bulk=False)
+    assert sum(isinstance(route, CachedAPIRoute) for route in cached.router.routes) == 6
+    assert not any(isinstance(route, CachedAPIRoute) for route in plain.router.routes)
+    assert cached.openapi() == plain.openapi()
+    for app in (cached, plain):
+        client = TestClient(app)
+        assert client.get("/items2/5", params={"q": "a"}).json() == {"id": 7, "name": "a"}
+        assert client.get("/items2/x").status_code == 422
+        assert client.post("/items", json=[{"id": 1}]).json() == [{"id": 1, "name": ""}]
+        body = {"item": {"id": 1}, "extra": {"id": 2, "name": "b"}}
+        assert client.put("/items/3", json=body).json() == {"id": 3, **body, "item": {"id": 1, "name": ""}}
+
+
+def test_analysis_cache_shared():
+    app = FastAPI()
+    router = make_router()
+    router.register(app.router)
+    assert router.analysis_cache.hits > 0
+    routes = [route for route in app.router.routes if route.path.startswith("/items") and "{" in route.path]
+    assert routes[0].dependant is not routes[1].dependant
+    assert routes[0].dependant.call is not routes[1].dependant.call
+
+
+def test_static_response():
+    client = TestClient(make_app(bulk=True))
+    resp = client.get("/version")
+    assert resp.json() == {"id": 1, "name": "v"}
+    etag = resp.headers["etag"]
+    assert resp.headers["content-length"] == str(len(resp.content))
+    resp = client.get("/version", headers={"If-None-Match": etag})
+    assert resp.status_code == 304 and resp.content == b""
+
+
+def test_static_response_head():
+    app = make_app(bulk=True)
+    route = next(route for route in app.router.routes if route.path == "/version")
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    async def call(method: str):
+        messages.clear()
+        await route.app({"type": "http", "method": method, "headers": []}, None, send)
+        return dict(messages[0]["headers"]), messages[1]["body"]
+
+    headers, body = asyncio.run(call("GET"))
+    head_headers, head_body = asyncio.run(call("HEAD"))
+    # HEAD只发响应头, Content-Length和ETag与GET相同
+    assert body and head_body == b""
+    assert head_headers == headers and headers[b"content-length"] == str(len(body)).encode()
@@ -0,0 +1,89 @@
+# coding:utf-8
+import base64
+import time
+
+import pytest
+
+from util import security
+
+KEY = "XjgX3zAkA2hDT0ySpzOU1uq3iZ9F6yA9"
+SALT = "MockAPI"
+
+
+def test_token_without_timestamp():
+    # 时间戳无效的token: 不校验有效期时有效, 校验时无效
+    token = security.aes_encrypt(key=KEY, data=f"{SALT}.abc")
+    assert security.check_token(KEY, SALT, token)
+    assert not security.check_token(KEY, SALT, token, expired=3600)
+    assert not security.check_token(KEY, "Other", token)
+
+
+def test_token_cache_hit_miss():
+    cache = security.TokenCache(maxsize=2, expired=3600)
+    now = int(time.time())
+    assert cache.get("a") is None
+    cache.put("a", now)
+    assert cache.get("a") == now
+    assert cache.stats() == {"size": 1, "maxsize": 2, "hits": 1, "misses": 1}
+
+
+def test_token_cache_lru():
+    cache = security.TokenCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+
+
+def test_token_cache_expired():
+    cache = security.TokenCache(maxsize=2, expired=10, tolerance=0)
+    cache.put("a", int(time.time()) - 11)
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_token_cache_disabled():
+    cache = security.TokenCache(maxsize=0)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+
+
+def test_batch_encrypt_same_as_single():
+    codec = security.get_codec(KEY)
+    datas = ["", "a", "x" * 16, "中文", "y" * 33]
+    encrypted = codec.encrypt_batch(datas)
+    assert encrypted == [codec.encrypt(data) for data in datas]
+    assert codec.decrypt_batch(encrypted) == datas
+
+
+def test_batch_decrypt_invalid():
+    codec = security.get_codec(KEY)
+    good = codec.encrypt("ok")
+    # 非base64, 长度不是块大小整数倍, 填充错误的数据返回None, 不影响其他数据
+    bad_padding = base64.urlsafe_b64encode(codec.cipher.encryptor().update(b"x" * 16)).decode()
+    assert codec.decrypt_batch(["***", "YWJj", bad_padding, good, ""]) == [None, None, None, "ok", None]
+
+
+def test_issue_tokens():
+    now = int(time.time())
+    tokens = security.get_token_codec(KEY, SALT).issue_tokens(5, timestamp=now, step=2)
+    assert len(set(tokens)) == 5
+    codec = security.get_token_codec(KEY, SALT)
+    assert codec.parse_tokens(tokens) == [now - i * 2 for i in range(5)]
+    assert [codec.parse(token) for token in tokens] == codec.parse_tokens(tokens)
+
+
+def test_issue_tokens_step():
+    with pytest.raises(ValueError):
+        security.issue_tokens(KEY, SALT, 3, step=0)
+
+
+def test_check_tokens():
+    now = int(time.time())
+    codec = security.get_token_codec(KEY, SALT)
+    tokens = [codec.issue(now), codec.issue(now - 100), security.get_token_codec(KEY, "Other").issue(now), "bad"]
+    expected = [True, False, False, False]
+    assert security.check_tokens(KEY, SALT, tokens, expired=50, tolerance=10) == expected
+    assert [security.check_token(KEY, SALT, token, expired=50, tolerance=10) for token in tokens] == expected
+    assert security.check_tokens(KEY, SALT, tokens) == [True, True, False, False]
@@ -0,0 +1,118 @@
+# coding:utf-8
+import asyncio
+import os
+
+import pytest
+
+from plugins.ryd import mock
+from util import snapshot
+
+BATCHES = [
+    [{"id": 1, "ids": [1, 2, 3]}, {"id": 2, "ids": []}],
+    [],
+    [{"id": 3, "ids": [-1, 2 ** 40]}],
+    [{"id": 4, "ids": [4]}, {"id": 5, "ids": [5, 5]}, {"id": 6, "ids": [6]}],
+]
+
+
+class Source(object):
+    """
+    数据源: 记录被读取的次数
+    """
+
+    def __init__(self, batches=None):
+        self.batches = BATCHES if batches is None else batches
+        self.calls = 0
+
+    async def __call__(self, cursor=None, shard=(0, 1)):
+        self.calls += 1
+        for i, rows in enumerate(self.batches):
+            yield i + 1, rows
+
+
+def collect(provider, **kwargs) -> list:
+    async def run():
+        return [batch async for batch in provider(**kwargs)]
+
+    return asyncio.run(run())
+
+
+def test_round_trip(tmp_path):
+    file = str(tmp_path / "sub" / "a.snap")
+    header = asyncio.run(snapshot.build(Source(), file, "h1"))
+    assert header["batches"] == 3 and header["records"] == 6
+    assert not os.path.exists(f"{file}.tmp")
+    with snapshot.Snapshot(file) as snap:
+        assert snap.digest == "h1" and len(snap) == 3
+        # 空批不写入
+        assert [snap.batch(i) for i in range(len(snap))] == [rows for rows in BATCHES if rows]
+
+
+def test_empty_source(tmp_path):
+    file = str(tmp_path / "a.snap")
+    asyncio.run(snapshot.build(Source([]), file, "h1"))
+    with snapshot.Snapshot(file) as snap:
+        assert len(snap) == 0 and snap.fields == []
+
+
+def test_unsupported_field(tmp_path):
+    file = str(tmp_path / "a.snap")
+    with pytest.raises(ValueError):
+        asyncio.run(snapshot.build(Source([[{"id": 1, "name": "a"}]]), file, "h1"))
+    assert not os.path.exists(file) and not os.path.exists(f"{file}.tmp")
+
+
+def test_read_digest(tmp_path):
+    file = tmp_path / "a.snap"
+    assert snapshot.read_digest(str(file)) is None
+    # 空文件, 不完整的文件头, magic不对
+    for data in (b"", b"MOCKSNP1", b"x" * 64):
+        file.write_bytes(data)
+        assert snapshot.read_digest(str(file)) is None
+    with pytest.raises(ValueError):
+        snapshot.Snapshot(str(file))
+
+
+def test_ensure(tmp_path):
+    file = str(tmp_path / "a.snap")
+    source = Source()
+    assert asyncio.run(snapshot.ensure(source, file, "h1"))
+    # 摘要一致时不再访问数据源, 摘要变化或要求刷新时重建
+    assert not asyncio.run(snapshot.ensure(source, file, "h1"))
+    assert source.calls == 1
+    assert asyncio.run(snapshot.ensure(source, file, "h2"))
+    assert asyncio.run(snapshot.ensure(source, file, "h2", refresh=True))
+    assert source.calls == 3 and snapshot.read_digest(file) == "h2"
+
+
+def test_cached(tmp_path):
+    file = str(tmp_path / "a.snap")
+    source = Source()
+    provider = snapshot.cached(source, file, "h1", refresh=True)
+    expected = [(i + 1, rows) for i, rows in enumerate(rows for rows in BATCHES if rows)]
+    assert collect(provider) == expected
+    # 只在首次使用时刷新, 之后从快照读取
+    assert collect(provider) == expected
+    assert source.calls == 1
+    assert collect(provider, cursor=2) == expected[2:]
+    shards = [collect(provider, shard=(i, 2)) for i in range(2)]
+    assert sorted(shards[0] + shards[1]) == expected
+    assert source.calls == 1
+
+
+def test_code_hash():
+    def make(sql: str):
+        def data():
+            return [row for row in query(sql="select id from account") if row["id"] in {1, 2}]
+
+        return data
+
+    def query(sql):
+        return []
+
+    def other():
+        return [row for row in query(sql="select id from terminal") if row["id"] in {1, 2}]
+
+    # 同一定义的不同闭包摘要相同, 查询语句变化摘要不同; 不依赖源码
+    assert mock.code_hash(make("a").__code__) == mock.code_hash(make("b").__code__)
+    assert mock.code_hash(make("a").__code__) != mock.code_hash(other.__code__)